@@ -22,8 +22,10 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from contextlib import contextmanager
 import json
 from os.path import dirname
+from threading import Lock, RLock
 
 from decorator import decorator
 from diablo.lib.util import get_args_dict
@@ -36,10 +38,17 @@ __version__ = '1.9'
 
 cache = Cache()
 
+# Cached stand-in for a None result. See cachify.
+NEGATIVE_CACHE_ENTRY = '__negative_cache_entry__'
+
 db = SQLAlchemy()
 
 BASE_DIR = dirname(dirname(__file__))
 
+# Per-key locks of cache misses in flight, with the count of callers that hold or await each. See cachify.
+_in_flight_locks = {}
+_in_flight_locks_lock = Lock()
+
 
 def std_commit(allow_test_environment=False):
     """Commit failures in SQLAlchemy must be explicitly handled.
@@ -65,21 +74,51 @@ def std_commit(allow_test_environment=False):
             db.session.close()
 
 
-def cachify(key_pattern, timeout=1440):
+def cachify(key_pattern, timeout=1440, negative_timeout=None):
+    # If negative_timeout is set then a None result is cached, with that timeout, rather than fetched again on each call.
+    # Concurrent misses on a key are fetched once (single-flight); other callers wait for the result.
     @decorator
     def _cachify(func, *args, **kw):
         args_dict = get_args_dict(func, *args, **kw)
         key = key_pattern.format(**args_dict)
         cached = cache.get(key)
         if cached is None:
-            cached = func(*args, **kw)
-            # timeout is in seconds
-            cache.set(key, cached, timeout)
-        return cached
+            with _single_flight(key):
+                cached = _peek(key)
+                if cached is None:
+                    cached = func(*args, **kw)
+                    if cached is not None:
+                        # timeout is in seconds
+                        cache.set(key, cached, timeout)
+                    elif negative_timeout:
+                        cache.set(key, NEGATIVE_CACHE_ENTRY, negative_timeout)
+        return None if cached == NEGATIVE_CACHE_ENTRY else cached
 
     return _cachify
 
 
+def _peek(key):
+    # Look again without counting a second miss, where the backend allows it (e.g., TwoTierCache).
+    backend = cache.cache
+    return backend.peek(key) if hasattr(backend, 'peek') else backend.get(key)
+
+
+@contextmanager
+def _single_flight(key):
+    # Callers on other keys never wait. The lock is reentrant, and dropped when its last caller is done.
+    with _in_flight_locks_lock:
+        entry = _in_flight_locks.setdefault(key, [RLock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _in_flight_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _in_flight_locks[key]
+
+
 def skip_when_pytest(mock_object=None, is_fixture_json_file=False):
     @decorator
     def _skip_when_pytest(func, *args, **kw):
@@ -25,15 +25,20 @@ ENHANCEMENTS, OR MODIFICATIONS.
 from collections import OrderedDict
 import json
 
-from diablo import __version__ as version, cache
+from diablo import __version__ as version, cache, std_commit
+from diablo.api.errors import BadRequestError
 from diablo.api.util import admin_required, get_search_filter_options
 from diablo.lib.berkeley import term_name_for_sis_id
+from diablo.lib.cache import TwoTierCache
 from diablo.lib.http import tolerant_jsonify
 from diablo.lib.util import get_eb_environment
+from diablo.merged.calnet import get_calnet_cache_stats
 from diablo.models.approval import NAMES_PER_PUBLISH_TYPE
+from diablo.models.course_document import CourseDocument
 from diablo.models.email_template import EmailTemplate
 from diablo.models.room import Room
-from flask import current_app as app
+from diablo.models.user import clear_user_cache
+from flask import current_app as app, request
 
 PUBLIC_CONFIGS = [
     'CANVAS_BASE_URL',
@@ -64,9 +69,43 @@ PUBLIC_CONFIGS = [
 @app.route('/api/cache/clear')
 @admin_required
 def clear_cache():
+    CourseDocument.delete_all()
+    std_commit()
+    clear_user_cache()
     return tolerant_jsonify(cache.clear())
 
 
+@app.route('/api/cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_cache():
+    params = request.get_json() or {}
+    pattern = params.get('pattern')
+    section_id = params.get('sectionId')
+    uid = params.get('uid')
+    if not pattern and not section_id and not uid:
+        raise BadRequestError('Required parameter (pattern, sectionId or uid) is missing.')
+    deleted_keys = []
+    if pattern:
+        deleted_keys += _two_tier_cache().delete_matching(pattern)
+    if section_id:
+        term_id = params.get('termId') or app.config['CURRENT_TERM_ID']
+        CourseDocument.delete(section_id=int(section_id), term_id=int(term_id))
+        std_commit()
+    if uid:
+        deleted_keys += _two_tier_cache().delete_matching(f'calnet/user_for_uid_{uid}')
+        clear_user_cache(uid)
+    return tolerant_jsonify({'deletedKeys': deleted_keys})
+
+
+@app.route('/api/cache/stats')
+@admin_required
+def cache_stats():
+    return tolerant_jsonify({
+        'calnet': get_calnet_cache_stats(),
+        'keyFamilies': _two_tier_cache().get_stats(),
+    })
+
+
 @app.route('/api/config')
 def app_config():
     def _to_api_key(key):
@@ -109,3 +148,10 @@ def load_json(relative_path):
         return json.load(file)
     except (FileNotFoundError, KeyError, TypeError):
         return None
+
+
+def _two_tier_cache():
+    backend = cache.cache
+    if not isinstance(backend, TwoTierCache):
+        raise BadRequestError(f'Cache backend {type(backend).__name__} has no stats or key inventory.')
+    return backend
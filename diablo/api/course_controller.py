@@ -22,11 +22,13 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+import base64
 from datetime import datetime
+import json
 import traceback
 
 from diablo.api.errors import BadRequestError, ForbiddenRequestError, ResourceNotFoundError
-from diablo.api.util import admin_required, csv_download_response, get_search_filter_options
+from diablo.api.util import admin_required, csv_stream_response, get_search_filter_options, ndjson_stream_response
 from diablo.externals.kaltura import Kaltura
 from diablo.jobs.util import get_courses_ready_to_schedule, schedule_recordings
 from diablo.lib.berkeley import term_name_for_sis_id
@@ -38,7 +40,7 @@ from diablo.models.course_preference import CoursePreference
 from diablo.models.queued_email import notify_instructor_waiting_for_approval, notify_instructors_of_changes
 from diablo.models.room import Room
 from diablo.models.scheduled import Scheduled
-from diablo.models.sis_section import SisSection
+from diablo.models.sis_section import COURSE_SORT_KEYS, SisSection
 from flask import current_app as app, request
 from flask_login import current_user, login_required
 from KalturaClient.exceptions import KalturaClientException, KalturaException
@@ -139,7 +141,41 @@ def find_courses():
     params = request.get_json()
     term_id = params.get('termId')
     filter_ = params.get('filter', 'Not Invited')
-    return tolerant_jsonify(_get_courses_per_filter(filter_=filter_, term_id=term_id))
+    search = params.get('search')
+    if 'cursor' in params:
+        # Paginated feed. The first page is requested with a null cursor.
+        _validate_filter(filter_=filter_, term_id=term_id)
+        sort_by, sort_desc = _get_sort(params)
+        limit = params.get('limit') or app.config['SEARCH_ITEMS_PER_PAGE']
+        if not isinstance(limit, int) or limit < 1:
+            raise BadRequestError('Invalid limit')
+        courses, next_cursor = SisSection.get_courses_page(
+            cursor=_decode_cursor(params['cursor'], sort_by=sort_by, sort_desc=sort_desc),
+            filter_=filter_,
+            limit=min(limit, app.config['SEARCH_ITEMS_PER_PAGE']),
+            search=search,
+            sort_by=sort_by,
+            sort_desc=sort_desc,
+            term_id=term_id,
+        )
+        return tolerant_jsonify({
+            'courses': courses,
+            'nextCursor': _encode_cursor(next_cursor, sort_by=sort_by, sort_desc=sort_desc),
+        })
+    elif search or 'sortBy' in params:
+        _validate_filter(filter_=filter_, term_id=term_id)
+        sort_by, sort_desc = _get_sort(params)
+        courses = SisSection.stream_courses(filter_=filter_, search=search, sort_by=sort_by, sort_desc=sort_desc, term_id=term_id)
+        return tolerant_jsonify(list(courses))
+    else:
+        return tolerant_jsonify(_get_courses_per_filter(filter_=filter_, term_id=term_id))
+
+
+@app.route('/api/courses/counts/<term_id>')
+@admin_required
+def get_course_counts(term_id):
+    # Counts for all course filters (i.e., dashboard tabs) and statuses in a single request.
+    return tolerant_jsonify(SisSection.get_course_counts(term_id))
 
 
 @app.route('/api/courses/csv', methods=['POST'])
@@ -176,12 +212,30 @@ def download_courses_csv():
     params = request.get_json()
     term_id = params.get('termId')
     filter_ = params.get('filter', 'Not Invited')
-    now = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    return csv_download_response(
-        rows=[_course_csv_row(c) for c in _get_courses_per_filter(filter_=filter_, term_id=term_id)],
-        filename=f"courses-{filter_.lower().replace(' ', '_')}-{term_id}_{now}.csv",
-        fieldnames=list(_course_csv_row({}).keys()),
+    format_ = params.get('format', 'csv')
+    _validate_filter(filter_=filter_, term_id=term_id)
+    if format_ not in ['csv', 'ndjson']:
+        raise BadRequestError(f'Invalid format: {format_}')
+    sort_by, sort_desc = _get_sort(params)
+
+    # Courses are constructed in chunks and streamed as they come.
+    courses = SisSection.stream_courses(
+        filter_=filter_,
+        search=params.get('search'),
+        sort_by=sort_by,
+        sort_desc=sort_desc,
+        term_id=term_id,
     )
+    now = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    filename = f"courses-{filter_.lower().replace(' ', '_')}-{term_id}_{now}.{format_}"
+    if format_ == 'ndjson':
+        return ndjson_stream_response(rows=courses, filename=filename)
+    else:
+        return csv_stream_response(
+            rows=(_course_csv_row(c) for c in courses),
+            filename=filename,
+            fieldnames=list(_course_csv_row({}).keys()),
+        )
 
 
 @app.route('/api/course/unschedule', methods=['POST'])
@@ -284,9 +338,28 @@ def courses_report(term_id):
     })
 
 
+def _decode_cursor(cursor, sort_by, sort_desc):
+    # A cursor is valid only for the sort order of the page that returned it.
+    if cursor is None:
+        return None
+    try:
+        cursor_sort_by, cursor_sort_desc, sort_key, section_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (AttributeError, TypeError, ValueError):
+        raise BadRequestError('Invalid cursor')
+    if (cursor_sort_by, cursor_sort_desc) != (sort_by, sort_desc) or type(sort_key) is not (int if sort_by == 'sectionId' else str):
+        raise BadRequestError('Invalid cursor')
+    try:
+        return sort_key, int(section_id)
+    except (TypeError, ValueError):
+        raise BadRequestError('Invalid cursor')
+
+
+def _encode_cursor(cursor, sort_by, sort_desc):
+    return base64.urlsafe_b64encode(json.dumps([sort_by, sort_desc, *cursor]).encode()).decode() if cursor else None
+
+
 def _get_courses_per_filter(filter_, term_id):
-    if filter_ not in get_search_filter_options() or not term_id:
-        raise BadRequestError('One or more required params are missing or invalid')
+    _validate_filter(filter_=filter_, term_id=term_id)
 
     if filter_ == 'All':
         courses = SisSection.get_courses(term_id)
@@ -309,6 +382,19 @@ def _get_courses_per_filter(filter_, term_id):
     return courses
 
 
+def _get_sort(params):
+    sort_by = params.get('sortBy') or 'courseName'
+    sort_desc = params.get('sortDesc', False)
+    if sort_by not in COURSE_SORT_KEYS or not isinstance(sort_desc, bool):
+        raise BadRequestError('Invalid sort')
+    return sort_by, sort_desc
+
+
+def _validate_filter(filter_, term_id):
+    if filter_ not in get_search_filter_options() or not term_id:
+        raise BadRequestError('One or more required params are missing or invalid')
+
+
 def _after_approval(course):
     section_id = course['sectionId']
     term_id = course['termId']
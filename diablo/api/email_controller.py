@@ -27,6 +27,7 @@ from diablo.api.util import admin_required
 from diablo.externals.b_connected import BConnected
 from diablo.lib.http import tolerant_jsonify
 from diablo.lib.interpolator import get_template_substitutions, interpolate_content
+from diablo.merged.email_dispatcher import get_last_drain_stats
 from diablo.models.approval import get_all_publish_types, get_all_recording_types, NAMES_PER_PUBLISH_TYPE, \
     NAMES_PER_RECORDING_TYPE
 from diablo.models.email_template import EmailTemplate
@@ -62,7 +63,7 @@ def delete_email_template(template_id):
 @app.route('/api/email/template/codes')
 @admin_required
 def get_template_codes():
-    template_codes = list(get_template_substitutions(course=None, recipient_name=None).keys())
+    template_codes = sorted(get_template_substitutions(course=None, recipient_name=None).keys())
     return tolerant_jsonify(template_codes)
 
 
@@ -166,3 +167,13 @@ def queue_emails():
     return tolerant_jsonify({
         'message': f"An email of type '{template_type}' has been queued.",
     })
+
+
+@app.route('/api/emails/queue/stats')
+@admin_required
+def get_email_queue_stats():
+    term_id = app.config['CURRENT_TERM_ID']
+    return tolerant_jsonify({
+        **QueuedEmail.get_queue_stats(term_id),
+        'lastDrain': get_last_drain_stats() or None,
+    })
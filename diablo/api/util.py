@@ -24,10 +24,11 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 import csv
 from functools import wraps
+from io import StringIO
 
-from flask import current_app as app, request, Response
+from flask import current_app as app, request, Response, stream_with_context
 from flask_login import current_user
-from werkzeug.wrappers import ResponseStream
+import simplejson as json
 
 
 def admin_required(func):
@@ -54,14 +55,35 @@ def get_search_filter_options():
     }
 
 
-def csv_download_response(rows, filename, fieldnames=None):
-    response = Response(
+def csv_stream_response(rows, filename, fieldnames):
+    # Rows are written as they are yielded; the full CSV is never held in memory.
+    def _generate():
+        buffer = StringIO()
+        csv_writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        csv_writer.writeheader()
+        for row in rows:
+            csv_writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+    return Response(
+        stream_with_context(_generate()),
         content_type='text/csv',
         headers={
             'Content-disposition': f'attachment; filename="{filename}"',
         },
     )
-    csv_writer = csv.DictWriter(ResponseStream(response), fieldnames=fieldnames)
-    csv_writer.writeheader()
-    csv_writer.writerows(rows)
-    return response
+
+
+def ndjson_stream_response(rows, filename):
+    def _generate():
+        for row in rows:
+            yield json.dumps(row, ignore_nan=True, separators=(',', ':')) + '\n'
+    return Response(
+        stream_with_context(_generate()),
+        content_type='application/x-ndjson',
+        headers={
+            'Content-disposition': f'attachment; filename="{filename}"',
+        },
+    )
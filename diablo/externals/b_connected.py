@@ -22,10 +22,13 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import logging
-from smtplib import SMTP
+from smtplib import SMTP, SMTPServerDisconnected
+from threading import Lock
+from time import monotonic, sleep
 
 from diablo import skip_when_pytest
 from diablo.lib.util import get_eb_environment
@@ -36,11 +39,25 @@ from flask import current_app as app
 
 class BConnected:
 
-    def __init__(self):
+    def __init__(self, rate_limiter=None):
+        # Sessions which share a rate limiter (e.g., one per dispatch worker) share BCOP_SMTP_MESSAGES_PER_SECOND.
         self.bcop_smtp_password = app.config['BCOP_SMTP_PASSWORD']
         self.bcop_smtp_port = app.config['BCOP_SMTP_PORT']
         self.bcop_smtp_server = app.config['BCOP_SMTP_SERVER']
         self.bcop_smtp_username = app.config['BCOP_SMTP_USERNAME']
+        self.rate_limiter = rate_limiter or RateLimiter(app.config['BCOP_SMTP_MESSAGES_PER_SECOND'])
+        self._in_session = False
+        self._smtp = None
+
+    @contextmanager
+    def session(self):
+        # Within this context, all messages are sent over one authenticated SMTP connection.
+        self._in_session = True
+        try:
+            yield self
+        finally:
+            self._in_session = False
+            self.disconnect()
 
     def send(
             self,
@@ -51,6 +68,13 @@ class BConnected:
             section_id=None,
             template_type=None,
     ):
+        if not self.deliver(message=message, recipient=recipient, subject_line=subject_line, template_type=template_type):
+            return False
+        self.record_sent_email(recipient=recipient, section_id=section_id, template_type=template_type, term_id=term_id)
+        return True
+
+    def deliver(self, message, recipient, subject_line, template_type=None):
+        # SMTP only, with no database writes (see record_sent_email). Worker threads may deliver, one instance per thread.
         if not message or not subject_line or not recipient:
             app.logger.error(
                 'Attempted to send a message without required fields: '
@@ -63,12 +87,6 @@ class BConnected:
 
         @skip_when_pytest()
         def _send():
-            smtp = SMTP(self.bcop_smtp_server, port=self.bcop_smtp_port)
-            # TLS encryption
-            smtp.starttls()
-            smtp.set_debuglevel(app.logger.level == logging.DEBUG)
-            smtp.login(self.bcop_smtp_username, self.bcop_smtp_password)
-
             emails_sent_to = set()
 
             if app.config['DIABLO_ENV'] == 'test':
@@ -92,18 +110,21 @@ class BConnected:
                     msg.attach(MIMEText(message, 'plain'))
                     msg.attach(MIMEText(message, 'html'))
                     # Send
-                    smtp.sendmail(from_addr=from_address, to_addrs=email_address, msg=msg.as_string())
+                    self._sendmail(from_address=from_address, to_address=email_address, msg=msg.as_string())
 
                     emails_sent_to.add(email_address)
 
             phrase = f"email sent to {', '.join(list(emails_sent_to))}"
             app.logger.info(f'{template_type.capitalize()} {phrase}' if template_type else f'Alert {phrase}')
-            # Disconnect
-            smtp.quit()
+            if not self._in_session:
+                self.disconnect()
 
         # Send emails
         _send()
+        return True
 
+    @classmethod
+    def record_sent_email(cls, recipient, section_id=None, template_type=None, term_id=None):
         recipient_uid = recipient['uid']
         term_id = term_id or app.config['CURRENT_TERM_ID']
         SentEmail.create(
@@ -124,13 +145,41 @@ class BConnected:
                     term_id=term_id,
                 )
 
-        return True
+    def disconnect(self):
+        if self._smtp:
+            try:
+                self._smtp.quit()
+            except OSError:
+                # E.g., the connection was dropped, or is in an unknown state. Close the socket regardless.
+                self._smtp.close()
+            self._smtp = None
 
     def ping(self):
         with SMTP(self.bcop_smtp_server, port=self.bcop_smtp_port) as smtp:
             smtp.noop()
             return True
 
+    def _connect(self):
+        smtp = SMTP(self.bcop_smtp_server, port=self.bcop_smtp_port, timeout=app.config['BCOP_SMTP_TIMEOUT'])
+        if app.config['BCOP_SMTP_USE_TLS']:
+            # TLS encryption
+            smtp.starttls()
+        smtp.set_debuglevel(app.logger.level == logging.DEBUG)
+        smtp.login(self.bcop_smtp_username, self.bcop_smtp_password)
+        return smtp
+
+    def _sendmail(self, from_address, to_address, msg):
+        self.rate_limiter.wait()
+        if not self._smtp:
+            self._smtp = self._connect()
+        try:
+            self._smtp.sendmail(from_addr=from_address, to_addrs=to_address, msg=msg)
+        except SMTPServerDisconnected:
+            # The server may drop idle or long-lived connections. Reconnect and try once more.
+            app.logger.warning(f'Lost connection to {self.bcop_smtp_server}. Reconnecting.')
+            self._smtp = self._connect()
+            self._smtp.sendmail(from_addr=from_address, to_addrs=to_address, msg=msg)
+
     @classmethod
     def get_email_addresses(cls, user):
         if app.config['EMAIL_TEST_MODE']:
@@ -141,6 +190,25 @@ class BConnected:
             return [email] if email and email.strip() else []
 
 
+class RateLimiter:
+    # Thread-safe. Max rate of messages, zero or None means no limit.
+
+    def __init__(self, messages_per_second):
+        self.interval = 1 / messages_per_second if messages_per_second else 0
+        self._lock = Lock()
+        self._next_send_at = 0
+
+    def wait(self):
+        if self.interval:
+            # Reserve the next slot, then sleep outside the lock.
+            with self._lock:
+                now = monotonic()
+                send_at = max(now, self._next_send_at)
+                self._next_send_at = send_at + self.interval
+            if send_at > now:
+                sleep(send_at - now)
+
+
 def write_email_to_log(message, recipient, subject_line):
     app.logger.info(f"""
 
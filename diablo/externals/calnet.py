@@ -22,9 +22,14 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import queue
 import ssl
+from threading import BoundedSemaphore, Lock
 
 import ldap3
+from ldap3.core.exceptions import LDAPCommunicationError
 
 SCHEMA_DICT = {
     'berkeleyEduAlternateID': 'email',
@@ -37,35 +42,72 @@ SCHEMA_DICT = {
 
 BATCH_QUERY_MAXIMUM = 500
 
+_clients = {}
+_clients_lock = Lock()
+
 
 def client(app):
-    return Client(app)
+    # One client, and thus one connection pool, per LDAP host and bind.
+    key = (app.config['LDAP_HOST'], app.config['LDAP_BIND'])
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = Client(app)
+        return _clients[key]
 
 
 class Client:
 
-    def __init__(self, app):
-        self.app = app
+    def __init__(self, app, server=None, client_strategy=ldap3.SYNC):
+        # Batches are searched in worker threads, where the current_app proxy is unbound.
+        self.logger = app.logger
         self.host = app.config['LDAP_HOST']
         self.bind = app.config['LDAP_BIND']
         self.password = app.config['LDAP_PASSWORD']
-        tls = ldap3.Tls(validate=ssl.CERT_REQUIRED)
-        server = ldap3.Server(self.host, port=636, use_ssl=True, get_info=ldap3.ALL, tls=tls)
+        if not server:
+            tls = ldap3.Tls(validate=ssl.CERT_REQUIRED)
+            server = ldap3.Server(self.host, port=636, use_ssl=True, get_info=ldap3.ALL, tls=tls)
         self.server = server
+        self.client_strategy = client_strategy
+        self.pool_size = app.config['LDAP_POOL_SIZE']
+        self.pool = ConnectionPool(connect=self.connect, size=self.pool_size)
 
     def connect(self):
-        conn = ldap3.Connection(self.server, user=self.bind, password=self.password, auto_bind=ldap3.AUTO_BIND_TLS_BEFORE_BIND)
+        conn = ldap3.Connection(
+            self.server,
+            user=self.bind,
+            password=self.password,
+            auto_bind=ldap3.AUTO_BIND_TLS_BEFORE_BIND,
+            client_strategy=self.client_strategy,
+        )
+        if not conn.bound:
+            # Mock strategies, which have no real server, ignore auto_bind.
+            conn.bind()
         return conn
 
     def search_uids(self, uids, search_expired=False):
-        all_out = []
-        for i in range(0, len(uids), BATCH_QUERY_MAXIMUM):
-            uids_batch = uids[i:i + BATCH_QUERY_MAXIMUM]
-            with self.connect() as conn:
-                search_filter = self._ldap_search_filter(uids_batch, 'uid', search_expired)
-                conn.search('dc=berkeley,dc=edu', search_filter, attributes=ldap3.ALL_ATTRIBUTES)
-                all_out += [_attributes_to_dict(entry, search_expired) for entry in conn.entries]
-        return all_out
+        batches = [uids[i:i + BATCH_QUERY_MAXIMUM] for i in range(0, len(uids), BATCH_QUERY_MAXIMUM)]
+        if len(batches) > 1:
+            # Batches share the connection pool, and concurrency is bounded by its size. Results keep the order of uids.
+            with ThreadPoolExecutor(max_workers=min(self.pool_size, len(batches))) as executor:
+                results = list(executor.map(lambda batch: self._search_batch(batch, search_expired), batches))
+        else:
+            results = [self._search_batch(batch, search_expired) for batch in batches]
+        return [result for batch_results in results for result in batch_results]
+
+    def _search_batch(self, uids_batch, search_expired):
+        search_filter = self._ldap_search_filter(uids_batch, 'uid', search_expired)
+        for attempt in range(2):
+            try:
+                with self.pool.connection(fresh=bool(attempt)) as conn:
+                    conn.search('dc=berkeley,dc=edu', search_filter, attributes=list(SCHEMA_DICT.keys()))
+                    return [_attributes_to_dict(entry, search_expired) for entry in conn.entries]
+            except LDAPCommunicationError as e:
+                # Pooled connections might have been dropped by the server. Discard the idle ones, which are likely
+                # dropped too, and retry once with a new connection.
+                if attempt:
+                    raise e
+                self.logger.warning(f'LDAP connection failed ({e}). Will retry.')
+                self.pool.discard_idle()
 
     @classmethod
     def _ldap_search_filter(cls, ids, id_type, search_expired=False):
@@ -90,3 +132,49 @@ def _attributes_to_dict(entry, expired_per_ldap):
         if attr in entry.entry_attributes:
             out[SCHEMA_DICT[attr]] = entry[attr].value
     return out
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, size):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self, fresh=False):
+        # Connections are opened and bound on demand, and at most 'size' are checked out at once.
+        with self._slots:
+            conn = None if fresh else self._get_idle()
+            if not conn or conn.closed:
+                conn = self._connect()
+            try:
+                yield conn
+            except Exception:
+                _unbind(conn)
+                raise
+            self._idle.put(conn)
+
+    def close(self):
+        self.discard_idle()
+
+    def discard_idle(self):
+        while True:
+            conn = self._get_idle()
+            if not conn:
+                break
+            _unbind(conn)
+
+    def _get_idle(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return None
+
+
+def _unbind(conn):
+    # Unbind of a dropped connection might raise. The connection is discarded regardless.
+    try:
+        conn.unbind()
+    except Exception:
+        pass
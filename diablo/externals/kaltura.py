@@ -22,12 +22,19 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import date, datetime, time, timedelta
 import hashlib
 import json
+import math
+from queue import Empty, LifoQueue
+from threading import local, Lock, Thread
+from time import monotonic, sleep
+from weakref import WeakSet
 
 import dateutil.parser
-from diablo import cachify, skip_when_pytest
+from diablo import cache, cachify, NEGATIVE_CACHE_ENTRY, skip_when_pytest
 from diablo.lib.berkeley import get_first_matching_datetime_of_term, get_recording_end_date, get_recording_start_date, \
     term_name_for_sis_id
 from diablo.lib.kaltura_util import get_classification_name, get_recurrence_name, get_series_description, \
@@ -35,44 +42,34 @@ from diablo.lib.kaltura_util import get_classification_name, get_recurrence_name
 from diablo.lib.util import default_timezone, epoch_time_to_isoformat, format_days
 from flask import current_app as app
 from KalturaClient import KalturaClient, KalturaConfiguration
-from KalturaClient.Plugins.Core import KalturaBaseEntry, KalturaCategoryEntry, KalturaCategoryEntryFilter, \
+from KalturaClient.exceptions import KalturaClientException, KalturaException
+from KalturaClient.Plugins.Core import KalturaBaseEntry, KalturaBaseEntryFilter, KalturaCategoryEntry, KalturaCategoryEntryFilter, \
     KalturaCategoryEntryStatus, KalturaCategoryFilter, KalturaEntryDisplayInSearchType, KalturaEntryModerationStatus, \
     KalturaEntryStatus, KalturaEntryType, KalturaFilterPager, KalturaMediaEntryFilter
 from KalturaClient.Plugins.Schedule import KalturaRecordScheduleEvent, KalturaRecordScheduleEventFilter, \
     KalturaScheduleEventClassificationType, KalturaScheduleEventFilter, KalturaScheduleEventRecurrence, \
     KalturaScheduleEventRecurrenceFrequency, KalturaScheduleEventRecurrenceType, KalturaScheduleEventResource, \
     KalturaScheduleEventStatus, KalturaScheduleResourceFilter, KalturaSessionType
+import requests
 
 CREATED_BY_DIABLO_TAG = 'rtl_course_capture'
 
 DEFAULT_KALTURA_PAGE_SIZE = 200
 
+MAX_KALTURA_PAGE_SIZE = 500
 
-class Kaltura:
+# Process-wide Kaltura sessions, per service url, partner and app token.
+_kaltura_sessions = {}
+_kaltura_sessions_lock = Lock()
 
-    @skip_when_pytest()
-    def __init__(self):
-        expiry = app.config['KALTURA_EXPIRY']
-        partner_id = app.config['KALTURA_PARTNER_ID']
 
-        self.client = KalturaClient(KalturaConfiguration())
-        result = self.client.session.startWidgetSession(
-            expiry=expiry,
-            widgetId=f'_{partner_id}',
-        )
-        self.client.setKs(result.ks)
+class Kaltura:
 
-        token_hash = hashlib.sha256((result.ks + app.config['KALTURA_APP_TOKEN']).encode('ascii')).hexdigest()
-        result = self.client.appToken.startSession(
-            expiry=expiry,
-            id=app.config['KALTURA_APP_TOKEN_ID'],
-            tokenHash=token_hash,
-            type=KalturaSessionType.ADMIN,
-        )
-        self.client.setKs(result.ks)
+    def __init__(self):
+        self.client = self._get_client()
 
     @skip_when_pytest()
-    def add_to_kaltura_category(self, category_id, entry_id):
+    def add_to_kaltura_category(self, category_id, entry_id, batch=None):
         category_entry_user_id = 'RecordScheduleGroup'  # TODO: Does this need to be be configurable? Probably.
         category_entry = KalturaCategoryEntry(
             categoryId=category_id,
@@ -80,30 +77,24 @@ class Kaltura:
             status=KalturaCategoryEntryStatus.ACTIVE,
             creatorUserId=category_entry_user_id,
         )
-        self.client.categoryEntry.add(category_entry)
+        return self._call(lambda client: client.categoryEntry.add(category_entry), batch=batch)
+
+    @contextmanager
+    def batch(self, batch_size=None):
+        kaltura_batch = KalturaBatch(client=self.client, batch_size=batch_size or app.config['KALTURA_BATCH_SIZE'])
+        yield kaltura_batch
+        kaltura_batch.flush()
 
     @skip_when_pytest()
     def get_base_entry(self, entry_id):
         entry = self.client.baseEntry.get(entryId=entry_id)
-        if entry:
-            return {
-                'createdAt': entry.createdAt,
-                'creatorId': entry.creatorId,
-                'description': entry.description,
-                'displayInSearch': entry.displayInSearch,
-                'entitledUsersEdit': entry.entitledUsersEdit,
-                'entitledUsersPublish': entry.entitledUsersPublish,
-                'entitledUsersView': entry.entitledUsersView,
-                'id': entry.id,
-                'name': entry.name,
-                'partnerId': entry.partnerId,
-                'status': entry.status,
-                'tags': entry.tags,
-                'updatedAt': entry.updatedAt,
-                'userId': entry.userId,
-            }
-        else:
-            return None
+        return _base_entry_to_json(entry) if entry else None
+
+    @skip_when_pytest(mock_object={})
+    def get_base_entries_per_id(self, entry_ids):
+        with self.batch() as batch:
+            results_per_id = dict((id_, batch.add(lambda client, id_=id_: client.baseEntry.get(entryId=id_))) for id_ in set(entry_ids))
+        return _values_per_key(results_per_id, to_json=_base_entry_to_json)
 
     @skip_when_pytest()
     def get_categories(self, template_entry_id):
@@ -115,6 +106,39 @@ class Kaltura:
         else:
             return []
 
+    @skip_when_pytest(mock_object={})
+    def get_categories_per_entry_id(self, entry_ids):
+        def _list_category_entries(client, entry_id):
+            return client.categoryEntry.list(
+                filter=KalturaCategoryEntryFilter(entryIdEqual=entry_id),
+                pager=KalturaFilterPager(pageIndex=1, pageSize=DEFAULT_KALTURA_PAGE_SIZE),
+            )
+
+        def _list_categories(client, category_ids):
+            return client.category.list(
+                filter=KalturaCategoryFilter(idIn=','.join(str(id_) for id_ in category_ids)),
+                pager=KalturaFilterPager(pageIndex=1, pageSize=DEFAULT_KALTURA_PAGE_SIZE),
+            )
+        # First round trip(s): category entries per entry. Second: the distinct categories of all entries.
+        with self.batch() as batch:
+            results_per_id = dict((id_, batch.add(lambda client, id_=id_: _list_category_entries(client, id_))) for id_ in set(entry_ids))
+        category_ids_per_entry_id = dict(
+            (entry_id, [obj.categoryId for obj in response.objects]) for entry_id, response in _values_per_key(results_per_id).items()
+        )
+        category_ids = sorted(set(id_ for ids in category_ids_per_entry_id.values() for id_ in ids))
+        with self.batch() as batch:
+            results = []
+            for index in range(0, len(category_ids), DEFAULT_KALTURA_PAGE_SIZE):
+                chunk = category_ids[index:index + DEFAULT_KALTURA_PAGE_SIZE]
+                results.append(batch.add(lambda client, chunk=chunk: _list_categories(client, chunk)))
+        categories_per_id = {}
+        for response in _values_per_key(dict(enumerate(results))).values():
+            categories_per_id.update((obj.id, _category_object_to_json(obj)) for obj in response.objects)
+        return dict(
+            (entry_id, [categories_per_id[id_] for id_ in ids if id_ in categories_per_id])
+            for entry_id, ids in category_ids_per_entry_id.items()
+        )
+
     @skip_when_pytest()
     def get_events_by_location(self, kaltura_resource_id):
         event_filter = KalturaScheduleEventFilter(
@@ -124,16 +148,32 @@ class Kaltura:
         return self._get_events(kaltura_event_filter=event_filter)
 
     @skip_when_pytest()
-    def get_events_by_tag(self, tags_like=CREATED_BY_DIABLO_TAG):
-        return self._get_events(kaltura_event_filter=KalturaScheduleEventFilter(tagsLike=tags_like))
+    def get_events_by_tag(self, tags_like=CREATED_BY_DIABLO_TAG, fields=None):
+        return self._get_events(kaltura_event_filter=KalturaScheduleEventFilter(tagsLike=tags_like), fields=fields)
 
     @skip_when_pytest()
     def get_event(self, event_id):
         events = self._get_events(kaltura_event_filter=KalturaScheduleEventFilter(idEqual=event_id))
         return events[0] if events else None
 
+    @skip_when_pytest(mock_object={})
+    def get_events_per_id(self, event_ids):
+        def _list_events(client, event_id):
+            return client.schedule.scheduleEvent.list(
+                filter=KalturaScheduleEventFilter(idEqual=event_id),
+                pager=KalturaFilterPager(pageIndex=1, pageSize=1),
+            )
+        with self.batch() as batch:
+            results_per_id = dict((id_, batch.add(lambda client, id_=id_: _list_events(client, id_))) for id_ in set(event_ids))
+        events_per_id = {}
+        for event_id, response in _values_per_key(results_per_id).items():
+            events = _events_to_api_json(response.objects)
+            if events:
+                events_per_id[event_id] = events[0]
+        return events_per_id
+
     @skip_when_pytest()
-    def get_events_in_date_range(self, end_date, start_date, recurrence_type=None):
+    def get_events_in_date_range(self, end_date, start_date, fields=None, recurrence_type=None):
         end_date_timestamp = int(end_date.timestamp())
         start_date_timestamp = int(start_date.timestamp())
         if recurrence_type is None:
@@ -147,29 +187,61 @@ class Kaltura:
                 recurrenceTypeEqual=recurrence_type,
                 startDateGreaterThanOrEqual=start_date_timestamp,
             )
-        return self._get_events(kaltura_event_filter=event_filter)
+        return self._get_events(kaltura_event_filter=event_filter, fields=fields)
 
     @cachify('kaltura/schedule_resources', timeout=30)
     def get_schedule_resources(self):
-        def _fetch(page_index):
-            return self.client.schedule.scheduleResource.list(
+        def _fetch(client, pager):
+            return client.schedule.scheduleResource.list(
                 filter=KalturaScheduleResourceFilter(),
-                pager=KalturaFilterPager(pageIndex=page_index, pageSize=DEFAULT_KALTURA_PAGE_SIZE),
+                pager=pager,
             )
-        return [{'id': o.id, 'name': o.name} for o in _get_kaltura_objects(_fetch)]
+        return [{'id': o.id, 'name': o.name} for o in _get_kaltura_objects(self.client, _fetch)]
 
     @skip_when_pytest()
     def get_canvas_category_object(self, canvas_course_site_id):
-        return self.get_category_object(name=f'Canvas>site>channels>{canvas_course_site_id}')
+        return self.get_category_object(name=_canvas_category_name(canvas_course_site_id))
+
+    @skip_when_pytest(mock_object={})
+    def get_canvas_category_objects_per_site_id(self, canvas_course_site_ids):
+        full_name_per_site_id = dict((site_id, _canvas_category_name(site_id)) for site_id in canvas_course_site_ids)
+        categories_per_full_name = self.get_categories_per_full_name(full_name_per_site_id.values())
+        return dict(
+            (site_id, categories_per_full_name[full_name])
+            for site_id, full_name in full_name_per_site_id.items() if full_name in categories_per_full_name
+        )
+
+    @skip_when_pytest(mock_object={})
+    def get_categories_per_full_name(self, full_names):
+        # Category ids (e.g., of Canvas site channels) rarely change. Categories are cached per full name, including
+        # negative entries for names not found. Cache misses are fetched with fullNameIn filters, many names per call.
+        full_names = list(dict.fromkeys(full_names))
+        cached_categories = cache.get_many(*[_category_cache_key(name) for name in full_names]) if full_names else []
+        categories_per_full_name = dict((name, category) for name, category in zip(full_names, cached_categories) if category is not None)
+        missing_names = [name for name in full_names if name not in categories_per_full_name]
+        if missing_names:
+            fetched_categories_per_full_name = {}
+            for names in _chunks(missing_names):
+                category_filter = KalturaCategoryFilter(fullNameIn=','.join(names))
+                for category in self._get_categories(kaltura_category_filter=category_filter):
+                    fetched_categories_per_full_name[category['fullName']] = category
+            cache.set_many(
+                dict((_category_cache_key(name), category) for name, category in fetched_categories_per_full_name.items()),
+                timeout=app.config['KALTURA_CATEGORY_CACHE_TIMEOUT'],
+            )
+            cache.set_many(
+                dict((_category_cache_key(name), NEGATIVE_CACHE_ENTRY) for name in missing_names if name not in fetched_categories_per_full_name),
+                timeout=app.config['KALTURA_CATEGORY_NEGATIVE_CACHE_TIMEOUT'],
+            )
+            categories_per_full_name.update(fetched_categories_per_full_name)
+        return dict(
+            (name, categories_per_full_name[name])
+            for name in full_names if categories_per_full_name.get(name, NEGATIVE_CACHE_ENTRY) != NEGATIVE_CACHE_ENTRY
+        )
 
     @skip_when_pytest()
     def get_category_object(self, name):
-        response = self.client.category.list(
-            filter=KalturaCategoryFilter(fullNameEqual=name),
-            pager=KalturaFilterPager(pageIndex=1, pageSize=1),
-        )
-        category_objects = [_category_object_to_json(o) for o in response.objects]
-        return category_objects[0] if category_objects else None
+        return self.get_categories_per_full_name([name]).get(name)
 
     @skip_when_pytest(mock_object=int(datetime.now().timestamp()))
     def schedule_recording(
@@ -183,16 +255,11 @@ class Kaltura:
             room,
             term_id,
     ):
-        category_ids = []
-        common_category = self.get_category_object(name=app.config['KALTURA_COMMON_CATEGORY'])
-        if common_category:
-            category_ids.append(common_category['id'])
-
+        category_names = [app.config['KALTURA_COMMON_CATEGORY']]
         if publish_type == 'kaltura_media_gallery':
-            for canvas_course_site_id in canvas_course_site_ids:
-                category = self.get_canvas_category_object(canvas_course_site_id=canvas_course_site_id)
-                if category:
-                    category_ids.append(category['id'])
+            category_names += [_canvas_category_name(canvas_course_site_id) for canvas_course_site_id in canvas_course_site_ids]
+        categories_per_full_name = self.get_categories_per_full_name(category_names)
+        category_ids = [categories_per_full_name[name]['id'] for name in category_names if name in categories_per_full_name]
 
         kaltura_schedule = self._schedule_recurring_events_in_kaltura(
             category_ids=category_ids,
@@ -205,7 +272,7 @@ class Kaltura:
             term_id=term_id,
         )
         recurrences_filter = KalturaScheduleEventFilter(parentIdEqual=kaltura_schedule.id)
-        for recurrence in self._get_events(kaltura_event_filter=recurrences_filter):
+        for recurrence in self._get_events(kaltura_event_filter=recurrences_filter, fields=['blackoutConflicts']):
             if recurrence['blackoutConflicts']:
                 self.client.schedule.scheduleEvent.cancel(recurrence['id'])
                 app.logger.warn(f"""
@@ -234,7 +301,7 @@ class Kaltura:
                 else:
                     # Series started in the past. Delete only the future 'recurrences'.
                     recurrences_filter = KalturaScheduleEventFilter(parentIdEqual=event_id)
-                    for recurrence in self._get_events(kaltura_event_filter=recurrences_filter):
+                    for recurrence in self._get_events(kaltura_event_filter=recurrences_filter, fields=['startDate']):
                         if is_future(kaltura_event=recurrence):
                             self.client.schedule.scheduleEvent.cancel(recurrence['id'])
             elif recurrence_type == 'Recurrence':
@@ -244,6 +311,49 @@ class Kaltura:
                 # This is not a series event. Delete it, whatever it is.
                 self.client.schedule.scheduleEvent.delete(event_id)
 
+    @skip_when_pytest(mock_object={})
+    def prefetch_base_entries(self, entry_ids):
+        # Unlike baseEntry.get, baseEntry.list skips entries of status NO_CONTENT unless told otherwise.
+        base_entries_per_id = {}
+        for ids in _chunks(entry_ids):
+            def _fetch(client, pager, ids=ids):
+                return client.baseEntry.list(
+                    filter=KalturaBaseEntryFilter(idIn=','.join(ids), statusNotIn=KalturaEntryStatus.DELETED),
+                    pager=pager,
+                )
+            base_entries_per_id.update((obj.id, _base_entry_to_json(obj)) for obj in _get_kaltura_objects(self.client, _fetch))
+        return base_entries_per_id
+
+    @skip_when_pytest(mock_object={})
+    def prefetch_categories_per_entry_id(self, entry_ids):
+        category_ids_per_entry_id = dict((entry_id, []) for entry_id in entry_ids)
+        for ids in _chunks(entry_ids):
+            category_entry_filter = KalturaCategoryEntryFilter(entryIdIn=','.join(ids))
+            for category_entry in self._get_category_entries(category_entry_filter):
+                category_ids_per_entry_id[category_entry['entryId']].append(category_entry['categoryId'])
+        categories_per_id = {}
+        for ids in _chunks(set(id_ for ids in category_ids_per_entry_id.values() for id_ in ids)):
+            category_filter = KalturaCategoryFilter(idIn=','.join(str(id_) for id_ in ids))
+            categories_per_id.update((category['id'], category) for category in self._get_categories(kaltura_category_filter=category_filter))
+        return dict(
+            (entry_id, [categories_per_id[id_] for id_ in ids if id_ in categories_per_id])
+            for entry_id, ids in category_ids_per_entry_id.items()
+        )
+
+    @skip_when_pytest(mock_object={})
+    def prefetch_events(self, event_ids):
+        events_per_id = {}
+        for ids in _chunks(event_ids):
+            event_filter = KalturaScheduleEventFilter(idIn=','.join(str(id_) for id_ in ids))
+            events_per_id.update((event['id'], event) for event in self._get_events(kaltura_event_filter=event_filter))
+        return events_per_id
+
+    def prefetch_categories(self, canvas_course_site_ids):
+        # Cache categories (of Canvas sites, and common) in bulk, ahead of per-course lookups.
+        category_names = [app.config['KALTURA_COMMON_CATEGORY']]
+        category_names += [_canvas_category_name(canvas_course_site_id) for canvas_course_site_id in canvas_course_site_ids]
+        return self.get_categories_per_full_name(category_names)
+
     def ping(self):
         filter_ = KalturaMediaEntryFilter()
         filter_.nameLike = "Love is the drug I'm thinking of"
@@ -260,47 +370,50 @@ class Kaltura:
             name,
             uids_entitled_to_edit,
             uids_entitled_to_publish,
+            batch=None,
     ):
-        self.client.baseEntry.update(
-            entryId=entry_id,
-            baseEntry=KalturaBaseEntry(
-                description=description,
-                displayInSearch=KalturaEntryDisplayInSearchType.PARTNER_ONLY,
-                entitledUsersEdit=','.join(_to_normalized_set(uids_entitled_to_edit)),
-                entitledUsersPublish=','.join(_to_normalized_set(uids_entitled_to_publish)),
-                moderationStatus=KalturaEntryModerationStatus.AUTO_APPROVED,
-                name=name,
-                partnerId=app.config['KALTURA_PARTNER_ID'],
-                status=KalturaEntryStatus.NO_CONTENT,
-                tags=CREATED_BY_DIABLO_TAG,
-                type=KalturaEntryType.MEDIA_CLIP,
-                userId='RecordScheduleGroup',
-            ),
+        base_entry = KalturaBaseEntry(
+            description=description,
+            displayInSearch=KalturaEntryDisplayInSearchType.PARTNER_ONLY,
+            entitledUsersEdit=','.join(_to_normalized_set(uids_entitled_to_edit)),
+            entitledUsersPublish=','.join(_to_normalized_set(uids_entitled_to_publish)),
+            moderationStatus=KalturaEntryModerationStatus.AUTO_APPROVED,
+            name=name,
+            partnerId=app.config['KALTURA_PARTNER_ID'],
+            status=KalturaEntryStatus.NO_CONTENT,
+            tags=CREATED_BY_DIABLO_TAG,
+            type=KalturaEntryType.MEDIA_CLIP,
+            userId='RecordScheduleGroup',
         )
+        return self._call(lambda client: client.baseEntry.update(entryId=entry_id, baseEntry=base_entry), batch=batch)
 
-    def _get_events(self, kaltura_event_filter):
-        def _fetch(page_index):
-            return self.client.schedule.scheduleEvent.list(
+    def _call(self, call, batch=None):
+        # If batch is provided then the call is queued and its KalturaBatchResult is returned.
+        return batch.add(call) if batch else call(self.client)
+
+    def _get_events(self, kaltura_event_filter, fields=None):
+        def _fetch(client, pager):
+            return client.schedule.scheduleEvent.list(
                 filter=kaltura_event_filter,
-                pager=KalturaFilterPager(pageIndex=page_index, pageSize=DEFAULT_KALTURA_PAGE_SIZE),
+                pager=pager,
             )
-        return _events_to_api_json(_get_kaltura_objects(_fetch))
+        return _events_to_api_json(_get_kaltura_objects(self.client, _fetch), fields=fields)
 
     def _get_categories(self, kaltura_category_filter):
-        def _fetch(page_index):
-            return self.client.category.list(
+        def _fetch(client, pager):
+            return client.category.list(
                 filter=kaltura_category_filter,
-                pager=KalturaFilterPager(pageIndex=page_index, pageSize=DEFAULT_KALTURA_PAGE_SIZE),
+                pager=pager,
             )
-        return [_category_object_to_json(obj) for obj in _get_kaltura_objects(_fetch)]
+        return [_category_object_to_json(obj) for obj in _get_kaltura_objects(self.client, _fetch)]
 
     def _get_category_entries(self, kaltura_category_entry_filter):
-        def _fetch(page_index):
-            return self.client.categoryEntry.list(
+        def _fetch(client, pager):
+            return client.categoryEntry.list(
                 filter=kaltura_category_entry_filter,
-                pager=KalturaFilterPager(pageIndex=page_index, pageSize=DEFAULT_KALTURA_PAGE_SIZE),
+                pager=pager,
             )
-        return [_category_entry_object_to_json(obj) for obj in _get_kaltura_objects(_fetch)]
+        return [_category_entry_object_to_json(obj) for obj in _get_kaltura_objects(self.client, _fetch)]
 
     def _schedule_recurring_events_in_kaltura(
             self,
@@ -420,6 +533,10 @@ class Kaltura:
         )
         return self.client.baseEntry.add(base_entry)
 
+    @skip_when_pytest()
+    def _get_client(self):
+        return get_kaltura_sessions().get_client()
+
     def _attach_scheduled_recordings_to_room(self, kaltura_schedule, room):
         utc_now_timestamp = int(datetime.utcnow().timestamp())
         event_resource = self.client.schedule.scheduleEventResource.add(
@@ -434,6 +551,186 @@ class Kaltura:
         app.logger.info(f'Kaltura schedule {kaltura_schedule.id} attached to {room.location}: {event_resource}')
 
 
+class KalturaSessions:
+
+    def __init__(self, app_token, app_token_id, expiry, logger, partner_id, refresh_margin, service_url):
+        self.app_token = app_token
+        self.app_token_id = app_token_id
+        self.expiry = expiry
+        # Per Kaltura docs, a KS expires after 24 hours if expiry is not specified.
+        self.ks_lifetime = expiry or 86400
+        self.logger = logger
+        self.partner_id = partner_id
+        self.refresh_margin = refresh_margin
+        self.service_url = service_url
+        self._clients = WeakSet()
+        self._idle_clients = LifoQueue()
+        self._ks = None
+        self._ks_expires_at = 0
+        self._ks_refresh_at = 0
+        self._local = local()
+        self._lock = Lock()
+        self._refresh_thread = None
+
+    @contextmanager
+    def borrow_client(self):
+        client = _get_nowait(self._idle_clients) or self._new_client()
+        client.setKs(self.get_ks())
+        try:
+            yield client
+        finally:
+            self._idle_clients.put(client)
+
+    def get_client(self):
+        # KalturaClient is not thread-safe. Each thread gets a client of its own, reused across Kaltura instances.
+        client = getattr(self._local, 'client', None) or self._new_client()
+        self._local.client = client
+        client.setKs(self.get_ks())
+        return client
+
+    def get_ks(self):
+        now = monotonic()
+        if now >= self._ks_expires_at:
+            with self._lock:
+                if monotonic() >= self._ks_expires_at:
+                    self._refresh_ks()
+        elif now >= self._ks_refresh_at:
+            # The KS is still valid. Callers get it while a new one is started in the background.
+            with self._lock:
+                if not self._refresh_thread or not self._refresh_thread.is_alive():
+                    self._refresh_thread = Thread(target=self._refresh_ks_in_background, daemon=True)
+                    self._refresh_thread.start()
+        return self._ks
+
+    def _new_client(self):
+        client = PooledKalturaClient(KalturaConfiguration(serviceUrl=self.service_url), sessions=self)
+        self._clients.add(client)
+        return client
+
+    def _refresh_ks(self):
+        started_at = monotonic()
+        client = KalturaClient(KalturaConfiguration(serviceUrl=self.service_url))
+        result = client.session.startWidgetSession(
+            expiry=self.expiry,
+            widgetId=f'_{self.partner_id}',
+        )
+        client.setKs(result.ks)
+
+        token_hash = hashlib.sha256((result.ks + self.app_token).encode('ascii')).hexdigest()
+        result = client.appToken.startSession(
+            expiry=self.expiry,
+            id=self.app_token_id,
+            tokenHash=token_hash,
+            type=KalturaSessionType.ADMIN,
+        )
+        self._ks = result.ks
+        self._ks_expires_at = started_at + self.ks_lifetime
+        self._ks_refresh_at = self._ks_expires_at - min(self.refresh_margin, self.ks_lifetime / 2)
+        for pooled_client in list(self._clients):
+            pooled_client.setKs(self._ks)
+
+    def _refresh_ks_in_background(self):
+        try:
+            with self._lock:
+                if monotonic() >= self._ks_refresh_at:
+                    self._refresh_ks()
+        except Exception as e:
+            # The current KS is used until it expires. Then, refresh is attempted in the foreground.
+            self.logger.warning(f'Failed to refresh Kaltura session: {e}')
+
+
+class PooledKalturaClient(KalturaClient):
+
+    def __init__(self, config, sessions):
+        super().__init__(config)
+        # KalturaClient posts with 'requests.post', a new HTTP connection per call. We keep the connection alive.
+        self.http_session = requests.Session()
+        self.sessions = sessions
+
+    def openRequestUrl(self, url, params, files, request_headers, request_timeout):  # noqa: N802
+        if files:
+            return KalturaClient.openRequestUrl(url, params, files, request_headers, request_timeout)
+        request_headers['Accept'] = 'text/xml'
+        request_headers['Accept-encoding'] = 'gzip'
+        request_headers['Content-Type'] = 'application/json'
+        try:
+            return self.http_session.post(url, json=params.get() or None, headers=request_headers, timeout=request_timeout)
+        except Exception as e:
+            raise KalturaClientException(e, KalturaClientException.ERROR_CONNECTION_FAILED)
+
+
+def get_kaltura_sessions():
+    key = (app.config['KALTURA_SERVICE_URL'], app.config['KALTURA_PARTNER_ID'], app.config['KALTURA_APP_TOKEN_ID'])
+    with _kaltura_sessions_lock:
+        if key not in _kaltura_sessions:
+            _kaltura_sessions[key] = KalturaSessions(
+                app_token=app.config['KALTURA_APP_TOKEN'],
+                app_token_id=app.config['KALTURA_APP_TOKEN_ID'],
+                expiry=app.config['KALTURA_EXPIRY'],
+                logger=app.logger,
+                partner_id=app.config['KALTURA_PARTNER_ID'],
+                refresh_margin=app.config['KALTURA_SESSION_REFRESH_MARGIN'],
+                service_url=app.config['KALTURA_SERVICE_URL'],
+            )
+        return _kaltura_sessions[key]
+
+
+def reset_kaltura_sessions():
+    with _kaltura_sessions_lock:
+        _kaltura_sessions.clear()
+
+
+class KalturaBatch:
+
+    def __init__(self, client, batch_size):
+        self.batch_size = batch_size
+        self.client = client
+        self.round_trips = 0
+        self._queue = []
+
+    def add(self, call, to_json=None):
+        # The 'call' function gets the Kaltura client, in multirequest mode. The response is available after flush.
+        result = KalturaBatchResult(to_json=to_json)
+        self._queue.append((call, result))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+        return result
+
+    def flush(self):
+        if not self._queue:
+            return
+        queue, self._queue = self._queue, []
+        self.client.startMultiRequest()
+        try:
+            for call, _ in queue:
+                call(self.client)
+            responses = self.client.doMultiRequest()
+        finally:
+            # A failed round trip must not leave the client in multirequest mode.
+            self.client.callsQueue = []
+            self.client.multiRequestReturnType = None
+        self.round_trips += 1
+        for (_, result), response in zip(queue, responses):
+            result.resolve(response)
+
+
+class KalturaBatchResult:
+
+    def __init__(self, to_json=None):
+        self.error = None
+        self.is_resolved = False
+        self.value = None
+        self._to_json = to_json
+
+    def resolve(self, response):
+        if isinstance(response, KalturaException):
+            # Kaltura reports errors per call of the multirequest.
+            self.error = response
+        else:
+            self.value = self._to_json(response) if self._to_json and response is not None else response
+        self.is_resolved = True
+
+
 def _adjust_time(military_time, offset_minutes):
     hour_and_minutes = military_time.split(':')
     hour = int(hour_and_minutes[0])
@@ -445,90 +742,163 @@ def _adjust_time(military_time, offset_minutes):
     ) + timedelta(minutes=offset_minutes)
 
 
+def _base_entry_to_json(entry):
+    return {
+        'createdAt': entry.createdAt,
+        'creatorId': entry.creatorId,
+        'description': entry.description,
+        'displayInSearch': entry.displayInSearch,
+        'entitledUsersEdit': entry.entitledUsersEdit,
+        'entitledUsersPublish': entry.entitledUsersPublish,
+        'entitledUsersView': entry.entitledUsersView,
+        'id': entry.id,
+        'name': entry.name,
+        'partnerId': entry.partnerId,
+        'status': entry.status,
+        'tags': entry.tags,
+        'updatedAt': entry.updatedAt,
+        'userId': entry.userId,
+    }
+
+
 def _category_entry_object_to_json(obj):
     return {
         'categoryId': obj.categoryId,
+        'entryId': obj.entryId,
         'status': obj.status,
     }
 
 
+def _canvas_category_name(canvas_course_site_id):
+    return f'Canvas>site>channels>{canvas_course_site_id}'
+
+
+def _category_cache_key(full_name):
+    return f'kaltura/category_{full_name}'
+
+
 def _category_object_to_json(obj):
     return {
+        'fullName': obj.fullName,
         'id': obj.id,
         'name': obj.name,
     }
 
 
-def _get_kaltura_objects(_fetch):
-    response = _fetch(1)
-    total_count = response.totalCount
+def _chunks(ids, chunk_size=DEFAULT_KALTURA_PAGE_SIZE):
+    ids = sorted(set(ids))
+    return [ids[index:index + chunk_size] for index in range(0, len(ids), chunk_size)]
+
+
+def _get_kaltura_objects(client, _fetch):
+    # Page one tells us the total count. Remaining pages are fetched concurrently, each thread with its own client.
+    page_size = min(app.config['KALTURA_PAGE_SIZE'], MAX_KALTURA_PAGE_SIZE)
+    max_attempts = app.config['KALTURA_PAGE_FETCH_ATTEMPTS']
+    logger = app.logger
+    response = _fetch_page(client, _fetch, logger, max_attempts, 1, page_size)
     objects = response.objects
-    for page in range(2, int(total_count / DEFAULT_KALTURA_PAGE_SIZE) + 2):
-        objects += _fetch(page).objects
+    page_count = math.ceil((response.totalCount or 0) / page_size)
+    if page_count > 1:
+        sessions = client.sessions if isinstance(client, PooledKalturaClient) else _ClonedClients(client)
+
+        def _fetch_in_thread(page_index):
+            with sessions.borrow_client() as thread_client:
+                return _fetch_page(thread_client, _fetch, logger, max_attempts, page_index, page_size).objects
+        max_workers = min(app.config['KALTURA_PAGE_FETCH_THREADS'], page_count - 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Results of 'map' are in page order.
+            for page_objects in executor.map(_fetch_in_thread, range(2, page_count + 1)):
+                objects += page_objects
     return objects
 
 
+class _ClonedClients:
+
+    def __init__(self, client):
+        self.client = client
+        self._idle_clients = LifoQueue()
+
+    @contextmanager
+    def borrow_client(self):
+        clone = _get_nowait(self._idle_clients)
+        if not clone:
+            clone = KalturaClient(self.client.getConfig())
+            # E.g., the KS (Kaltura session) is part of request configuration.
+            clone.clientConfiguration.update(self.client.clientConfiguration)
+            clone.requestConfiguration.update(self.client.requestConfiguration)
+        try:
+            yield clone
+        finally:
+            self._idle_clients.put(clone)
+
+
+def _fetch_page(client, _fetch, logger, max_attempts, page_index, page_size):
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return _fetch(client, KalturaFilterPager(pageIndex=page_index, pageSize=page_size))
+        except KalturaClientException as e:
+            # Network and response-parsing errors are transient. Kaltura API errors (KalturaException) are not retried.
+            if attempt == max_attempts:
+                raise
+            logger.warning(f'Kaltura page {page_index}, attempt {attempt} of {max_attempts}, failed: {e}')
+            sleep(0.5 * attempt)
+
+
+def _get_nowait(queue):
+    try:
+        return queue.get_nowait()
+    except Empty:
+        return None
+
+
 def _to_normalized_set(strings):
     return set([s.strip().lower() for s in strings])
 
 
-def _events_to_api_json(events):
-    # Time to organize. Find 'recurring' events and their corresponding 'recurrences'.
+def _values_per_key(results_per_key, to_json=None):
+    values_per_key = {}
+    for key, result in results_per_key.items():
+        if result.error:
+            app.logger.warning(f'Kaltura batch: call per {key} failed: {result.error}')
+        elif result.value is not None:
+            values_per_key[key] = to_json(result.value) if to_json else result.value
+    return values_per_key
+
+
+def _events_to_api_json(events, fields=None):
+    # Time to organize. Find 'recurring' events and their corresponding 'recurrences', in a single pass.
     recurring_events = []
-    miscellanea = []
-    for event in [_event_to_json(event) for event in events]:
+    others = []
+    for event in [_event_to_json(event, fields=fields) for event in events]:
         if represents_recording_series(event):
+            event['recurrences'] = []
             recurring_events.append(event)
         else:
-            miscellanea.append(event)
-
+            others.append(event)
+    recurring_events_per_id = {}
     for recurring_event in recurring_events:
-        def _belongs_in_the_series(e):
-            return e.get('recurrenceType', '').lower() == 'recurrence' and e.get('parentId') == recurring_event['id']
-        # Find events of the series.
-        recurrences = list(filter(lambda e: _belongs_in_the_series(e), miscellanea))
-        recurring_event['recurrences'] = recurrences
-        for recurrence in recurrences:
-            # The 'recurrence' is removed from the generic list.
-            miscellanea.remove(recurrence)
+        recurring_events_per_id.setdefault(recurring_event['id'], recurring_event)
+
+    miscellanea = []
+    for event in others:
+        is_recurrence = (event.get('recurrenceType') or '').lower() == 'recurrence'
+        series = recurring_events_per_id.get(event.get('parentId')) if is_recurrence else None
+        if series:
+            series['recurrences'].append(event)
+        else:
+            miscellanea.append(event)
     return recurring_events + miscellanea
 
 
-def _event_to_json(event):
-    conflicts = [_blackout_to_json(e) for e in event.blackoutConflicts] if hasattr(event, 'blackoutConflicts') and event.blackoutConflicts else None
-    api_json = {
-        'blackoutConflicts': conflicts,
-        'categoryIds': json.loads(event.categoryIds) if hasattr(event, 'categoryIds') and event.categoryIds else [],
-        'classificationType': get_classification_name(event.classificationType),
-        'comment': event.comment,
-        'contact': event.contact,
-        'createdAt': epoch_time_to_isoformat(event.createdAt),
-        'description': event.description,
-        'duration': event.duration,
-        'durationFormatted': str(timedelta(seconds=event.duration)) if event.duration else None,
-        'endDate': epoch_time_to_isoformat(event.endDate),
-        'geoLatitude': event.geoLatitude,
-        'geoLongitude': event.geoLongitude,
-        'id': event.id,
-        'location': event.location,
-        'name': event.name if hasattr(event, 'name') else None,
-        'organizer': event.organizer,
-        'ownerId': event.ownerId,
-        'parentId': event.parentId,
-        'partnerId': event.partnerId,
-        'priority': event.priority,
-        'recurrenceType': get_recurrence_name(event.recurrenceType),
-        'referenceId': event.referenceId,
-        'relatedObjects': event.relatedObjects,
-        'sequence': event.sequence,
-        'startDate': epoch_time_to_isoformat(event.startDate),
-        'status': get_status_name(event.status),
-        'summary': event.summary,
-        'tags': event.tags,
-        'templateEntryId': event.templateEntryId if hasattr(event, 'templateEntryId') else None,
-        'updatedAt': epoch_time_to_isoformat(event.updatedAt),
-    }
-    if event.recurrence:
+def _event_to_json(event, fields=None):
+    # If 'fields' is specified then other properties of the event are not converted. Properties needed to organize
+    # recurring events are always converted.
+    field_names = None if fields is None else set(fields).union(['id', 'parentId', 'recurrenceType'])
+    api_json = {}
+    for field_name, to_json in _EVENT_JSON_CONVERTERS.items():
+        if field_names is None or field_name in field_names:
+            api_json[field_name] = to_json(event)
+    if event.recurrence and (field_names is None or 'recurrence' in field_names):
         api_json['recurrence'] = {
             'byDay': event.recurrence.byDay,
             'byHour': event.recurrence.byHour,
@@ -550,6 +920,40 @@ def _event_to_json(event):
     return api_json
 
 
+_EVENT_JSON_CONVERTERS = {
+    'blackoutConflicts': lambda e: [_blackout_to_json(b) for b in e.blackoutConflicts] if getattr(e, 'blackoutConflicts', None) else None,
+    'categoryIds': lambda e: json.loads(e.categoryIds) if hasattr(e, 'categoryIds') and e.categoryIds else [],
+    'classificationType': lambda e: get_classification_name(e.classificationType),
+    'comment': lambda e: e.comment,
+    'contact': lambda e: e.contact,
+    'createdAt': lambda e: epoch_time_to_isoformat(e.createdAt),
+    'description': lambda e: e.description,
+    'duration': lambda e: e.duration,
+    'durationFormatted': lambda e: str(timedelta(seconds=e.duration)) if e.duration else None,
+    'endDate': lambda e: epoch_time_to_isoformat(e.endDate),
+    'geoLatitude': lambda e: e.geoLatitude,
+    'geoLongitude': lambda e: e.geoLongitude,
+    'id': lambda e: e.id,
+    'location': lambda e: e.location,
+    'name': lambda e: e.name if hasattr(e, 'name') else None,
+    'organizer': lambda e: e.organizer,
+    'ownerId': lambda e: e.ownerId,
+    'parentId': lambda e: e.parentId,
+    'partnerId': lambda e: e.partnerId,
+    'priority': lambda e: e.priority,
+    'recurrenceType': lambda e: get_recurrence_name(e.recurrenceType),
+    'referenceId': lambda e: e.referenceId,
+    'relatedObjects': lambda e: e.relatedObjects,
+    'sequence': lambda e: e.sequence,
+    'startDate': lambda e: epoch_time_to_isoformat(e.startDate),
+    'status': lambda e: get_status_name(e.status),
+    'summary': lambda e: e.summary,
+    'tags': lambda e: e.tags,
+    'templateEntryId': lambda e: e.templateEntryId if hasattr(e, 'templateEntryId') else None,
+    'updatedAt': lambda e: epoch_time_to_isoformat(e.updatedAt),
+}
+
+
 def _blackout_to_json(event):
     return {
         'classificationType': get_classification_name(event.classificationType),
@@ -44,6 +44,7 @@ class BlackoutsJob(BaseJob):
                 start_date = localize_datetime(blackout.start_date)
                 events = kaltura.get_events_in_date_range(
                     end_date=end_date,
+                    fields=['id', 'summary', 'tags'],
                     recurrence_type=KalturaScheduleEventRecurrenceType.RECURRENCE,
                     start_date=start_date,
                 )
@@ -68,68 +68,114 @@ def _get_subset_of_instructors(section_id, term_id, uids, include_deleted=False)
 def _update_already_scheduled_events():
     kaltura = Kaltura()
     term_id = app.config['CURRENT_TERM_ID']
-    for course in SisSection.get_courses_scheduled(include_administrative_proxies=True, term_id=term_id):
-        course_name = course['label']
-        scheduled = course['scheduled']
-        kaltura_schedule = kaltura.get_event(event_id=scheduled['kalturaScheduleId'])
-        if kaltura_schedule:
-            template_entry_id = kaltura_schedule['templateEntryId']
-            if course['canvasCourseSites'] and scheduled['publishType'] == 'kaltura_media_gallery':
-                # From Kaltura, get Canvas course sites (categories) currently mapped to the course.
-                categories = kaltura.get_categories(template_entry_id)
-
-                for s in course['canvasCourseSites']:
-                    canvas_course_site_id = str(s['courseSiteId'])
-                    if canvas_course_site_id not in [c['name'] for c in categories]:
-                        _update_kaltura_category(
-                            canvas_course_site_id=canvas_course_site_id,
-                            course_name=course_name,
-                            kaltura=kaltura,
-                            template_entry_id=template_entry_id,
-                        )
-            # Update Kaltura edit permissions per UID.
-            uids_entitled_to_edit = set(scheduled['instructorUids'])
-            if course['canAprxInstructorsEditRecordings']:
-                instructors = course['instructors']
-                aprx_instructors = list(filter(lambda i: i['roleCode'] == 'APRX' and not i['deletedAt'], instructors))
-                uids_entitled_to_edit.update([i['uid'] for i in aprx_instructors])
-            uids_entitled_to_edit = list(uids_entitled_to_edit)
-            instructors_entitled_to_edit = _get_subset_of_instructors(
-                include_deleted=True,
-                section_id=course['sectionId'],
-                term_id=term_id,
-                uids=uids_entitled_to_edit,
-            )
-            description = get_series_description(
-                course_label=course_name,
-                instructors=instructors_entitled_to_edit,
-                term_name=term_name_for_sis_id(term_id),
-            )
-            # Preserve existing UIDs, added manually or otherwise, in Kaltura.
-            base_entry = kaltura.get_base_entry(template_entry_id)
-            existing_uids = {
-                'entitled_users_edit': base_entry['entitledUsersEdit'].split(','),
-                'entitled_users_publish': base_entry['entitledUsersPublish'].split(','),
-            }
-            kaltura.update_base_entry(
-                description=description,
-                entry_id=template_entry_id,
-                name=kaltura_schedule.get('name'),
-                uids_entitled_to_edit=list(set(uids_entitled_to_edit + existing_uids['entitled_users_edit'])),
-                uids_entitled_to_publish=list(set(uids_entitled_to_edit + existing_uids['entitled_users_publish'])),
-            )
-        else:
-            app.logger.warn(f'The previously scheduled {course_name} has no schedule_event in Kaltura.')
-
-
-def _update_kaltura_category(canvas_course_site_id, course_name, kaltura, template_entry_id):
-    category = kaltura.get_canvas_category_object(canvas_course_site_id=canvas_course_site_id)
-    if category:
-        app.logger.info(f'{course_name}: add Kaltura category for canvas_course_site {canvas_course_site_id}')
-        kaltura.add_to_kaltura_category(
-            category_id=category['id'],
-            entry_id=template_entry_id,
-        )
+    term_name = term_name_for_sis_id(term_id)
+    courses = SisSection.get_courses_scheduled(include_administrative_proxies=True, term_id=term_id)
+    # Kaltura objects are fetched up front, and updated in batches (i.e., multirequests), rather than course by course.
+    events_per_id, base_entries_per_id, categories_per_entry_id = _get_kaltura_objects_of_courses(courses, kaltura)
+    # From Kaltura, get Canvas course sites (categories) not yet mapped to courses.
+    canvas_course_site_ids = set()
+    for course in courses:
+        kaltura_schedule = events_per_id.get(course['scheduled']['kalturaScheduleId'])
+        if kaltura_schedule and _is_published_to_canvas(course):
+            categories = categories_per_entry_id.get(kaltura_schedule['templateEntryId'], [])
+            canvas_course_site_ids.update(_get_unmapped_canvas_course_site_ids(categories, course))
+    canvas_categories_per_site_id = kaltura.get_canvas_category_objects_per_site_id(canvas_course_site_ids)
+
+    results = []
+    with kaltura.batch() as batch:
+        for course in courses:
+            course_name = course['label']
+            scheduled = course['scheduled']
+            kaltura_schedule = events_per_id.get(scheduled['kalturaScheduleId'])
+            if kaltura_schedule:
+                template_entry_id = kaltura_schedule['templateEntryId']
+                if _is_published_to_canvas(course):
+                    categories = categories_per_entry_id.get(template_entry_id, [])
+                    for canvas_course_site_id in _get_unmapped_canvas_course_site_ids(categories, course):
+                        category = canvas_categories_per_site_id.get(canvas_course_site_id)
+                        if category:
+                            app.logger.info(f'{course_name}: add Kaltura category for canvas_course_site {canvas_course_site_id}')
+                            result = kaltura.add_to_kaltura_category(
+                                batch=batch,
+                                category_id=category['id'],
+                                entry_id=template_entry_id,
+                            )
+                            results.append((course_name, result))
+                # Update Kaltura edit permissions per UID.
+                uids_entitled_to_edit = set(scheduled['instructorUids'])
+                if course['canAprxInstructorsEditRecordings']:
+                    instructors = course['instructors']
+                    aprx_instructors = list(filter(lambda i: i['roleCode'] == 'APRX' and not i['deletedAt'], instructors))
+                    uids_entitled_to_edit.update([i['uid'] for i in aprx_instructors])
+                uids_entitled_to_edit = list(uids_entitled_to_edit)
+                instructors_entitled_to_edit = _get_subset_of_instructors(
+                    include_deleted=True,
+                    section_id=course['sectionId'],
+                    term_id=term_id,
+                    uids=uids_entitled_to_edit,
+                )
+                description = get_series_description(
+                    course_label=course_name,
+                    instructors=instructors_entitled_to_edit,
+                    term_name=term_name,
+                )
+                # Preserve existing UIDs, added manually or otherwise, in Kaltura.
+                base_entry = base_entries_per_id.get(template_entry_id)
+                if base_entry:
+                    existing_uids = {
+                        'entitled_users_edit': base_entry['entitledUsersEdit'].split(','),
+                        'entitled_users_publish': base_entry['entitledUsersPublish'].split(','),
+                    }
+                    result = kaltura.update_base_entry(
+                        batch=batch,
+                        description=description,
+                        entry_id=template_entry_id,
+                        name=kaltura_schedule.get('name'),
+                        uids_entitled_to_edit=list(set(uids_entitled_to_edit + existing_uids['entitled_users_edit'])),
+                        uids_entitled_to_publish=list(set(uids_entitled_to_edit + existing_uids['entitled_users_publish'])),
+                    )
+                    results.append((course_name, result))
+                else:
+                    app.logger.warn(f'{course_name}: Kaltura base entry {template_entry_id} not found.')
+            else:
+                app.logger.warn(f'The previously scheduled {course_name} has no schedule_event in Kaltura.')
+    for course_name, result in results:
+        if result and result.error:
+            app.logger.error(f'{course_name}: Kaltura update failed: {result.error}')
+
+
+def _get_kaltura_objects_of_courses(courses, kaltura):
+    # In 'prefetch' mode, Kaltura objects are listed (idIn filter) a page at a time. In 'batch' mode, they are
+    # fetched by id with KALTURA_BATCH_SIZE calls per multirequest.
+    prefetch = app.config['KALTURA_SCHEDULED_EVENTS_SYNC_MODE'] == 'prefetch'
+    event_ids = [course['scheduled']['kalturaScheduleId'] for course in courses]
+    events_per_id = kaltura.prefetch_events(event_ids) if prefetch else kaltura.get_events_per_id(event_ids)
+
+    template_entry_ids = [event['templateEntryId'] for event in events_per_id.values()]
+    if prefetch:
+        base_entries_per_id = kaltura.prefetch_base_entries(template_entry_ids)
+    else:
+        base_entries_per_id = kaltura.get_base_entries_per_id(template_entry_ids)
+
+    template_entry_ids = [
+        events_per_id[course['scheduled']['kalturaScheduleId']]['templateEntryId']
+        for course in courses if _is_published_to_canvas(course) and course['scheduled']['kalturaScheduleId'] in events_per_id
+    ]
+    if prefetch:
+        categories_per_entry_id = kaltura.prefetch_categories_per_entry_id(template_entry_ids)
+    else:
+        categories_per_entry_id = kaltura.get_categories_per_entry_id(template_entry_ids)
+    return events_per_id, base_entries_per_id, categories_per_entry_id
+
+
+def _get_unmapped_canvas_course_site_ids(categories, course):
+    category_names = [c['name'] for c in categories]
+    canvas_course_site_ids = [str(s['courseSiteId']) for s in course['canvasCourseSites']]
+    return [site_id for site_id in canvas_course_site_ids if site_id not in category_names]
+
+
+def _is_published_to_canvas(course):
+    return course['canvasCourseSites'] and course['scheduled']['publishType'] == 'kaltura_media_gallery'
 
 
 def _schedule_the_ready_to_schedule():
@@ -139,6 +185,9 @@ def _schedule_the_ready_to_schedule():
         approvals_per_section_id = objects_to_dict_organized_by_section_id(objects=approvals)
         ready_to_schedule = get_courses_ready_to_schedule(approvals=approvals, term_id=term_id)
         app.logger.info(f'Prepare to schedule recordings for {len(ready_to_schedule)} courses.')
+        # One bulk lookup of Kaltura categories, in lieu of per-course lookups while scheduling.
+        canvas_course_site_ids = set(str(s['courseSiteId']) for course in ready_to_schedule for s in course['canvasCourseSites'])
+        Kaltura().prefetch_categories(canvas_course_site_ids)
         for course in ready_to_schedule:
             section_id = int(course['sectionId'])
             schedule_recordings(
@@ -46,6 +46,7 @@ class RemindInviteesJob(BaseJob):
             term_id=term_id,
         )
         scheduled_by_section_id = {s.section_id: s for s in Scheduled.get_all_scheduled(term_id=term_id)}
+        course_recipients = []
         for course in courses:
             section_id = course['sectionId']
             if section_id not in scheduled_by_section_id:
@@ -55,12 +56,12 @@ class RemindInviteesJob(BaseJob):
                     for i in course['instructors']:
                         uid = i['uid']
                         if uid not in approved_by_uids and uid in invitation_recipient_uids:
-                            QueuedEmail.create(
-                                recipient=i,
-                                section_id=section_id,
-                                template_type='remind_invitees',
-                                term_id=term_id,
-                            )
+                            course_recipients.append((course, i))
+        QueuedEmail.create_all(
+            course_recipients=course_recipients,
+            template_type='remind_invitees',
+            term_id=term_id,
+        )
 
     @classmethod
     def description(cls):
@@ -22,12 +22,15 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+import time
+
 from diablo.externals.rds import execute
 from diablo.jobs.base_job import BaseJob
 from diablo.jobs.errors import BackgroundJobError
 from diablo.jobs.util import insert_or_update_instructors, refresh_cross_listings, refresh_rooms
 from diablo.lib.db import resolve_sql_template
 from diablo.models.sis_section import SisSection
+from diablo.models.user import clear_user_cache
 from flask import current_app as app
 
 
@@ -35,11 +38,17 @@ class SisDataRefreshJob(BaseJob):
 
     def _run(self, args=None):
         resolved_ddl_rds = resolve_sql_template('update_rds_sis_sections.template.sql')
-        if execute(resolved_ddl_rds):
-            term_id = app.config['CURRENT_TERM_ID']
+        if not execute(resolved_ddl_rds):
+            raise BackgroundJobError('Failed to update RDS indexes for intermediate schema.')
+        if not execute(resolve_sql_template('merge_sis_sections.template.sql')):
+            raise BackgroundJobError('Failed to merge SIS data into sis_sections.')
+        term_id = app.config['CURRENT_TERM_ID']
+        changes = SisSection.get_sis_section_changes(term_id)
+        app.logger.info(', '.join(f'{len(section_ids)} sections {change_type}' for change_type, section_ids in changes.items()))
+        if app.config['SIS_DATA_REFRESH_FULL_REBUILD']:
             self.after_sis_data_refresh(term_id)
         else:
-            raise BackgroundJobError('Failed to update RDS indexes for intermediate schema.')
+            self.after_sis_data_refresh(term_id, changes=changes)
 
     @classmethod
     def description(cls):
@@ -50,13 +59,38 @@ class SisDataRefreshJob(BaseJob):
         return 'sis_data_refresh'
 
     @classmethod
-    def after_sis_data_refresh(cls, term_id):
-        distinct_instructor_uids = SisSection.get_distinct_instructor_uids()
-        insert_or_update_instructors(distinct_instructor_uids)
-        app.logger.info(f'{len(distinct_instructor_uids)} instructors updated')
+    def after_sis_data_refresh(cls, term_id, changes=None):
+        # A change set, per SisSection.get_sis_section_changes, limits downstream work to affected sections. If changes
+        # is None then instructors, rooms and cross-listings are fully rebuilt.
+        if changes is None:
+            updated_section_ids = affected_section_ids = None
+        else:
+            updated_section_ids = changes['added'] + changes['changed']
+            affected_section_ids = updated_section_ids + changes['removed']
+
+        started_at = time.perf_counter()
+        if changes is None:
+            instructor_uids = SisSection.get_distinct_instructor_uids()
+        else:
+            instructor_uids = SisSection.get_distinct_instructor_uids(section_ids=updated_section_ids, term_id=term_id)
+        if instructor_uids:
+            insert_or_update_instructors(instructor_uids)
+        app.logger.info(f'{len(instructor_uids)} instructors updated in {time.perf_counter() - started_at:.3f}s')
+
+        started_at = time.perf_counter()
+        if changes is None:
+            refresh_rooms()
+        else:
+            refresh_rooms(locations=SisSection.get_distinct_meeting_locations(section_ids=updated_section_ids, term_id=term_id))
+        app.logger.info(f'RDS indexes updated in {time.perf_counter() - started_at:.3f}s')
+
+        started_at = time.perf_counter()
+        refresh_cross_listings(section_ids=affected_section_ids, term_id=term_id)
+        app.logger.info(f'Cross-listings updated in {time.perf_counter() - started_at:.3f}s')
 
-        refresh_rooms()
-        app.logger.info('RDS indexes updated.')
+        # Teaching status of users might have changed.
+        clear_user_cache()
 
-        refresh_cross_listings(term_id=term_id)
-        app.logger.info('Cross-listings updated.')
+        started_at = time.perf_counter()
+        stored_count = SisSection.refresh_course_documents(term_id=term_id)
+        app.logger.info(f'{stored_count} course documents stored in {time.perf_counter() - started_at:.3f}s')
@@ -40,13 +40,14 @@ class InvitationEmailsTask(BaseTask):
         return f"Queues up '{EmailTemplate.get_template_type_options()['invitation']}' emails."
 
     def email_new_invites(self):
+        course_recipients = []
         for course in SisSection.get_courses(term_id=self.term_id):
             if not course['hasOptedOut'] and len(course.get('meetings', {}).get('eligible', [])) >= 1:
                 for i in course['instructors']:
                     if not i['wasSentInvite']:
-                        QueuedEmail.create(
-                            recipient=i,
-                            section_id=course['sectionId'],
-                            template_type='invitation',
-                            term_id=self.term_id,
-                        )
+                        course_recipients.append((course, i))
+        QueuedEmail.create_all(
+            course_recipients=course_recipients,
+            template_type='invitation',
+            term_id=self.term_id,
+        )
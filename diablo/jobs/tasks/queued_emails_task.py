@@ -22,37 +22,15 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
-from diablo.externals.b_connected import BConnected
 from diablo.jobs.tasks.base_task import BaseTask
-from diablo.models.queued_email import QueuedEmail
-from diablo.models.sis_section import SisSection
+from diablo.merged.email_dispatcher import EmailDispatcher
 from flask import current_app as app
 
 
 class QueuedEmailsTask(BaseTask):
 
     def _run(self):
-        term_id = app.config['CURRENT_TERM_ID']
-        for queued_email in QueuedEmail.get_all(term_id):
-            course = SisSection.get_course(term_id, queued_email.section_id, include_deleted=True)
-            if not course:
-                app.logger.warn(f'Email will remain queued until course data is present: {queued_email}')
-                continue
-            if course['hasOptedOut']:
-                QueuedEmail.delete(queued_email)
-                continue
-            if BConnected().send(
-                message=queued_email.message,
-                recipient=queued_email.recipient,
-                section_id=queued_email.section_id,
-                subject_line=queued_email.subject_line,
-                template_type=queued_email.template_type,
-                term_id=term_id,
-            ):
-                QueuedEmail.delete(queued_email)
-            else:
-                # If send() fails then report the error and DO NOT delete the queued item.
-                app.logger.error(f'Failed to send email: {queued_email}')
+        EmailDispatcher(term_id=app.config['CURRENT_TERM_ID']).drain()
 
     @classmethod
     def description(cls):
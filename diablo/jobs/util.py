@@ -22,8 +22,8 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
-from itertools import islice
 import re
+import time
 import traceback
 
 from diablo import db, std_commit
@@ -41,7 +41,8 @@ from diablo.models.scheduled import Scheduled
 from diablo.models.sis_section import ALL_INSTRUCTOR_ROLE_CODES, AUTHORIZED_INSTRUCTOR_ROLE_CODES, SisSection
 from flask import current_app as app
 from KalturaClient.exceptions import KalturaClientException, KalturaException
-from sqlalchemy import text
+import psycopg2.extras
+from sqlalchemy import and_, text
 
 
 def get_courses_ready_to_schedule(approvals, term_id):
@@ -96,119 +97,160 @@ def insert_or_update_instructors(instructor_uids):
     Instructor.upsert(instructors)
 
 
-def refresh_rooms():
-    locations = SisSection.get_distinct_meeting_locations()
-    existing_locations = Room.get_all_locations()
+def refresh_rooms(locations=None):
+    # If locations is None then rooms of all SIS meeting locations are refreshed. Otherwise, only new locations get a
+    # room and a Kaltura resource mapping.
+    existing_locations = set(Room.get_all_locations())
+    is_full_rebuild = locations is None
+    if is_full_rebuild:
+        locations = SisSection.get_distinct_meeting_locations()
     new_locations = [location for location in locations if location not in existing_locations]
+    new_rooms = []
     if new_locations:
         app.logger.info(f'Creating {len(new_locations)} new rooms')
         for location in new_locations:
-            Room.create(location=location)
+            new_rooms.append(Room.create(location=location))
+    rooms = Room.all_rooms() if is_full_rebuild else new_rooms
+    if not rooms:
+        return
 
     def _normalize(room_location):
         return re.sub(r'[\W_]+', '', room_location).lower()
+    rooms_per_location = {}
+    for room in rooms:
+        location = _normalize(room.location)
+        if location:
+            rooms_per_location.setdefault(location, room)
     kaltura_resource_ids_per_room = {}
-    all_rooms = Room.all_rooms()
     for resource in Kaltura().get_schedule_resources():
-        location = _normalize(resource['name'])
-        if location:
-            for room in all_rooms:
-                if _normalize(room.location) == location:
-                    kaltura_resource_ids_per_room[room.id] = resource['id']
-                    break
+        room = rooms_per_location.get(_normalize(resource['name']))
+        if room:
+            kaltura_resource_ids_per_room[room.id] = resource['id']
 
     if kaltura_resource_ids_per_room:
-        Room.update_kaltura_resource_mappings(kaltura_resource_ids_per_room)
+        Room.update_kaltura_resource_mappings(kaltura_resource_ids_per_room, reset_all=is_full_rebuild)
 
 
-def refresh_cross_listings(term_id):
+def refresh_cross_listings(term_id, section_ids=None):
     # Populate 'cross_listings' table: If {123, 234, 345} is a set of cross-listed section_ids then:
     #  1. Section 123 will have a record in the 'sis_sections' table; 234 and 345 will not.
     #  2. The cross-listings table will get 123: [234, 345]
     #  3. We collapse the names of the three section into a single name/title for section 123
 
-    # IMPORTANT: These will be ordered by schedule (time and location)
-    sql = """
-                SELECT
-                    section_id,
-                    trim(concat(
-                        meeting_days,
-                        meeting_end_date,
-                        meeting_end_time,
-                        meeting_location,
-                        meeting_start_date,
-                        meeting_start_time
-                    )) as schedule
-                FROM sis_sections
-                WHERE
-                    term_id = :term_id
-                    AND meeting_days <> ''
-                    AND meeting_end_date IS NOT NULL
-                    AND meeting_end_time <> ''
-                    AND meeting_location IS NOT NULL
-                    AND meeting_location NOT IN ('', 'Internet/Online', 'Off Campus', 'Requested General Assignment')
-                    AND meeting_start_date IS NOT NULL
-                    AND meeting_start_time <> ''
-                    AND deleted_at IS NULL
-                ORDER BY schedule, section_id
-            """
-    rows = []
-    for row in db.session.execute(text(sql), {'term_id': term_id}):
-        rows.append({'schedule': row['schedule'], 'section_id': row['section_id']})
-    register_cross_listings(rows, term_id)
+    # IMPORTANT: Cross-listed sections share a schedule (time and location).
+    schedules_sql = """
+        SELECT DISTINCT
+            section_id,
+            trim(concat(
+                meeting_days,
+                meeting_end_date,
+                meeting_end_time,
+                meeting_location,
+                meeting_start_date,
+                meeting_start_time
+            )) AS schedule
+        FROM sis_sections
+        WHERE
+            term_id = :term_id
+            AND meeting_days <> ''
+            AND meeting_end_date IS NOT NULL
+            AND meeting_end_time <> ''
+            AND meeting_location IS NOT NULL
+            AND meeting_location NOT IN ('', 'Internet/Online', 'Off Campus', 'Requested General Assignment')
+            AND meeting_start_date IS NOT NULL
+            AND meeting_start_time <> ''
+            AND deleted_at IS NULL
+    """
+    # If section_ids is None then all cross-listings of the term are rebuilt. Otherwise, only groups affected by the
+    # (added, changed or removed) sections are.
+    return _register_cross_listings(schedules_sql=schedules_sql, section_ids=section_ids, term_id=term_id)
 
 
 def register_cross_listings(rows, term_id):
-    cross_listings = {}
-    previous_schedule = None
-    primary_section = None
-
-    for row in rows:
-        section_id = row['section_id']
-        schedule = row['schedule']
-        if section_id not in cross_listings:
-            if schedule == previous_schedule:
-                primary_schedule = primary_section['schedule']
-                primary_section_id = primary_section['section_id']
-                if section_id not in cross_listings[primary_section_id] and schedule == primary_schedule:
-                    cross_listings[primary_section_id].append(section_id)
-            else:
-                primary_section = row
-                cross_listings[primary_section['section_id']] = []
-        previous_schedule = schedule
-
-    # Toss out section_ids with no cross-listings
-    for section_id, section_ids in cross_listings.copy().items():
+    # Rows of section_id and schedule (e.g., from a SIS data export) are bulk-loaded into a temporary table, then
+    # grouped the same way as sis_sections data.
+    started_at = time.perf_counter()
+    db.session.execute(text('DROP TABLE IF EXISTS cross_listing_schedules'))
+    db.session.execute(text('CREATE TEMPORARY TABLE cross_listing_schedules (section_id INTEGER, schedule TEXT) ON COMMIT DROP'))
+    cursor = db.session.connection().connection.cursor()
+    psycopg2.extras.execute_values(
+        cursor,
+        'INSERT INTO cross_listing_schedules (section_id, schedule) VALUES %s',
+        [(row['section_id'], row['schedule']) for row in rows],
+        page_size=1000,
+    )
+    app.logger.info(f'Cross-listings: {len(rows)} schedules loaded in {_elapsed(started_at)}')
+    return _register_cross_listings(
+        schedules_sql='SELECT DISTINCT section_id, schedule FROM cross_listing_schedules',
+        term_id=term_id,
+    )
+
+
+def _register_cross_listings(schedules_sql, term_id, section_ids=None):
+    # Sections are grouped by schedule. In each group, the lowest section_id is the principal section and the rest are
+    # its cross-listings. A principal section of more than one group (e.g., multiple meetings) keeps the first group.
+    started_at = time.perf_counter()
+    if section_ids is None:
+        db.session.execute(CrossListing.__table__.delete().where(CrossListing.term_id == term_id))
+    else:
+        section_ids = _get_cross_listing_scope(schedules_sql=schedules_sql, section_ids=section_ids, term_id=term_id)
         if not section_ids:
-            cross_listings.pop(section_id)
-
-    # Prepare for refresh by deleting old rows
-    db.session.execute(CrossListing.__table__.delete().where(CrossListing.term_id == term_id))
-
-    def chunks(data, chunk_size=500):
-        iterator = iter(data)
-        for i in range(0, len(data), chunk_size):
-            yield {k: data[k] for k in islice(iterator, chunk_size)}
-
-    non_principal_section_ids = []
-
-    for cross_listings_chunk in chunks(cross_listings):
-        cross_listing_count = len(cross_listings_chunk)
-        query = 'INSERT INTO cross_listings (term_id, section_id, cross_listed_section_ids, created_at) VALUES'
-        for index, (section_id, cross_listed_section_ids) in enumerate(cross_listings_chunk.items()):
-            query += f' (:term_id, {section_id}, ' + "'{" + _join(cross_listed_section_ids, ', ') + "}', now())"
-            if index < cross_listing_count - 1:
-                query += ','
-            non_principal_section_ids.extend(cross_listed_section_ids)
-        db.session.execute(query, {'term_id': term_id})
+            return {}
+        criteria = and_(CrossListing.term_id == term_id, CrossListing.section_id.in_(section_ids))
+        db.session.execute(CrossListing.__table__.delete().where(criteria))
+        schedules_sql = f'SELECT * FROM ({schedules_sql}) s WHERE section_id = ANY(:section_ids)'
+    app.logger.info(f'Cross-listings: old rows deleted in {_elapsed(started_at)}')
+
+    started_at = time.perf_counter()
+    sql = f"""
+        WITH schedules AS ({schedules_sql}),
+        schedule_groups AS (
+            SELECT schedule, ARRAY_AGG(section_id ORDER BY section_id) AS section_ids
+            FROM schedules
+            GROUP BY schedule
+            HAVING COUNT(*) > 1
+        )
+        INSERT INTO cross_listings (term_id, section_id, cross_listed_section_ids, created_at)
+        SELECT DISTINCT ON (section_ids[1]) :term_id, section_ids[1], section_ids[2:], now()
+        FROM schedule_groups
+        ORDER BY section_ids[1], schedule
+        RETURNING section_id, cross_listed_section_ids
+    """
+    cross_listings = {}
+    for row in db.session.execute(text(sql), {'section_ids': section_ids, 'term_id': term_id}):
+        cross_listings[row['section_id']] = row['cross_listed_section_ids']
+    app.logger.info(f'Cross-listings: {len(cross_listings)} detected and inserted in {_elapsed(started_at)}')
 
+    started_at = time.perf_counter()
+    CrossListing.refresh_members(term_id=term_id)
     # Mark cross-listed section_ids as non-principal listings to keep duplicate results out of SisSection queries.
+    sql = 'SELECT DISTINCT member_section_id FROM cross_listing_members WHERE term_id = :term_id'
+    non_principal_section_ids = [row['member_section_id'] for row in db.session.execute(text(sql), {'term_id': term_id})]
     SisSection.set_non_principal_listings(section_ids=non_principal_section_ids, term_id=term_id)
-
     std_commit()
+    app.logger.info(f'Cross-listings: members and non-principal listings updated in {_elapsed(started_at)}')
     return cross_listings
 
 
+def _get_cross_listing_scope(schedules_sql, section_ids, term_id):
+    # Sections that share a schedule, or a current cross-listing, with the given sections must be regrouped together.
+    scope = set(section_ids)
+    sql = f"""
+        WITH schedules AS ({schedules_sql})
+        SELECT section_id FROM schedules
+        WHERE schedule IN (SELECT schedule FROM schedules WHERE section_id = ANY(:section_ids))
+        UNION
+        SELECT UNNEST(ARRAY[principal_section_id, member_section_id]) FROM cross_listing_members
+        WHERE term_id = :term_id AND (principal_section_id = ANY(:section_ids) OR member_section_id = ANY(:section_ids))
+    """
+    while True:
+        rows = db.session.execute(text(sql), {'section_ids': list(scope), 'term_id': term_id})
+        expanded_scope = scope.union(row['section_id'] for row in rows)
+        if len(expanded_scope) == len(scope):
+            return sorted(scope)
+        scope = expanded_scope
+
+
 def schedule_recordings(all_approvals, course):
     def _report_error(subject):
         message = f'{subject}\n\n<pre>{course}</pre>'
@@ -307,5 +349,5 @@ def _get_uids_per_section_id(approvals):
     return uids_per_section_id
 
 
-def _join(items, separator=', '):
-    return separator.join(str(item) for item in items)
+def _elapsed(started_at):
+    return f'{time.perf_counter() - started_at:.3f}s'
@@ -0,0 +1,240 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from collections import OrderedDict
+import fnmatch
+import pickle
+import re
+from threading import Lock
+import time
+
+from flask_caching.backends.base import BaseCache
+from werkzeug.utils import import_string
+
+
+def key_family(key):
+    # E.g., 'calnet/user_for_uid_123' is of family 'calnet/user_for_uid_*'.
+    return re.sub(r'\d+', '*', key)
+
+
+class TwoTierCache(BaseCache):
+    """Two-tier cache backend for Flask-Caching: an in-process LRU in front of a shared cache."""
+
+    def __init__(self, shared, local_max_size=1000, local_timeout=60, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.shared = shared
+        self.local = LocalCache(max_size=local_max_size, timeout=local_timeout)
+        # Keys that this process has read or written, for inventory and invalidation by pattern.
+        self.known_keys = set()
+        self._stats = {}
+        self._stats_lock = Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        # The shared tier is any Flask-Caching backend (e.g., RedisCache), configured by the usual CACHE_* configs.
+        shared_class = import_string(config['CACHE_SHARED_TYPE'])
+        shared = shared_class.factory(app, config, [], {'default_timeout': kwargs['default_timeout']})
+        return cls(
+            shared=shared,
+            local_max_size=config['CACHE_LOCAL_MAX_SIZE'],
+            local_timeout=config['CACHE_LOCAL_TIMEOUT'],
+            **kwargs,
+        )
+
+    def get(self, key):
+        return self.get_many(key)[0]
+
+    def get_many(self, *keys):
+        values_per_key = self._get_values_per_key(keys)
+        with self._stats_lock:
+            for key in keys:
+                stats = self._get_stats(key_family(key))
+                stats['misses' if values_per_key[key] is None else 'hits'] += 1
+                if values_per_key[key] is not None:
+                    self.known_keys.add(key)
+        return [values_per_key[key] for key in keys]
+
+    def peek(self, key):
+        # Same as get(), but not counted in stats. E.g., cachify looks again, under its lock, after a counted miss.
+        return self._get_values_per_key([key])[key]
+
+    def has(self, key):
+        return self.local.get(key)[0] or self.shared.has(key)
+
+    def set(self, key, value, timeout=None):  # noqa: A003
+        timeout = self._normalize_timeout(timeout)
+        result = self.shared.set(key, value, timeout=timeout)
+        self.local.set(key, value, timeout=timeout)
+        with self._stats_lock:
+            self.known_keys.add(key)
+        return result
+
+    def set_many(self, mapping, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        result = self.shared.set_many(mapping, timeout=timeout)
+        for key, value in mapping.items():
+            self.local.set(key, value, timeout=timeout)
+        with self._stats_lock:
+            self.known_keys.update(mapping.keys())
+        return result
+
+    def add(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        added = self.shared.add(key, value, timeout=timeout)
+        if added:
+            self.local.set(key, value, timeout=timeout)
+            with self._stats_lock:
+                self.known_keys.add(key)
+        return added
+
+    def delete(self, key):
+        return bool(self.delete_many(key))
+
+    def delete_many(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        with self._stats_lock:
+            self.known_keys.difference_update(keys)
+        return self.shared.delete_many(*keys)
+
+    def delete_matching(self, pattern):
+        # Keys of the shared tier are listed when the backend allows it (e.g., Redis). Otherwise, only keys known to
+        # this process are matched.
+        keys = set(key for key in self.get_keys() if fnmatch.fnmatchcase(key, pattern))
+        if keys:
+            self.delete_many(*keys)
+        return sorted(keys)
+
+    def clear(self):
+        self.local.clear()
+        with self._stats_lock:
+            self.known_keys.clear()
+        return self.shared.clear()
+
+    def get_keys(self):
+        keys = set(self.known_keys)
+        redis_client = getattr(self.shared, '_read_client', None)
+        if redis_client:
+            prefix = self.shared.key_prefix or ''
+            keys.update(key.decode() if isinstance(key, bytes) else key for key in redis_client.keys(f'{prefix}*'))
+            keys = set(key[len(prefix):] if prefix and key.startswith(prefix) else key for key in keys)
+        return keys
+
+    def get_stats(self):
+        # Hits, misses, evictions and bytes (of the local tier) per key family.
+        keys_per_family = {}
+        for key in self.get_keys():
+            keys_per_family.setdefault(key_family(key), set()).add(key)
+        local_stats = self.local.get_stats()
+        stats_per_family = {}
+        with self._stats_lock:
+            families = set(self._stats) | set(local_stats) | set(keys_per_family)
+            for family in sorted(families):
+                stats_per_family[family] = {
+                    **self._stats.get(family, {'hits': 0, 'misses': 0}),
+                    **local_stats.get(family, {'bytes': 0, 'evictions': 0}),
+                    'keyCount': len(keys_per_family.get(family, [])),
+                }
+        return stats_per_family
+
+    def _get_stats(self, family):
+        if family not in self._stats:
+            self._stats[family] = {'hits': 0, 'misses': 0}
+        return self._stats[family]
+
+    def _get_values_per_key(self, keys):
+        values_per_key = {}
+        missing_keys = []
+        for key in keys:
+            found, value = self.local.get(key)
+            if found:
+                values_per_key[key] = value
+            else:
+                missing_keys.append(key)
+        if missing_keys:
+            for key, value in zip(missing_keys, self.shared.get_many(*missing_keys)):
+                values_per_key[key] = value
+                if value is not None:
+                    self.local.set(key, value)
+        return values_per_key
+
+
+class LocalCache:
+
+    def __init__(self, max_size, timeout):
+        # Values are kept pickled so that callers cannot mutate cached objects.
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._stats = {}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expires_at, dump = self._entries.get(key, (0, None))
+            if expires_at <= now:
+                if dump is not None:
+                    self._pop(key)
+                return False, None
+            self._entries.move_to_end(key)
+        return True, pickle.loads(dump)
+
+    def set(self, key, value, timeout=None):  # noqa: A003
+        # Local entries expire within 'self.timeout' seconds, so that changes made by other processes show up.
+        timeout = min(timeout, self.timeout) if timeout else self.timeout
+        dump = pickle.dumps(value)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + timeout, dump)
+            self._get_stats(key)['bytes'] += len(dump)
+            while len(self._entries) > self.max_size:
+                evicted_key = next(iter(self._entries))
+                self._pop(evicted_key)
+                self._get_stats(evicted_key)['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for stats in self._stats.values():
+                stats['bytes'] = 0
+
+    def get_stats(self):
+        with self._lock:
+            return dict((family, dict(stats)) for family, stats in self._stats.items())
+
+    def _get_stats(self, key):
+        family = key_family(key)
+        if family not in self._stats:
+            self._stats[family] = {'bytes': 0, 'evictions': 0}
+        return self._stats[family]
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._get_stats(key)['bytes'] -= len(entry[1])
@@ -23,12 +23,15 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from functools import lru_cache
 import re
 
 from diablo.lib.berkeley import term_name_for_sis_id
 from diablo.lib.util import get_names_of_days, readable_join
 from flask import current_app as app
 
+TEMPLATE_TOKEN_PATTERN = re.compile(r'<code>[ \n\t]*([^<]*?)[ \n\t]*</code>')
+
 
 def interpolate_content(
     course,
@@ -40,7 +43,6 @@ def interpolate_content(
     publish_type_name=None,
     recording_type_name=None,
 ):
-    interpolated = templated_string
     substitutions = get_template_substitutions(
         course=course,
         recipient_name=recipient_name,
@@ -50,13 +52,40 @@ def interpolate_content(
         publish_type_name=publish_type_name,
         recording_type_name=recording_type_name,
     )
-    for token, value in substitutions.items():
-        if value is None:
-            value = 'None'
-        elif type(value) == list:
-            value = ','.join(value)
-        interpolated = re.sub(f'<code>[ \n\t]*{token}[ \n\t]*</code>', value, interpolated)
-    return interpolated
+    return render_template(templated_string, substitutions)
+
+
+def render_template(templated_string, substitutions):
+    # Tokens without a substitution (e.g., typos) are left as is.
+    literals, tokens = compile_template(templated_string)
+    parts = [literals[0]]
+    for (token, original), literal in zip(tokens, literals[1:]):
+        if token in substitutions:
+            value = substitutions[token]
+            if value is None:
+                value = 'None'
+            elif type(value) == list:
+                value = ','.join(value)
+            parts.append(value)
+        else:
+            parts.append(original)
+        parts.append(literal)
+    return ''.join(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(templated_string):
+    # Parse once per distinct template (subject line or message) into literal text and (token, original) pairs, where
+    # len(literals) == len(tokens) + 1. An edited template is a new string and is parsed anew.
+    literals = []
+    tokens = []
+    position = 0
+    for match in TEMPLATE_TOKEN_PATTERN.finditer(templated_string):
+        literals.append(templated_string[position:match.start()])
+        tokens.append((match.group(1), match.group(0)))
+        position = match.end()
+    literals.append(templated_string[position:])
+    return tuple(literals), tuple(tokens)
 
 
 def get_sign_up_url(term_id, section_id):
@@ -73,6 +102,26 @@ def get_template_substitutions(
         publish_type_name=None,
         recording_type_name=None,
 ):
+    substitutions = get_course_substitutions(
+        course=course,
+        pending_instructors=pending_instructors,
+        previous_publish_type_name=previous_publish_type_name,
+        previous_recording_type_name=previous_recording_type_name,
+        publish_type_name=publish_type_name,
+        recording_type_name=recording_type_name,
+    )
+    return {**substitutions, 'recipient.name': recipient_name}
+
+
+def get_course_substitutions(
+        course,
+        pending_instructors=None,
+        previous_publish_type_name=None,
+        previous_recording_type_name=None,
+        publish_type_name=None,
+        recording_type_name=None,
+):
+    # All substitutions except those of the recipient. When emailing many instructors of a course, compute once.
     term_id = (course and course['termId']) or app.config['CURRENT_TERM_ID']
 
     def _join_names(_dict):
@@ -106,7 +155,6 @@ def get_template_substitutions(
         'instructors.previous': course and course.get('scheduled') and _join_names(course['scheduled'].get('instructors')),
         'publish.type': publish_type_name,
         'publish.type.previous': previous_publish_type_name,
-        'recipient.name': recipient_name,
         'recording.type': recording_type_name,
         'recording.type.previous': previous_recording_type_name,
         'signup.url': course and get_sign_up_url(term_id, course['sectionId']),
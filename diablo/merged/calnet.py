@@ -24,19 +24,44 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 import json
 from os import path
+from threading import Lock
 
-from diablo import cachify
+from diablo import cache
 from diablo.externals import calnet
 
+CALNET_CACHE_TIMEOUT = 86400
+
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_stats_lock = Lock()
+
 
-@cachify('calnet/user_for_uid_{uid}', timeout=86400)
 def get_calnet_user_for_uid(app, uid):
-    users = _get_calnet_users(app, [uid])
-    return users[uid] if users else None
+    return get_calnet_users_for_uids(app, [uid]).get(uid)
 
 
 def get_calnet_users_for_uids(app, uids):
-    return _get_calnet_users(app, uids)
+    # Cached users are fetched in bulk. Only cache misses go to CalNet, in a single batched search.
+    uids = list(dict.fromkeys(uids))
+    cached_users = cache.get_many(*[_cache_key(uid) for uid in uids]) if uids else []
+    users_by_uid = dict((uid, user) for uid, user in zip(uids, cached_users) if user is not None)
+    missing_uids = [uid for uid in uids if uid not in users_by_uid]
+    with _cache_stats_lock:
+        _cache_stats['hits'] += len(users_by_uid)
+        _cache_stats['misses'] += len(missing_uids)
+    if missing_uids:
+        calnet_users_by_uid = _get_calnet_users(app, missing_uids)
+        cache.set_many(dict((_cache_key(uid), user) for uid, user in calnet_users_by_uid.items()), timeout=CALNET_CACHE_TIMEOUT)
+        users_by_uid.update(calnet_users_by_uid)
+    return dict((uid, users_by_uid[uid]) for uid in uids if uid in users_by_uid)
+
+
+def get_calnet_cache_stats():
+    with _cache_stats_lock:
+        return dict(_cache_stats)
+
+
+def _cache_key(uid):
+    return f'calnet/user_for_uid_{uid}'
 
 
 def _get_calnet_users(app, uids):
@@ -51,11 +76,10 @@ def _get_calnet_users(app, uids):
                 users_by_uid[uid] = {'uid': uid}
     else:
         calnet_client = calnet.client(app)
-        calnet_results = calnet_client.search_uids(uids)
+        calnet_results_by_uid = dict((result['uid'], result) for result in calnet_client.search_uids(uids))
         for uid in uids:
-            calnet_result = next((r for r in calnet_results if r['uid'] == uid), None)
             feed = {
-                **_calnet_user_api_feed(calnet_result),
+                **_calnet_user_api_feed(calnet_results_by_uid.get(uid)),
                 **{'uid': uid},
             }
             users_by_uid[uid] = feed
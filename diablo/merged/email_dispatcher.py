@@ -0,0 +1,196 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, timezone
+from queue import Empty, LifoQueue
+from threading import Lock
+import time
+
+from diablo.externals.b_connected import BConnected, RateLimiter
+from diablo.lib.util import to_isoformat
+from diablo.models.queued_email import QueuedEmail
+from diablo.models.sis_section import SisSection
+from flask import current_app as app
+
+_last_drain_stats = {}
+_last_drain_stats_lock = Lock()
+
+
+class EmailDispatcher:
+    """Drain queued emails of the term.
+
+    This thread claims emails in batches and does all database work. A bounded pool of workers delivers the batch over
+    SMTP, each worker with its own SMTP session. The next batch is not claimed until the current one is delivered.
+    Failed deliveries are retried with exponential backoff and, after EMAIL_DISPATCH_MAX_ATTEMPTS, dead-lettered.
+    """
+
+    def __init__(self, term_id):
+        self.batch_size = app.config['EMAIL_QUEUE_BATCH_SIZE']
+        self.lease_seconds = app.config['EMAIL_DISPATCH_LEASE_SECONDS']
+        self.max_attempts = app.config['EMAIL_DISPATCH_MAX_ATTEMPTS']
+        self.retry_delay = app.config['EMAIL_DISPATCH_RETRY_DELAY']
+        self.retry_max_delay = app.config['EMAIL_DISPATCH_RETRY_MAX_DELAY']
+        self.term_id = term_id
+        self.worker_count = app.config['EMAIL_DISPATCH_WORKERS']
+
+    def drain(self):
+        stats = {'deadLettered': 0, 'optedOut': 0, 'retried': 0, 'sent': 0}
+        started_at = time.monotonic()
+        claimed_ids = set()
+        flask_app = app._get_current_object()
+        with _SmtpSessions(flask_app) as smtp_sessions, ThreadPoolExecutor(max_workers=self.worker_count) as executor:
+            while True:
+                queued_emails = QueuedEmail.claim(limit=self.batch_size, lease_seconds=self.lease_seconds, term_id=self.term_id)
+                if not queued_emails or claimed_ids.issuperset(e.id for e in queued_emails):
+                    break
+                claimed_ids.update(e.id for e in queued_emails)
+                sendable = self._get_sendable(queued_emails, stats)
+                # Snapshot before any commit expires the ORM objects.
+                deliveries = [(e, _to_delivery(e)) for e in sendable]
+                futures = [executor.submit(smtp_sessions.deliver, delivery) for _, delivery in deliveries]
+                for (queued_email, delivery), future in zip(deliveries, futures):
+                    self._record_result(queued_email, delivery, future, stats)
+        elapsed = time.monotonic() - started_at
+        stats['drainRate'] = round(stats['sent'] / elapsed, 3) if elapsed else None
+        stats['elapsedSeconds'] = round(elapsed, 3)
+        stats['finishedAt'] = to_isoformat(datetime.now(timezone.utc))
+        stats['workers'] = self.worker_count
+        with _last_drain_stats_lock:
+            _last_drain_stats.clear()
+            _last_drain_stats.update(stats)
+        app.logger.info(f'Email dispatch finished: {stats}')
+        return stats
+
+    def _get_sendable(self, queued_emails, stats):
+        # Course existence and opt-out of the batch, in one query. Emails of unknown courses stay queued (leased).
+        has_opted_out_per_section_id = SisSection.get_has_opted_out_per_section_id(
+            include_deleted=True,
+            section_ids=set(queued_email.section_id for queued_email in queued_emails),
+            term_id=self.term_id,
+        )
+        opted_out = []
+        sendable = []
+        for queued_email in queued_emails:
+            has_opted_out = has_opted_out_per_section_id.get(queued_email.section_id)
+            if has_opted_out is None:
+                app.logger.warn(f'Email will remain queued until course data is present: {queued_email}')
+            elif has_opted_out:
+                opted_out.append(queued_email)
+            else:
+                sendable.append(queued_email)
+        if opted_out:
+            QueuedEmail.delete_all(opted_out)
+            stats['optedOut'] += len(opted_out)
+        return sendable
+
+    def _record_result(self, queued_email, delivery, future, stats):
+        try:
+            delivered = future.result()
+            # An incomplete message will never be delivered, so no retry.
+            error = None if delivered else 'Message is missing required fields'
+            is_retryable = False
+        except Exception as e:
+            delivered = False
+            error = f'{type(e).__name__}: {e}'
+            is_retryable = delivery['attempts'] + 1 < self.max_attempts
+        if delivered:
+            BConnected.record_sent_email(
+                recipient=delivery['recipient'],
+                section_id=delivery['section_id'],
+                template_type=delivery['template_type'],
+                term_id=self.term_id,
+            )
+            QueuedEmail.delete(queued_email)
+            stats['sent'] += 1
+        elif is_retryable:
+            delay_seconds = min(self.retry_delay * 2 ** delivery['attempts'], self.retry_max_delay)
+            app.logger.warning(f"Failed to send queued email {delivery['id']}; will retry in {delay_seconds} seconds: {error}")
+            QueuedEmail.retry_later(queued_email, delay_seconds=delay_seconds, error=error)
+            stats['retried'] += 1
+        else:
+            app.logger.error(f"Dead-lettered queued email {delivery['id']} after {delivery['attempts'] + 1} attempt(s): {error}")
+            QueuedEmail.dead_letter(queued_email, error=error)
+            stats['deadLettered'] += 1
+
+
+def get_last_drain_stats():
+    with _last_drain_stats_lock:
+        return dict(_last_drain_stats)
+
+
+class _SmtpSessions:
+    # One BConnected session per worker thread. A worker borrows an idle session, else opens one. All sessions share
+    # one rate limiter, so the drain as a whole sends no faster than BCOP_SMTP_MESSAGES_PER_SECOND.
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.rate_limiter = RateLimiter(flask_app.config['BCOP_SMTP_MESSAGES_PER_SECOND'])
+        self._exit_stack = ExitStack()
+        self._idle_sessions = LifoQueue()
+        self._lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._exit_stack.close()
+
+    def deliver(self, delivery):
+        with self.flask_app.app_context(), self._borrow_session() as b_connected:
+            return b_connected.deliver(
+                message=delivery['message'],
+                recipient=delivery['recipient'],
+                subject_line=delivery['subject_line'],
+                template_type=delivery['template_type'],
+            )
+
+    @contextmanager
+    def _borrow_session(self):
+        try:
+            b_connected = self._idle_sessions.get_nowait()
+        except Empty:
+            with self._lock:
+                b_connected = self._exit_stack.enter_context(BConnected(rate_limiter=self.rate_limiter).session())
+        try:
+            yield b_connected
+        except Exception:
+            # The SMTP conversation might have stopped midway. The next borrower reconnects.
+            b_connected.disconnect()
+            raise
+        finally:
+            self._idle_sessions.put(b_connected)
+
+
+def _to_delivery(queued_email):
+    return {
+        'attempts': queued_email.attempts,
+        'id': queued_email.id,
+        'message': queued_email.message,
+        'recipient': queued_email.recipient,
+        'section_id': queued_email.section_id,
+        'subject_line': queued_email.subject_line,
+        'template_type': queued_email.template_type,
+    }
@@ -46,10 +46,12 @@ class AdminUser(Base):
 
     @classmethod
     def delete(cls, uid):
+        from diablo.models.user import clear_user_cache
         now = utc_now()
         user = cls.query.filter_by(uid=uid).first()
         user.deleted_at = now
         std_commit()
+        clear_user_cache(uid)
         return user
 
     @classmethod
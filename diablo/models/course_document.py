@@ -0,0 +1,190 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from datetime import datetime
+import hashlib
+import json
+
+from diablo import db
+from flask import current_app as app
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Bump when the course JSON of SisSection.get_courses changes, so that documents of the former format are rebuilt.
+FORMAT_VERSION = 1
+
+# Course JSON depends on these configs, e.g., nonstandardMeetingDates is relative to CURRENT_TERM_BEGIN and
+# CURRENT_TERM_END.
+FORMAT_CONFIGS = [
+    'COURSE_CAPTURE_PREMIUM_COST',
+    'CURRENT_TERM_BEGIN',
+    'CURRENT_TERM_END',
+    'CURRENT_TERM_RECORDINGS_BEGIN',
+    'CURRENT_TERM_RECORDINGS_END',
+    'TIMEZONE',
+]
+
+
+class CourseDocument(db.Model):
+    """Materialized course feed, keyed by (term_id, section_id).
+
+    Each document is the fully decorated course JSON of SisSection.get_courses (default parameters). Documents are
+    built out of band, by SisSection.refresh_course_documents; requests only read them. Documents are deleted by
+    database triggers whenever a row which contributes to the feed (approvals, scheduled, course_preferences,
+    sent/queued emails, cross-listings, Canvas sites, SIS data, rooms and instructors) is touched. See schema.sql.
+
+    The triggers also bump an invalidation generation per section (see course_document_generations). A document is
+    stored only if the generation of its section is unchanged since the build started, so a change committed during
+    the build cannot leave a stale document behind.
+
+    Each document is stamped with the format key (see FORMAT_VERSION and FORMAT_CONFIGS) of its build. Documents of
+    another format key are ignored, as if missing.
+    """
+
+    __tablename__ = 'course_documents'
+
+    term_id = db.Column(db.Integer, nullable=False, primary_key=True)
+    section_id = db.Column(db.Integer, nullable=False, primary_key=True)
+    course_name = db.Column(db.String)
+    api_json = db.Column(JSONB, nullable=False)
+    format_key = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __init__(self, term_id, section_id, course_name, api_json, format_key):
+        self.term_id = term_id
+        self.section_id = section_id
+        self.course_name = course_name
+        self.api_json = api_json
+        self.format_key = format_key
+
+    def __repr__(self):
+        return f"""<CourseDocument
+                    term_id={self.term_id},
+                    section_id={self.section_id},
+                    course_name={self.course_name},
+                    format_key={self.format_key},
+                    created_at={self.created_at}>
+                """
+
+    @classmethod
+    def get_format_key(cls):
+        format_ = [FORMAT_VERSION] + [app.config[key] for key in FORMAT_CONFIGS]
+        return hashlib.md5(json.dumps(format_, default=str).encode()).hexdigest()
+
+    @classmethod
+    def get_section_ids(cls, section_ids, term_id):
+        sql = """
+            SELECT section_id FROM course_documents
+            WHERE term_id = :term_id AND section_id = ANY(:section_ids) AND format_key = :format_key
+        """
+        rows = db.session.execute(text(sql), {'format_key': cls.get_format_key(), 'section_ids': section_ids, 'term_id': term_id})
+        return set(row['section_id'] for row in rows)
+
+    @classmethod
+    def get_api_json(cls, section_ids, term_id):
+        sql = """
+            SELECT api_json FROM course_documents
+            WHERE term_id = :term_id AND section_id = ANY(:section_ids) AND format_key = :format_key
+        """
+        rows = db.session.execute(text(sql), {'format_key': cls.get_format_key(), 'section_ids': section_ids, 'term_id': term_id})
+        return [row['api_json'] for row in rows]
+
+    @classmethod
+    def get_generations(cls, section_ids, term_id):
+        # Take before the build of documents, and commit: rows are created where missing, so that a concurrent
+        # invalidation of the section updates (and locks) a row which upsert() can check.
+        sql = """
+            INSERT INTO course_document_generations (term_id, section_id)
+            SELECT :term_id, unnest(CAST(:section_ids AS INTEGER[]))
+            ON CONFLICT (section_id, term_id) DO NOTHING
+        """
+        db.session.execute(text(sql), {'section_ids': section_ids, 'term_id': term_id})
+        sql = """
+            SELECT term_id, section_id, generation FROM course_document_generations
+            WHERE (term_id = :term_id AND section_id = ANY(:section_ids)) OR (term_id = 0 AND section_id = 0)
+        """
+        rows = db.session.execute(text(sql), {'section_ids': section_ids, 'term_id': term_id})
+        return [{'generation': row['generation'], 'sectionId': row['section_id'], 'termId': row['term_id']} for row in rows]
+
+    @classmethod
+    def upsert(cls, courses, generations, term_id):
+        # Documents are stored only where the generation of the section, and of all documents, equals the generation
+        # taken before the build. Rows locked by an in-flight invalidation are skipped, as if changed. Returns the
+        # section ids stored.
+        if not courses:
+            return set()
+        sql = """
+            WITH expected AS (
+                SELECT (e ->> 'termId')::INTEGER AS term_id, (e ->> 'sectionId')::INTEGER AS section_id, (e ->> 'generation')::BIGINT AS generation
+                FROM jsonb_array_elements(CAST(:generations AS JSONB)) AS e
+            ),
+            unchanged AS (
+                SELECT g.term_id, g.section_id
+                FROM course_document_generations g
+                JOIN expected e ON e.term_id = g.term_id AND e.section_id = g.section_id AND e.generation = g.generation
+                FOR SHARE OF g SKIP LOCKED
+            )
+            INSERT INTO course_documents (term_id, section_id, course_name, api_json, format_key, created_at)
+            SELECT :term_id, (doc ->> 'sectionId')::INTEGER, doc ->> 'courseName', doc, :format_key, now()
+            FROM jsonb_array_elements(CAST(:json_dumps AS JSONB)) AS doc
+            WHERE
+                EXISTS (SELECT FROM unchanged WHERE term_id = 0 AND section_id = 0)
+                AND (doc ->> 'sectionId')::INTEGER IN (SELECT section_id FROM unchanged WHERE term_id = :term_id)
+            ON CONFLICT (section_id, term_id) DO
+            UPDATE SET
+                course_name = EXCLUDED.course_name,
+                api_json = EXCLUDED.api_json,
+                format_key = EXCLUDED.format_key,
+                created_at = EXCLUDED.created_at
+            RETURNING section_id
+        """
+        rows = db.session.execute(
+            text(sql),
+            {
+                'format_key': cls.get_format_key(),
+                'generations': json.dumps(generations),
+                'json_dumps': json.dumps(courses),
+                'term_id': term_id,
+            },
+        )
+        return set(row['section_id'] for row in rows)
+
+    @classmethod
+    def delete_all(cls, term_id=None):
+        if term_id is None:
+            db.session.execute(text('SELECT delete_all_course_documents()'))
+        else:
+            sql = """
+                UPDATE course_document_generations SET generation = nextval('course_document_generations_seq')
+                WHERE term_id = 0 AND section_id = 0;
+                DELETE FROM course_documents WHERE term_id = :term_id
+            """
+            db.session.execute(text(sql), {'term_id': term_id})
+
+    @classmethod
+    def delete(cls, section_id, term_id):
+        # Documents of principal sections which carry the section (as a cross-listing) are deleted too.
+        sql = 'SELECT delete_course_documents(:term_id, :section_id)'
+        db.session.execute(text(sql), {'section_id': section_id, 'term_id': term_id})
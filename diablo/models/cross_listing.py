@@ -69,16 +69,41 @@ class CrossListing(db.Model):
             term_id=term_id,
         )
         db.session.add(cross_listing)
+        sql = """
+            INSERT INTO cross_listing_members (term_id, principal_section_id, member_section_id)
+            SELECT :term_id, :section_id, UNNEST(CAST(:cross_listed_section_ids AS INTEGER[]))
+            ON CONFLICT DO NOTHING
+        """
+        db.session.execute(
+            text(sql),
+            {
+                'cross_listed_section_ids': cross_listed_section_ids,
+                'section_id': section_id,
+                'term_id': term_id,
+            },
+        )
         std_commit()
         return cross_listing
 
+    @classmethod
+    def refresh_members(cls, term_id):
+        # Normalized cross_listing_members rows, one per cross-listed section, are derived from cross_listings.
+        db.session.execute(text('DELETE FROM cross_listing_members WHERE term_id = :term_id'), {'term_id': term_id})
+        sql = """
+            INSERT INTO cross_listing_members (term_id, principal_section_id, member_section_id)
+            SELECT DISTINCT term_id, section_id, UNNEST(cross_listed_section_ids)
+            FROM cross_listings
+            WHERE term_id = :term_id
+        """
+        db.session.execute(text(sql), {'term_id': term_id})
+
     @classmethod
     def get_instructor_uids_of_cross_listed_sections(cls, section_id, term_id):
         sql = """
             SELECT s.section_id, s.instructor_uid
-            FROM cross_listings c
-            JOIN sis_sections s ON s.section_id = ANY(c.cross_listed_section_ids::int[]) AND s.term_id = c.term_id
-            WHERE c.section_id = :section_id AND c.term_id = :term_id AND s.instructor_uid IS NOT NULL
+            FROM cross_listing_members m
+            JOIN sis_sections s ON s.section_id = m.member_section_id AND s.term_id = m.term_id
+            WHERE m.principal_section_id = :section_id AND m.term_id = :term_id AND s.instructor_uid IS NOT NULL
         """
         parameters = {
             'section_id': section_id,
@@ -195,6 +195,7 @@ def _set_up_and_run_jobs():
     Job.create(job_schedule_type='day_at', job_schedule_value='22:00', key='house_keeping')
     Job.create(disabled=True, job_schedule_type='minutes', job_schedule_value='120', key='blackouts')
     Job.create(job_schedule_type='day_at', job_schedule_value='16:00', key='canvas')
+    Job.create(job_schedule_type='minutes', job_schedule_value='15', key='course_documents')
     Job.create(disabled=True, job_schedule_type='minutes', job_schedule_value='5', key='doomed_to_fail')
     Job.create(is_schedulable=False, job_schedule_type='day_at', job_schedule_value='16:00', key='remind_invitees')
     background_job_manager.start(app)
@@ -22,16 +22,18 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import json
 
 from diablo import db, std_commit
-from diablo.lib.interpolator import interpolate_content
+from diablo.lib.interpolator import get_course_substitutions, interpolate_content, render_template
 from diablo.lib.util import to_isoformat
 from diablo.merged.emailer import send_system_error_email
 from diablo.models.approval import NAMES_PER_PUBLISH_TYPE, NAMES_PER_RECORDING_TYPE
 from diablo.models.email_template import email_template_type, EmailTemplate
 from diablo.models.sis_section import AUTHORIZED_INSTRUCTOR_ROLE_CODES, SisSection
 from flask import current_app as app
+from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import JSONB
 
 
@@ -46,12 +48,24 @@ class QueuedEmail(db.Model):
     template_type = db.Column(email_template_type, nullable=False)
     term_id = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # Delivery bookkeeping. A claimed email is leased until next_attempt_at. Failed deliveries are retried after a
+    # backoff, up to a maximum number of attempts, and then dead-lettered.
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(timezone=True))
+    dead_lettered_at = db.Column(db.DateTime(timezone=True))
+    last_error = db.Column(db.Text)
 
-    __table_args__ = (db.UniqueConstraint(
+    # Identical emails (same course, template type, recipient and message) are queued once. Dead letters do not count,
+    # so an email can be queued again after its predecessor was dead-lettered.
+    __table_args__ = (db.Index(
+        'queued_emails_unique_idx',
+        'term_id',
         'section_id',
         'template_type',
-        'term_id',
-        name='queued_emails_section_id_template_type_unique_constraint',
+        text('md5(recipient::text)'),
+        text('md5(message)'),
+        postgresql_where=text('dead_lettered_at IS NULL'),
+        unique=True,
     ),)
 
     def __init__(self, section_id, template_type, term_id, recipient, message=None, subject_line=None):
@@ -71,7 +85,9 @@ class QueuedEmail(db.Model):
                     recipient={self.recipient},
                     message={self.message},
                     subject_line={self.subject_line},
-                    created_at={self.created_at}
+                    created_at={self.created_at},
+                    attempts={self.attempts},
+                    dead_lettered_at={self.dead_lettered_at}
                 """
 
     @classmethod
@@ -91,22 +107,140 @@ class QueuedEmail(db.Model):
             message=message,
             subject_line=subject_line,
         )
-        course = SisSection.get_course(term_id, queued_email.section_id, include_deleted=True)
         if not queued_email.is_interpolated() and not queued_email.interpolate(course):
             app.logger.error(f'Failed to interpolate all required values for queued email ({queued_email})')
             return
-        db.session.add(queued_email)
+        queued_email_ids = _insert_queued_emails([queued_email])
+        std_commit()
+        if queued_email_ids:
+            return cls.query.get(queued_email_ids[0])
+        else:
+            app.logger.info(f'Email is already queued: {queued_email}')
+            return cls.query.filter_by(
+                dead_lettered_at=None,
+                section_id=section_id,
+                template_type=template_type,
+                term_id=term_id,
+            ).filter(
+                cls.recipient == queued_email.recipient,
+                cls.message == queued_email.message,
+            ).first()
+
+    @classmethod
+    def create_all(cls, course_recipients, template_type, term_id, publish_type_name=None, recording_type_name=None):
+        # Bulk counterpart of create(). Each item of course_recipients is a (course, recipient) pair, where course is a
+        # feed built by the caller. Emails are interpolated in memory and inserted in batches. Emails already queued are
+        # skipped. Returns the number of emails queued.
+        if not course_recipients:
+            return 0
+        template = _get_email_template(course=course_recipients[0][0], template_type=template_type)
+        if not template:
+            return 0
+        queued_emails = []
+        course_substitutions_per_section_id = {}
+        for course, recipient in course_recipients:
+            section_id = course['sectionId']
+            if not course['instructors']:
+                app.logger.error(f'Attempt to queue email for course without instructors (term_id={term_id}, section_id={section_id})')
+                continue
+            if section_id not in course_substitutions_per_section_id:
+                course_substitutions_per_section_id[section_id] = get_course_substitutions(
+                    course=course,
+                    publish_type_name=publish_type_name,
+                    recording_type_name=recording_type_name,
+                )
+            substitutions = {**course_substitutions_per_section_id[section_id], 'recipient.name': recipient['name']}
+            queued_emails.append(cls(
+                message=render_template(template.message, substitutions),
+                recipient=recipient,
+                section_id=section_id,
+                subject_line=render_template(template.subject_line, substitutions),
+                template_type=template_type,
+                term_id=term_id,
+            ))
+        queued_email_count = 0
+        batch_size = app.config['EMAIL_QUEUE_BATCH_SIZE']
+        for index in range(0, len(queued_emails), batch_size):
+            queued_email_count += len(_insert_queued_emails(queued_emails[index:index + batch_size]))
         std_commit()
-        return queued_email
+        return queued_email_count
 
     @classmethod
     def delete(cls, queued_email):
         db.session.delete(queued_email)
         std_commit()
 
+    @classmethod
+    def delete_all(cls, queued_emails):
+        for queued_email in queued_emails:
+            db.session.delete(queued_email)
+        std_commit()
+
+    @classmethod
+    def claim(cls, term_id, limit, lease_seconds):
+        # Claim emails due for delivery and lease them, so that concurrent dispatchers (e.g., other EB instances) skip
+        # them. If the claimant dies then the lease expires and the emails are claimed again.
+        sql = """
+            UPDATE queued_emails SET next_attempt_at = now() + make_interval(secs => :lease_seconds)
+            WHERE id IN (
+                SELECT id FROM queued_emails
+                WHERE
+                    term_id = :term_id
+                    AND dead_lettered_at IS NULL
+                    AND (next_attempt_at IS NULL OR next_attempt_at <= now())
+                ORDER BY created_at, id
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+        """
+        rows = db.session.execute(text(sql), {'lease_seconds': lease_seconds, 'limit': limit, 'term_id': term_id})
+        ids = [row.id for row in rows]
+        std_commit()
+        return cls.query.filter(cls.id.in_(ids)).order_by(cls.created_at, cls.id).all() if ids else []
+
+    @classmethod
+    def dead_letter(cls, queued_email, error):
+        queued_email.attempts += 1
+        queued_email.dead_lettered_at = datetime.now(timezone.utc)
+        queued_email.last_error = error
+        db.session.add(queued_email)
+        std_commit()
+
+    @classmethod
+    def retry_later(cls, queued_email, error, delay_seconds):
+        queued_email.attempts += 1
+        queued_email.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+        queued_email.last_error = error
+        db.session.add(queued_email)
+        std_commit()
+
     @classmethod
     def get_all(cls, term_id):
-        return cls.query.filter_by(term_id=term_id).order_by(cls.created_at).all()
+        return cls.query.filter_by(term_id=term_id, dead_lettered_at=None).order_by(cls.created_at, cls.id).all()
+
+    @classmethod
+    def get_dead_letters(cls, term_id):
+        return cls.query.filter_by(term_id=term_id).filter(cls.dead_lettered_at.isnot(None)).order_by(cls.created_at, cls.id).all()
+
+    @classmethod
+    def get_queue_stats(cls, term_id):
+        sql = """
+            SELECT
+                COUNT(*) FILTER (WHERE dead_lettered_at IS NULL AND (next_attempt_at IS NULL OR next_attempt_at <= now())) AS due,
+                COUNT(*) FILTER (WHERE dead_lettered_at IS NULL AND next_attempt_at > now()) AS deferred,
+                COUNT(*) FILTER (WHERE dead_lettered_at IS NOT NULL) AS dead_lettered,
+                MIN(created_at) FILTER (WHERE dead_lettered_at IS NULL) AS oldest_created_at
+            FROM queued_emails
+            WHERE term_id = :term_id
+        """
+        row = db.session.execute(text(sql), {'term_id': term_id}).first()
+        return {
+            'deadLettered': row.dead_lettered,
+            'deferred': row.deferred,
+            'due': row.due,
+            'oldestCreatedAt': to_isoformat(row.oldest_created_at),
+        }
 
     @classmethod
     def get_all_section_ids(cls, template_type, term_id):
@@ -128,10 +262,8 @@ class QueuedEmail(db.Model):
                 templated_string=template.message,
                 recipient_name=self.recipient['name'],
             )
-            db.session.add(self)
-            std_commit()
             # Return True only if all required data has been set.
-            return self.is_interpolated
+            return self.is_interpolated()
 
     def to_api_json(self):
         return {
@@ -144,6 +276,36 @@ class QueuedEmail(db.Model):
         }
 
 
+def _insert_queued_emails(queued_emails):
+    # One statement per batch. Returns ids of inserted rows; duplicates of emails already queued are skipped.
+    sql = """
+        INSERT INTO queued_emails (created_at, message, recipient, section_id, subject_line, template_type, term_id)
+        SELECT
+            now(),
+            e ->> 'message',
+            e -> 'recipient',
+            (e ->> 'section_id')::INTEGER,
+            e ->> 'subject_line',
+            (e ->> 'template_type')::email_template_types,
+            (e ->> 'term_id')::INTEGER
+        FROM jsonb_array_elements(CAST(:json_dumps AS JSONB)) AS e
+        ON CONFLICT (term_id, section_id, template_type, md5(recipient::text), md5(message)) WHERE dead_lettered_at IS NULL
+        DO NOTHING
+        RETURNING id
+    """
+    json_dumps = json.dumps([
+        {
+            'message': e.message,
+            'recipient': e.recipient,
+            'section_id': e.section_id,
+            'subject_line': e.subject_line,
+            'template_type': e.template_type,
+            'term_id': e.term_id,
+        } for e in queued_emails
+    ])
+    return [row.id for row in db.session.execute(text(sql), {'json_dumps': json_dumps})]
+
+
 def _get_email_template(course, template_type):
     template = EmailTemplate.get_template_by_type(template_type)
     if not template:
@@ -217,30 +379,14 @@ def notify_instructors_recordings_scheduled(course, scheduled):
     template_type = 'recordings_scheduled'
     email_template = EmailTemplate.get_template_by_type(template_type)
     if email_template:
-        publish_type_name = NAMES_PER_PUBLISH_TYPE[scheduled.publish_type]
-        recording_type_name = NAMES_PER_RECORDING_TYPE[scheduled.recording_type]
         instructors = list(filter(lambda i: i['roleCode'] in AUTHORIZED_INSTRUCTOR_ROLE_CODES, course['instructors']))
-        for instructor in instructors:
-            message = interpolate_content(
-                templated_string=email_template.message,
-                course=course,
-                recipient_name=instructor['name'],
-                publish_type_name=publish_type_name,
-                recording_type_name=recording_type_name,
-            )
-            subject_line = interpolate_content(
-                templated_string=email_template.subject_line,
-                course=course,
-                recipient_name=instructor['name'],
-            )
-            QueuedEmail.create(
-                message=message,
-                subject_line=subject_line,
-                recipient=instructor,
-                section_id=course['sectionId'],
-                template_type=email_template.template_type,
-                term_id=course['termId'],
-            )
+        QueuedEmail.create_all(
+            course_recipients=[(course, instructor) for instructor in instructors],
+            publish_type_name=NAMES_PER_PUBLISH_TYPE[scheduled.publish_type],
+            recording_type_name=NAMES_PER_RECORDING_TYPE[scheduled.recording_type],
+            template_type=template_type,
+            term_id=course['termId'],
+        )
     else:
         send_system_error_email(f"""
             No email template of type {template_type} is available.
@@ -148,13 +148,14 @@ class Room(db.Model):
         return room
 
     @classmethod
-    def update_kaltura_resource_mappings(cls, kaltura_resource_ids_per_room):
-        # First, set kaltura_resource_id = null on all rows
-        cls.query.update({cls.kaltura_resource_id: None})
+    def update_kaltura_resource_mappings(cls, kaltura_resource_ids_per_room, reset_all=True):
+        if reset_all:
+            # First, set kaltura_resource_id = null on all rows
+            cls.query.update({cls.kaltura_resource_id: None})
         # Next, insert the latest mappings
-        all_rooms_per_id = dict((room.id, room) for room in cls.all_rooms())
+        rooms_per_id = dict((room.id, room) for room in cls.get_rooms(list(kaltura_resource_ids_per_room.keys())))
         for room_id, kaltura_resource_id in kaltura_resource_ids_per_room.items():
-            room = all_rooms_per_id[room_id]
+            room = rooms_per_id[room_id]
             room.kaltura_resource_id = kaltura_resource_id
             db.session.add(room)
         std_commit()
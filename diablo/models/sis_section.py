@@ -22,16 +22,17 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from collections import namedtuple
 from datetime import datetime
 
-from diablo import db
+from diablo import db, std_commit
 from diablo.lib.berkeley import are_scheduled_dates_obsolete, are_scheduled_times_obsolete, get_recording_end_date, \
     get_recording_start_date
 from diablo.lib.util import format_days, format_time, get_names_of_days, safe_strftime
 from diablo.models.approval import Approval
 from diablo.models.canvas_course_site import CanvasCourseSite
+from diablo.models.course_document import CourseDocument
 from diablo.models.course_preference import CoursePreference
-from diablo.models.cross_listing import CrossListing
 from diablo.models.room import Room
 from diablo.models.scheduled import Scheduled
 from flask import current_app as app
@@ -40,6 +41,51 @@ from sqlalchemy import text
 AUTHORIZED_INSTRUCTOR_ROLE_CODES = ['ICNT', 'PI', 'TNIC']
 ALL_INSTRUCTOR_ROLE_CODES = ['APRX'] + AUTHORIZED_INSTRUCTOR_ROLE_CODES
 
+# Course feed queries select only these columns, in this order. Rows are handled as compact FeedRow tuples.
+FEED_COLUMNS = {
+    'allowed_units': 's.allowed_units',
+    'course_name': 's.course_name',
+    'course_title': 's.course_title',
+    'deleted_at': 's.deleted_at',
+    'instruction_format': 's.instruction_format',
+    'instructor_dept_code': 'i.dept_code',
+    'instructor_email': 'i.email',
+    'instructor_name': "i.first_name || ' ' || i.last_name",
+    'instructor_role_code': 's.instructor_role_code',
+    'instructor_uid': 'i.uid',
+    'is_primary': 's.is_primary',
+    'meeting_days': 's.meeting_days',
+    'meeting_end_date': 's.meeting_end_date',
+    'meeting_end_time': 's.meeting_end_time',
+    'meeting_location': 's.meeting_location',
+    'meeting_start_date': 's.meeting_start_date',
+    'meeting_start_time': 's.meeting_start_time',
+    'room_id': 'r.id',
+    'section_id': 's.section_id',
+    'section_num': 's.section_num',
+    'term_id': 's.term_id',
+}
+FeedRow = namedtuple('FeedRow', FEED_COLUMNS.keys())
+
+# Admin course filters, as predicates on course_statuses. See _course_statuses_sql.
+COURSE_FILTER_CONDITIONS = {
+    'All': 'is_in_eligible_room AND NOT is_deleted',
+    'Do Not Email': 'is_in_eligible_room AND NOT is_deleted AND has_opted_out AND NOT is_scheduled',
+    'Invited': 'is_in_eligible_room AND NOT is_deleted AND NOT has_opted_out AND NOT has_approvals AND NOT is_scheduled AND is_invited',
+    'Not Invited': 'is_in_eligible_room AND NOT is_deleted AND NOT has_opted_out AND NOT has_approvals AND NOT is_scheduled AND NOT is_invited',
+    'Partially Approved': "NOT is_deleted AND approval_status = 'Partially Approved'",
+    'Queued for Scheduling': "scheduling_status = 'Queued for Scheduling'",
+    'Scheduled': "scheduling_status = 'Scheduled' AND NOT has_nonstandard_dates",
+    'Scheduled (Nonstandard Dates)': "scheduling_status = 'Scheduled' AND has_nonstandard_dates",
+}
+
+# Sort keys of admin course lists, as aggregates per section. Ties are broken by section_id. See _section_ids_per_page.
+COURSE_SORT_KEYS = {
+    'courseName': "COALESCE(MIN(s.course_name), '')",
+    'location': "COALESCE(MIN(s.meeting_location), '')",
+    'sectionId': 'cs.section_id',
+}
+
 
 class SisSection(db.Model):
     __tablename__ = 'sis_sections'
@@ -129,7 +175,11 @@ class SisSection(db.Model):
 
     @classmethod
     def set_non_principal_listings(cls, section_ids, term_id):
-        sql = 'UPDATE sis_sections SET is_principal_listing = FALSE WHERE term_id = :term_id AND section_id  = ANY(:section_ids)'
+        # Sections not in the list are (again) principal listings. Only rows with a stale flag are updated.
+        sql = """
+            UPDATE sis_sections SET is_principal_listing = NOT (section_id = ANY(:section_ids))
+            WHERE term_id = :term_id AND is_principal_listing = (section_id = ANY(:section_ids))
+        """
         db.session.execute(
             text(sql),
             {
@@ -139,22 +189,42 @@ class SisSection(db.Model):
         )
 
     @classmethod
-    def get_distinct_meeting_locations(cls):
-        sql = """
+    def get_distinct_meeting_locations(cls, section_ids=None, term_id=None):
+        sections_filter = 'AND term_id = :term_id AND section_id = ANY(:section_ids)' if section_ids is not None else ''
+        sql = f"""
             SELECT DISTINCT meeting_location FROM sis_sections
             WHERE
                 meeting_location IS NOT NULL
                 AND meeting_location != ''
                 AND instructor_role_code = ANY(:instructor_role_codes)
+                {sections_filter}
             ORDER BY meeting_location
         """
-        args = {'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES}
+        args = {
+            'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
+            'section_ids': section_ids,
+            'term_id': term_id,
+        }
         return [row['meeting_location'] for row in db.session.execute(text(sql), args)]
 
     @classmethod
-    def get_distinct_instructor_uids(cls):
+    def get_sis_section_changes(cls, term_id):
+        sql = 'SELECT section_id, change_type FROM sis_section_changes WHERE term_id = :term_id ORDER BY section_id'
+        changes = {'added': [], 'changed': [], 'removed': []}
+        for row in db.session.execute(text(sql), {'term_id': term_id}):
+            changes[row['change_type']].append(row['section_id'])
+        return changes
+
+    @classmethod
+    def get_distinct_instructor_uids(cls, section_ids=None, term_id=None):
         sql = 'SELECT DISTINCT instructor_uid FROM sis_sections WHERE instructor_uid IS NOT NULL'
-        return [row['instructor_uid'] for row in db.session.execute(text(sql))]
+        if section_ids is not None:
+            sql += ' AND term_id = :term_id AND section_id = ANY(:section_ids)'
+        args = {
+            'section_ids': section_ids,
+            'term_id': term_id,
+        }
+        return [row['instructor_uid'] for row in db.session.execute(text(sql), args)]
 
     @classmethod
     def get_course(
@@ -166,13 +236,7 @@ class SisSection(db.Model):
     ):
         sql = f"""
             SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
+                {_feed_columns()}
             FROM sis_sections s
             LEFT JOIN rooms r ON r.location = s.meeting_location
             LEFT JOIN instructors i ON i.uid = s.instructor_uid
@@ -196,17 +260,35 @@ class SisSection(db.Model):
         api_json = _to_api_json(term_id=term_id, rows=rows)
         return api_json[0] if api_json else None
 
+    @classmethod
+    def get_has_opted_out_per_section_id(cls, term_id, section_ids, include_deleted=False):
+        # In one query, opt-out per course. Courses that get_course would not find (e.g., unknown section_id) are omitted.
+        sql = f"""
+            SELECT DISTINCT s.section_id, COALESCE(cp.has_opted_out, FALSE) AS has_opted_out
+            FROM sis_sections s
+            LEFT JOIN course_preferences cp ON cp.section_id = s.section_id AND cp.term_id = s.term_id
+            WHERE
+                s.term_id = :term_id
+                AND s.section_id = ANY(:section_ids)
+                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
+                AND s.is_principal_listing IS TRUE
+                {'' if include_deleted else ' AND s.deleted_at IS NULL '}
+        """
+        rows = db.session.execute(
+            text(sql),
+            {
+                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
+                'section_ids': list(section_ids),
+                'term_id': term_id,
+            },
+        )
+        return dict((row.section_id, row.has_opted_out) for row in rows)
+
     @classmethod
     def get_course_changes(cls, term_id):
-        sql = """
+        sql = f"""
             SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
+                {_feed_columns()}
             FROM sis_sections s
             LEFT JOIN rooms r ON r.location = s.meeting_location
             JOIN scheduled d ON
@@ -286,289 +368,140 @@ class SisSection(db.Model):
         else:
             course_filter = 's.section_id = ANY(:section_ids)'
             params['section_ids'] = section_ids
-        sql = f"""
-            SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
-            FROM sis_sections s
-            {'LEFT' if include_null_meeting_locations else ''} JOIN rooms r ON r.location = s.meeting_location
-            LEFT JOIN instructors i ON i.uid = s.instructor_uid
-            WHERE
-                {course_filter}
-                AND s.term_id = :term_id
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                {'' if include_non_principal_sections else 'AND s.is_principal_listing IS TRUE'}
-                {'' if include_deleted else ' AND s.deleted_at IS NULL '}
-            ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
-        """
-        rows = db.session.execute(text(sql), params)
-        return _to_api_json(term_id=term_id, rows=rows)
+        from_and_where_clauses = _courses_from_and_where_clauses(
+            course_filter=course_filter,
+            include_deleted=include_deleted,
+            include_non_principal_sections=include_non_principal_sections,
+            include_null_meeting_locations=include_null_meeting_locations,
+        )
+        is_default_feed = not (
+            include_administrative_proxies or include_deleted or include_non_principal_sections or include_null_meeting_locations
+        )
+        if is_default_feed:
+            # The default feed is materialized per section in course_documents, which are built out of band (see
+            # refresh_course_documents). Courses without a document are constructed here, and not stored.
+            sql = f'SELECT s.section_id {from_and_where_clauses} GROUP BY s.section_id ORDER BY MIN(s.course_name), s.section_id'
+            matching_section_ids = [row['section_id'] for row in db.session.execute(text(sql), params)]
+            api_json_per_section_id = dict(
+                (api_json['sectionId'], api_json) for api_json in CourseDocument.get_api_json(section_ids=matching_section_ids, term_id=term_id)
+            )
+            missing_section_ids = [section_id for section_id in matching_section_ids if section_id not in api_json_per_section_id]
+            if missing_section_ids:
+                params['section_ids'] = missing_section_ids
+                from_and_where_clauses = _courses_from_and_where_clauses(course_filter='s.section_id = ANY(:section_ids)')
+                courses = _to_api_json(term_id=term_id, rows=_execute_feed_query(from_and_where_clauses, params))
+                api_json_per_section_id.update((course['sectionId'], course) for course in courses)
+            return [api_json_per_section_id[section_id] for section_id in matching_section_ids if section_id in api_json_per_section_id]
+        else:
+            return _to_api_json(term_id=term_id, rows=_execute_feed_query(from_and_where_clauses, params))
 
     @classmethod
-    def get_courses_invited(cls, term_id):
-        sql = """
-            SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
-            FROM sis_sections s
-            JOIN rooms r ON r.location = s.meeting_location AND r.capability IS NOT NULL
-            JOIN sent_emails e ON
-                e.section_id = s.section_id
-                AND e.term_id = s.term_id
-                AND e.template_type = 'invitation'
-            LEFT JOIN instructors i ON i.uid = s.instructor_uid
-            -- Omit approved courses, scheduled courses and opt-outs.
-            LEFT JOIN approvals a ON
-                a.section_id = s.section_id
-                AND a.term_id = s.term_id
-                AND a.deleted_at IS NULL
-            LEFT JOIN scheduled d ON
-                d.section_id = s.section_id
-                AND d.term_id = s.term_id
-                AND d.deleted_at IS NULL
-            LEFT JOIN course_preferences cp ON
-                cp.section_id = s.section_id
-                AND cp.term_id = s.term_id
-                AND cp.has_opted_out IS TRUE
-            WHERE
-                s.term_id = :term_id
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                AND s.is_principal_listing IS TRUE
-                AND a.section_id IS NULL
-                AND d.section_id IS NULL
-                AND cp.section_id IS NULL
-                AND s.deleted_at IS NULL
-            ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
-        """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_id': term_id,
-            },
+    def refresh_course_documents(cls, term_id, batch_size=None):
+        # Build the course documents of the default feed (see get_courses) where missing or of another format, in
+        # batches. Generations are committed before each build, so that invalidations of the batch do not wait on it.
+        # Returns the number of documents stored.
+        batch_size = batch_size or app.config['COURSE_DOCUMENTS_BATCH_SIZE']
+        params = {
+            'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
+            'term_id': term_id,
+        }
+        from_and_where_clauses = _courses_from_and_where_clauses(
+            course_filter=f's.section_id IN ({_sections_with_at_least_one_eligible_room()})',
         )
-        return _to_api_json(term_id=term_id, rows=rows)
+        sql = f'SELECT DISTINCT s.section_id {from_and_where_clauses} ORDER BY s.section_id'
+        section_ids = [row['section_id'] for row in db.session.execute(text(sql), params)]
+        existing_section_ids = CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id)
+        missing_section_ids = [section_id for section_id in section_ids if section_id not in existing_section_ids]
+        stored_count = 0
+        from_and_where_clauses = _courses_from_and_where_clauses(course_filter='s.section_id = ANY(:section_ids)')
+        for index in range(0, len(missing_section_ids), batch_size):
+            batch = missing_section_ids[index:index + batch_size]
+            generations = CourseDocument.get_generations(section_ids=batch, term_id=term_id)
+            std_commit()
+            courses = _to_api_json(term_id=term_id, rows=_execute_feed_query(from_and_where_clauses, {**params, 'section_ids': batch}))
+            stored_count += len(CourseDocument.upsert(courses=courses, generations=generations, term_id=term_id))
+            std_commit()
+        return stored_count
+
+    @classmethod
+    def get_courses_invited(cls, term_id):
+        return cls.get_courses(term_id=term_id, section_ids=cls._section_ids_per_filter('Invited', term_id))
 
     @classmethod
     def get_eligible_courses_not_invited(cls, term_id):
-        sql = f"""
-            SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
-            FROM sis_sections s
-            JOIN rooms r ON r.location = s.meeting_location
-            LEFT JOIN instructors i ON i.uid = s.instructor_uid
-            -- Omit sent invitations, approved courses, scheduled courses and opt-outs.
-            LEFT JOIN approvals a ON
-                a.section_id = s.section_id
-                AND a.term_id = s.term_id
-                AND a.deleted_at IS NULL
-            LEFT JOIN scheduled d ON
-                d.section_id = s.section_id
-                AND d.term_id = s.term_id
-                AND d.deleted_at IS NULL
-            LEFT JOIN sent_emails e ON
-                e.section_id = s.section_id
-                AND e.term_id = s.term_id
-                AND e.template_type = 'invitation'
-            LEFT JOIN course_preferences cp ON
-                cp.section_id = s.section_id
-                AND cp.term_id = s.term_id
-                AND cp.has_opted_out IS TRUE
-            WHERE
-                s.term_id = :term_id
-                AND s.section_id IN ({_sections_with_at_least_one_eligible_room()})
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                AND s.is_principal_listing IS TRUE
-                AND a.section_id IS NULL
-                AND d.section_id IS NULL
-                AND e.section_id IS NULL
-                AND cp.section_id IS NULL
-                AND s.deleted_at IS NULL
-            ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
-        """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_id': term_id,
-            },
-        )
-        return _to_api_json(term_id=term_id, rows=rows)
+        return cls.get_courses(term_id=term_id, section_ids=cls._section_ids_per_filter('Not Invited', term_id))
 
     @classmethod
     def get_courses_opted_out(cls, term_id):
-        sql = f"""
-            SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
-            FROM sis_sections s
-            JOIN rooms r ON r.location = s.meeting_location
-            JOIN course_preferences c ON
-                c.section_id = s.section_id
-                AND c.term_id = :term_id
-                AND c.has_opted_out IS TRUE
-            LEFT JOIN instructors i ON i.uid = s.instructor_uid
-            -- Omit scheduled courses.
-            LEFT JOIN scheduled d ON
-                d.section_id = s.section_id
-                AND d.term_id = :term_id
-                AND d.deleted_at IS NULL
-            WHERE
-                d.section_id IS NULL
-                AND s.term_id = :term_id
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                AND s.is_principal_listing IS TRUE
-                AND s.section_id IN ({_sections_with_at_least_one_eligible_room()})
-                AND s.deleted_at IS NULL
-            ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
-        """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_id': term_id,
-            },
-        )
-        return _to_api_json(term_id=term_id, rows=rows)
+        return cls.get_courses(term_id=term_id, section_ids=cls._section_ids_per_filter('Do Not Email', term_id))
 
     @classmethod
     def get_courses_partially_approved(cls, term_id):
         # Courses, including scheduled, that have at least one current instructor who has approved, and at least one
         # current instructor who has not approved. Admins and previous instructors are ignored.
-        sql = """
-            SELECT DISTINCT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location,
-                r.capability AS room_capability
-            FROM sis_sections s
-            JOIN approvals a ON
-                s.term_id = :term_id
-                AND s.instructor_role_code = ANY(:instructor_role_codes)
-                AND s.is_principal_listing IS TRUE
-                AND a.section_id = s.section_id
-                AND a.term_id = :term_id
-                AND a.deleted_at IS NULL
-            JOIN instructors i ON i.uid = s.instructor_uid
-            -- This second course/instructor join is not for data display purposes, but to screen for the existence
-            -- of any current instructor who has not approved.
-            JOIN sis_sections s2 ON
-                s.term_id = s2.term_id
-                AND s.section_id = s2.section_id
-                AND s2.instructor_role_code = ANY(:instructor_role_codes)
-            JOIN instructors i2 ON
-                i2.uid = s2.instructor_uid
-                AND i2.uid NOT IN (
-                    SELECT approved_by_uid
-                    FROM approvals
-                    WHERE section_id = s.section_id AND term_id = :term_id
-                )
-            -- And a final join to ensure that at least one current instructor has approved.
-            JOIN sis_sections s3 ON
-                s3.term_id = s2.term_id
-                AND s3.section_id = s2.section_id
-                AND s3.instructor_uid = a.approved_by_uid
-            JOIN rooms r ON r.location = s.meeting_location
-            WHERE
-                s.deleted_at IS NULL
-            ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
-        """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_id': term_id,
-            },
-        )
-        return _to_api_json(term_id=term_id, rows=rows)
+        return cls.get_courses(term_id=term_id, section_ids=cls._section_ids_per_filter('Partially Approved', term_id))
 
     @classmethod
     def get_courses_queued_for_scheduling(cls, term_id):
-        sql = """
+        return cls.get_courses(term_id=term_id, section_ids=cls._section_ids_per_filter('Queued for Scheduling', term_id))
+
+    @classmethod
+    def get_course_counts(cls, term_id):
+        # Counts per filter (i.e., dashboard tab) and per status, in a single pass over course_statuses. Rows are grouped
+        # by status; filter counts are summed over all groups, status counts over groups of eligible, undeleted courses.
+        filter_counts = ',\n'.join(f'COUNT(*) FILTER (WHERE {condition}) AS "{filter_}"' for filter_, condition in COURSE_FILTER_CONDITIONS.items())
+        sql = f"""
+            {_course_statuses_sql()}
             SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
-            FROM sis_sections s
-            JOIN approvals a ON
-                s.term_id = :term_id
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                AND s.is_principal_listing IS TRUE
-                AND a.section_id = s.section_id
-                AND a.term_id = :term_id
-                AND a.deleted_at IS NULL
-                AND (
-                    -- If approved by an admin, the course is considered queued.
-                    s.section_id IN (
-                        SELECT DISTINCT s.section_id
-                        FROM sis_sections s
-                        JOIN approvals a ON
-                            a.section_id = s.section_id
-                            AND a.term_id = :term_id
-                            AND s.term_id = :term_id
-                            AND a.deleted_at IS NULL
-                        JOIN admin_users au ON a.approved_by_uid = au.uid
-                    )
-                    -- If not approved by an admin, we must screen out any courses with an instructor who has not approved.
-                    OR s.section_id NOT IN (
-                        SELECT DISTINCT s.section_id
-                        FROM sis_sections s
-                        LEFT JOIN approvals a ON
-                            a.section_id = s.section_id
-                            AND a.term_id = :term_id
-                            AND a.approved_by_uid = s.instructor_uid
-                            AND a.deleted_at IS NULL
-                        WHERE s.term_id = :term_id
-                            AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                            AND s.is_principal_listing IS TRUE
-                            AND a.section_id IS NULL
-                    )
-                )
-            JOIN rooms r ON r.location = s.meeting_location
-            LEFT JOIN instructors i ON i.uid = s.instructor_uid
-            -- Omit scheduled courses.
-            LEFT JOIN scheduled d ON d.section_id = s.section_id AND d.term_id = :term_id AND d.deleted_at IS NULL
-            WHERE
-                d.section_id IS NULL
-            ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
+                approval_status,
+                scheduling_status,
+                (is_in_eligible_room AND NOT is_deleted) AS has_status_count,
+                COUNT(*) AS count,
+                {filter_counts}
+            FROM course_statuses
+            GROUP BY approval_status, scheduling_status, has_status_count
         """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_id': term_id,
-            },
+        counts = {
+            'approvalStatus': {},
+            'filters': dict.fromkeys(COURSE_FILTER_CONDITIONS.keys(), 0),
+            'schedulingStatus': {},
+        }
+        for row in db.session.execute(text(sql), _course_statuses_params(term_id)):
+            for filter_ in COURSE_FILTER_CONDITIONS.keys():
+                counts['filters'][filter_] += row[filter_]
+            if row['has_status_count']:
+                for key, status in [('approvalStatus', row['approval_status']), ('schedulingStatus', row['scheduling_status'])]:
+                    counts[key][status] = counts[key].get(status, 0) + row['count']
+        return counts
+
+    @classmethod
+    def get_courses_page(cls, term_id, filter_, cursor=None, limit=None, search=None, sort_by='courseName', sort_desc=False):
+        # Keyset pagination, in order of sort_by (see COURSE_SORT_KEYS). The cursor is the (sort_key, section_id) of the
+        # last course on the previous page.
+        limit = limit or app.config['SEARCH_ITEMS_PER_PAGE']
+        rows = cls._section_ids_per_page(
+            term_id=term_id,
+            filter_=filter_,
+            cursor=cursor,
+            limit=limit + 1,
+            search=search,
+            sort_by=sort_by,
+            sort_desc=sort_desc,
         )
-        return _to_api_json(term_id=term_id, rows=rows)
+        next_cursor = (rows[limit - 1]['sort_key'], rows[limit - 1]['section_id']) if len(rows) > limit else None
+        section_ids = [row['section_id'] for row in rows[:limit]]
+        return cls._get_courses_per_filter(filter_=filter_, section_ids=section_ids, term_id=term_id), next_cursor
+
+    @classmethod
+    def stream_courses(cls, term_id, filter_, chunk_size=None, search=None, sort_by='courseName', sort_desc=False):
+        # Yield courses in order of sort_by, constructing at most chunk_size courses at a time.
+        chunk_size = chunk_size or app.config['SEARCH_ITEMS_PER_PAGE']
+        rows = cls._section_ids_per_page(term_id=term_id, filter_=filter_, search=search, sort_by=sort_by, sort_desc=sort_desc)
+        section_ids = [row['section_id'] for row in rows]
+        for index in range(0, len(section_ids), chunk_size):
+            chunk = section_ids[index:index + chunk_size]
+            for course in cls._get_courses_per_filter(filter_=filter_, section_ids=chunk, term_id=term_id):
+                yield course
 
     @classmethod
     def get_courses_per_instructor_uid(cls, term_id, instructor_uid):
@@ -598,29 +531,23 @@ class SisSection(db.Model):
 
         if non_principal_section_ids:
             # Instructor is associated with cross-listed section_ids
-            sql = f"""
-                SELECT section_id
-                FROM cross_listings
+            sql = """
+                SELECT DISTINCT principal_section_id
+                FROM cross_listing_members
                 WHERE
                     term_id = :term_id
-                    AND cross_listed_section_ids && ARRAY[{','.join(str(id_) for id_ in non_principal_section_ids)}]
+                    AND member_section_id = ANY(:section_ids)
             """
-            for row in db.session.execute(text(sql), {'section_ids': instructor_uid, 'term_id': term_id}):
-                section_ids.append(row['section_id'])
+            for row in db.session.execute(text(sql), {'section_ids': non_principal_section_ids, 'term_id': term_id}):
+                section_ids.append(row['principal_section_id'])
 
         return cls.get_courses(term_id=term_id, section_ids=section_ids)
 
     @classmethod
     def get_courses_per_location(cls, term_id, location):
-        sql = """
+        sql = f"""
             SELECT
-                s.*,
-                i.dept_code AS instructor_dept_code,
-                i.email AS instructor_email,
-                i.first_name || ' ' || i.last_name AS instructor_name,
-                i.uid AS instructor_uid,
-                r.id AS room_id,
-                r.location AS room_location
+                {_feed_columns()}
             FROM sis_sections s
             JOIN rooms r ON r.location = s.meeting_location
             LEFT JOIN instructors i ON i.uid = s.instructor_uid
@@ -664,16 +591,12 @@ class SisSection(db.Model):
 
     @classmethod
     def get_courses_scheduled_standard_dates(cls, term_id):
-        scheduled_section_ids = cls._section_ids_scheduled(term_id)
-        nonstandard_dates_section_ids = cls._section_ids_with_nonstandard_dates(term_id)
-        section_ids = list(scheduled_section_ids - nonstandard_dates_section_ids)
+        section_ids = cls._section_ids_per_filter('Scheduled', term_id)
         return cls.get_courses(term_id, include_deleted=True, section_ids=section_ids)
 
     @classmethod
     def get_courses_scheduled_nonstandard_dates(cls, term_id):
-        scheduled_section_ids = cls._section_ids_scheduled(term_id)
-        nonstandard_dates_section_ids = cls._section_ids_with_nonstandard_dates(term_id)
-        section_ids = list(scheduled_section_ids.intersection(nonstandard_dates_section_ids))
+        section_ids = list(cls._section_ids_with_nonstandard_dates(term_id))
         return cls.get_courses(term_id, include_deleted=True, section_ids=section_ids)
 
     @classmethod
@@ -725,60 +648,82 @@ class SisSection(db.Model):
         if str(term_id) != str(app.config['CURRENT_TERM_ID']):
             app.logger.warn(f'Dates for term id {term_id} not configured; cannot query for nonstandard dates.')
             return set()
-        sql = """
-            SELECT DISTINCT s.section_id
-            FROM sis_sections s
-            JOIN scheduled d ON d.section_id = s.section_id
-                AND d.term_id = s.term_id
-            WHERE
-                s.term_id = :term_id
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                AND s.is_principal_listing IS TRUE
-                AND (
-                    (s.meeting_start_date::text NOT LIKE :term_begin AND d.created_at < s.meeting_start_date)
-                    OR s.meeting_end_date::text NOT LIKE :term_end
-                )
-                AND s.deleted_at IS NULL
-            ORDER BY s.section_id
-        """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_begin': f"{app.config['CURRENT_TERM_BEGIN']}%",
-                'term_end': f"{app.config['CURRENT_TERM_END']}%",
-                'term_id': term_id,
-            },
-        )
-        return set([row['section_id'] for row in rows])
+        return set(cls._section_ids_per_filter('Scheduled (Nonstandard Dates)', term_id))
 
     @classmethod
     def _section_ids_scheduled(cls, term_id):
-        sql = """
-            SELECT DISTINCT s.section_id
-            FROM sis_sections s
-            JOIN rooms r ON r.location = s.meeting_location
-            JOIN scheduled d ON d.section_id = s.section_id AND d.term_id = :term_id AND d.deleted_at IS NULL
-            LEFT JOIN instructors i ON i.uid = s.instructor_uid
-            WHERE
-                s.term_id = :term_id
-                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
-                AND s.is_principal_listing IS TRUE
-            ORDER BY s.section_id
+        sql = f"""
+            {_course_statuses_sql()}
+            SELECT section_id FROM course_statuses
+            WHERE scheduling_status = 'Scheduled'
+            ORDER BY section_id
         """
-        rows = db.session.execute(
-            text(sql),
-            {
-                'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
-                'term_id': term_id,
-            },
-        )
+        rows = db.session.execute(text(sql), _course_statuses_params(term_id))
         return set([row['section_id'] for row in rows])
 
+    @classmethod
+    def _get_courses_per_filter(cls, filter_, section_ids, term_id):
+        # Courses are returned in order of section_ids.
+        include_deleted = filter_ in ['Scheduled', 'Scheduled (Nonstandard Dates)']
+        courses = cls.get_courses(term_id, include_deleted=include_deleted, section_ids=section_ids)
+        courses_per_section_id = {course['sectionId']: course for course in courses}
+        return [courses_per_section_id[section_id] for section_id in section_ids if section_id in courses_per_section_id]
+
+    @classmethod
+    def _section_ids_per_page(cls, term_id, filter_, cursor=None, limit=None, search=None, sort_by='courseName', sort_desc=False):
+        params = _course_statuses_params(term_id)
+        search_clause = ''
+        if search:
+            search_clause = """
+                HAVING BOOL_OR(
+                    s.course_name ILIKE :search_pattern
+                    OR s.course_title ILIKE :search_pattern
+                    OR i.first_name || ' ' || i.last_name ILIKE :search_pattern
+                    OR s.instructor_uid = :search
+                    OR s.section_id::text = :search
+                )
+            """
+            params.update({'search': search.strip(), 'search_pattern': f'%{search.strip()}%'})
+        cursor_clause = ''
+        if cursor:
+            cursor_clause = f"WHERE (sort_key, section_id) {'<' if sort_desc else '>'} (:cursor_sort_key, :cursor_section_id)"
+            params.update({'cursor_sort_key': cursor[0], 'cursor_section_id': cursor[1]})
+        if limit:
+            params['limit'] = limit
+        direction = 'DESC' if sort_desc else 'ASC'
+        sql = f"""
+            {_course_statuses_sql()},
+            filtered AS (
+                SELECT cs.section_id, {COURSE_SORT_KEYS[sort_by]} AS sort_key
+                FROM course_statuses cs
+                JOIN sis_sections s ON s.section_id = cs.section_id AND s.term_id = :term_id
+                LEFT JOIN instructors i ON i.uid = s.instructor_uid
+                WHERE {COURSE_FILTER_CONDITIONS[filter_]}
+                GROUP BY cs.section_id
+                {search_clause}
+            )
+            SELECT section_id, sort_key FROM filtered
+            {cursor_clause}
+            ORDER BY sort_key {direction}, section_id {direction}
+            {'LIMIT :limit' if limit else ''}
+        """
+        return db.session.execute(text(sql), params).fetchall()
+
+    @classmethod
+    def _section_ids_per_filter(cls, filter_, term_id):
+        sql = f"""
+            {_course_statuses_sql()}
+            SELECT section_id FROM course_statuses
+            WHERE {COURSE_FILTER_CONDITIONS[filter_]}
+            ORDER BY section_id
+        """
+        rows = db.session.execute(text(sql), _course_statuses_params(term_id))
+        return [row['section_id'] for row in rows]
+
 
 def _to_api_json(term_id, rows, include_rooms=True):
-    rows = rows.fetchall()
-    section_ids = list(set(int(row['section_id']) for row in rows))
+    rows = [FeedRow._make(row) for row in rows]
+    section_ids = list(set(int(row.section_id) for row in rows))
     courses_per_id = {}
 
     # Perform bulk queries and build data structures for feed generation.
@@ -789,7 +734,7 @@ def _to_api_json(term_id, rows, include_rooms=True):
     approval_results = Approval.get_approvals_per_section_ids(section_ids=section_ids, term_id=term_id)
     scheduled_results = Scheduled.get_scheduled_per_section_ids(section_ids=section_ids, term_id=term_id)
 
-    room_ids = set(row['room_id'] for row in rows)
+    room_ids = set(row.room_id for row in rows)
     room_ids.update(a.room_id for a in approval_results)
     room_ids.update(s.room_id for s in scheduled_results)
     rooms = Room.get_rooms(list(room_ids))
@@ -811,9 +756,12 @@ def _to_api_json(term_id, rows, include_rooms=True):
     # Construct course objects.
     # If course has multiple instructors or multiple rooms then the section_id will be represented across multiple rows.
     # Multiple rooms are rare, but a course is sometimes associated with both an eligible and an ineligible room. We
-    # order rooms in SQL by capability, NULLS LAST, and use scheduling data from the first row available.
+    # order rooms in SQL by capability, NULLS LAST, and use scheduling data from the first row available. Instructor uids
+    # and meeting signatures are tracked per course, so that each row is handled in constant time.
+    instructor_uids_per_id = {}
+    meeting_signatures_per_id = {}
     for row in rows:
-        section_id = int(row['section_id'])
+        section_id = int(row.section_id)
         if section_id in courses_per_id:
             course = courses_per_id[section_id]
         else:
@@ -826,23 +774,23 @@ def _to_api_json(term_id, rows, include_rooms=True):
             # Construct course
             preferences = course_preferences_by_section_id.get(section_id)
             course = {
-                'allowedUnits': row['allowed_units'],
+                'allowedUnits': row.allowed_units,
                 'approvals': approvals,
                 'canAprxInstructorsEditRecordings': True if preferences and preferences.can_aprx_instructors_edit_recordings else False,
                 'canvasCourseSites': canvas_sites_by_section_id.get(section_id, []),
-                'courseName': row['course_name'],
-                'courseTitle': row['course_title'],
+                'courseName': row.course_name,
+                'courseTitle': row.course_title,
                 'crossListings': cross_listed_courses,
-                'deletedAt': safe_strftime(row['deleted_at'], '%Y-%m-%d'),
+                'deletedAt': safe_strftime(row.deleted_at, '%Y-%m-%d'),
                 'hasOptedOut': True if preferences and preferences.has_opted_out else False,
-                'instructionFormat': row['instruction_format'],
+                'instructionFormat': row.instruction_format,
                 'instructors': instructors,
                 'invitees': invited_uids_by_section_id.get(section_id),
-                'isPrimary': row['is_primary'],
+                'isPrimary': row.is_primary,
                 'label': _construct_course_label(
-                    course_name=row['course_name'],
-                    instruction_format=row['instruction_format'],
-                    section_num=row['section_num'],
+                    course_name=row.course_name,
+                    instruction_format=row.instruction_format,
+                    section_num=row.section_num,
                     cross_listings=cross_listed_courses,
                 ),
                 'meetings': {
@@ -851,16 +799,18 @@ def _to_api_json(term_id, rows, include_rooms=True):
                 },
                 'nonstandardMeetingDates': False,
                 'sectionId': section_id,
-                'sectionNum': row['section_num'],
+                'sectionNum': row.section_num,
                 'scheduled': scheduled,
-                'termId': row['term_id'],
+                'termId': row.term_id,
             }
             courses_per_id[section_id] = course
+            instructor_uids_per_id[section_id] = set(i['uid'] for i in instructors)
+            meeting_signatures_per_id[section_id] = set()
 
         # Note: Instructors associated with cross-listings are slurped up separately.
-        instructor_uid = row['instructor_uid']
+        instructor_uid = row.instructor_uid
         instructor_uid = instructor_uid.strip() if instructor_uid else None
-        if instructor_uid and instructor_uid not in [i['uid'] for i in course['instructors']]:
+        if instructor_uid and instructor_uid not in instructor_uids_per_id[section_id]:
             instructor_json = _to_instructor_json(
                 row=row,
                 approvals=course['approvals'],
@@ -871,32 +821,33 @@ def _to_api_json(term_id, rows, include_rooms=True):
             # 2. If the course IS DELETED then include deleted instructors.
             if not instructor_json['deletedAt'] or course['deletedAt']:
                 course['instructors'].append(instructor_json)
+                instructor_uids_per_id[section_id].add(instructor_json['uid'])
 
-        meeting = _to_meeting_json(row)
-        eligible_meetings = course['meetings']['eligible']
-        ineligible_meetings = course['meetings']['ineligible']
-        if not next((m for m in (eligible_meetings + ineligible_meetings) if meeting.items() <= m.items()), None):
-            room = rooms_by_id.get(row['room_id']) if 'room_id' in row.keys() else None
+        meeting_signature = _get_meeting_signature(row)
+        if meeting_signature not in meeting_signatures_per_id[section_id]:
+            meeting_signatures_per_id[section_id].add(meeting_signature)
+            meeting = _to_meeting_json(row)
+            room = rooms_by_id.get(row.room_id)
             if room and room.capability:
                 meeting['eligible'] = True
                 meeting.update({
                     'recordingEndDate': safe_strftime(get_recording_end_date(meeting), '%Y-%m-%d'),
                     'recordingStartDate': safe_strftime(get_recording_start_date(meeting), '%Y-%m-%d'),
                 })
-                eligible_meetings.append(meeting)
-                eligible_meetings.sort(key=lambda m: f"{m['startDate']} {m['startTime']}")
+                course['meetings']['eligible'].append(meeting)
                 if meeting['startDate'] != app.config['CURRENT_TERM_BEGIN'] or meeting['endDate'] != app.config['CURRENT_TERM_END']:
                     course['nonstandardMeetingDates'] = True
             else:
                 meeting['eligible'] = False
-                ineligible_meetings.append(meeting)
-                ineligible_meetings.sort(key=lambda m: f"{m['startDate']} {m['startTime']}")
+                course['meetings']['ineligible'].append(meeting)
             if include_rooms:
                 meeting['room'] = room.to_api_json() if room else None
 
     # Next, construct the feed
     api_json = []
     for section_id, course in courses_per_id.items():
+        for meetings in course['meetings'].values():
+            meetings.sort(key=lambda m: f"{m['startDate']} {m['startTime']}")
         _decorate_course(course)
         # Add course to the feed
         api_json.append(course)
@@ -904,6 +855,148 @@ def _to_api_json(term_id, rows, include_rooms=True):
     return api_json
 
 
+def _courses_from_and_where_clauses(
+    course_filter,
+    include_deleted=False,
+    include_non_principal_sections=False,
+    include_null_meeting_locations=False,
+):
+    return f"""
+        FROM sis_sections s
+        {'LEFT' if include_null_meeting_locations else ''} JOIN rooms r ON r.location = s.meeting_location
+        LEFT JOIN instructors i ON i.uid = s.instructor_uid
+        WHERE
+            {course_filter}
+            AND s.term_id = :term_id
+            AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
+            {'' if include_non_principal_sections else 'AND s.is_principal_listing IS TRUE'}
+            {'' if include_deleted else ' AND s.deleted_at IS NULL '}
+    """
+
+
+def _execute_feed_query(from_and_where_clauses, params):
+    sql = f"""
+        SELECT
+            {_feed_columns()}
+        {from_and_where_clauses}
+        ORDER BY s.course_name, s.section_id, s.instructor_uid, r.capability NULLS LAST
+    """
+    return db.session.execute(text(sql), params)
+
+
+def _feed_columns(with_room=True):
+    columns = {**FEED_COLUMNS, 'room_id': FEED_COLUMNS['room_id'] if with_room else 'NULL::INTEGER'}
+    return ',\n'.join(f'{expression} AS {name}' for name, expression in columns.items())
+
+
+def _course_statuses_params(term_id):
+    is_current_term = str(term_id) == str(app.config['CURRENT_TERM_ID'])
+    return {
+        'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
+        'is_current_term': is_current_term,
+        'term_begin': f"{app.config['CURRENT_TERM_BEGIN']}%",
+        'term_end': f"{app.config['CURRENT_TERM_END']}%",
+        'term_id': term_id,
+    }
+
+
+def _course_statuses_sql():
+    # One row per principal section, classified by the same rules as _decorate_course_approvals and
+    # _decorate_course_scheduling. Course filters and status counts are predicates on this CTE.
+    return """
+        WITH principal_sections AS (
+            SELECT
+                s.section_id,
+                BOOL_OR(r.capability IS NOT NULL AND s.deleted_at IS NULL) AS is_in_eligible_room,
+                BOOL_AND(s.deleted_at IS NOT NULL) AS is_deleted,
+                BOOL_OR(
+                    :is_current_term
+                    AND s.deleted_at IS NULL
+                    AND (
+                        (s.meeting_start_date::text NOT LIKE :term_begin AND d.created_at < s.meeting_start_date)
+                        OR s.meeting_end_date::text NOT LIKE :term_end
+                    )
+                ) AS has_nonstandard_dates
+            FROM sis_sections s
+            JOIN rooms r ON r.location = s.meeting_location
+            LEFT JOIN scheduled d ON d.section_id = s.section_id AND d.term_id = s.term_id
+            WHERE
+                s.term_id = :term_id
+                AND (s.instructor_uid IS NULL OR s.instructor_role_code = ANY(:instructor_role_codes))
+                AND s.is_principal_listing IS TRUE
+            GROUP BY s.section_id
+        ),
+        course_instructors AS (
+            -- Current instructors of the principal section and its cross-listings.
+            SELECT DISTINCT p.section_id, TRIM(s.instructor_uid) AS uid
+            FROM principal_sections p
+            JOIN sis_sections s ON
+                s.term_id = :term_id
+                AND (
+                    s.section_id = p.section_id
+                    OR s.section_id IN (
+                        SELECT member_section_id FROM cross_listing_members
+                        WHERE term_id = :term_id AND principal_section_id = p.section_id
+                    )
+                )
+                AND s.instructor_role_code = ANY(:instructor_role_codes)
+                AND (s.deleted_at IS NULL OR p.is_deleted)
+            WHERE TRIM(s.instructor_uid) <> ''
+        ),
+        course_approvals AS (
+            SELECT
+                a.section_id,
+                BOOL_OR(a.approver_type = 'admin') AS was_approved_by_admin,
+                COUNT(DISTINCT ci.uid) AS approved_instructor_count
+            FROM approvals a
+            LEFT JOIN course_instructors ci ON ci.section_id = a.section_id AND ci.uid = a.approved_by_uid
+            WHERE a.term_id = :term_id AND a.deleted_at IS NULL
+            GROUP BY a.section_id
+        ),
+        course_flags AS (
+            SELECT
+                p.*,
+                (SELECT COUNT(*) FROM course_instructors ci WHERE ci.section_id = p.section_id) AS instructor_count,
+                COALESCE(ca.approved_instructor_count, 0) AS approved_instructor_count,
+                COALESCE(ca.was_approved_by_admin, FALSE) AS was_approved_by_admin,
+                ca.section_id IS NOT NULL AS has_approvals,
+                COALESCE(cp.has_opted_out, FALSE) AS has_opted_out,
+                EXISTS(
+                    SELECT FROM sent_emails e
+                    WHERE e.section_id = p.section_id AND e.term_id = :term_id AND e.template_type = 'invitation'
+                    UNION ALL
+                    SELECT FROM queued_emails q
+                    WHERE q.section_id = p.section_id AND q.term_id = :term_id AND q.template_type = 'invitation'
+                        AND q.dead_lettered_at IS NULL
+                ) AS is_invited,
+                EXISTS(
+                    SELECT FROM scheduled d
+                    WHERE d.section_id = p.section_id AND d.term_id = :term_id AND d.deleted_at IS NULL
+                ) AS is_scheduled
+            FROM principal_sections p
+            LEFT JOIN course_approvals ca ON ca.section_id = p.section_id
+            LEFT JOIN course_preferences cp ON cp.section_id = p.section_id AND cp.term_id = :term_id
+        ),
+        course_statuses AS (
+            SELECT
+                f.*,
+                CASE
+                    WHEN f.instructor_count > 0 AND f.approved_instructor_count = f.instructor_count THEN 'Approved'
+                    WHEN f.approved_instructor_count > 0 THEN 'Partially Approved'
+                    WHEN f.instructor_count > 0 AND f.is_invited THEN 'Invited'
+                    ELSE 'Not Invited'
+                END AS approval_status,
+                CASE
+                    WHEN f.is_scheduled THEN 'Scheduled'
+                    WHEN f.was_approved_by_admin OR (f.instructor_count > 0 AND f.approved_instructor_count = f.instructor_count)
+                        THEN 'Queued for Scheduling'
+                    ELSE 'Not Scheduled'
+                END AS scheduling_status
+            FROM course_flags f
+        )
+    """
+
+
 def _decorate_course(course):
     _decorate_course_approvals(course)
     _decorate_course_scheduling(course)
@@ -971,43 +1064,38 @@ def _decorate_course_meeting_type(course):
 
 def _get_cross_listed_courses(section_ids, term_id, approvals, invited_uids):
     # Return course and instructor info for cross-listings, and Canvas site info for cross-listings as well as the
-    # principal section. Although cross-listed sections were "deleted" during SIS data refresh job, we still rely
-    # on metadata from those deleted records.
-    cross_listings_by_section_id = CrossListing.get_cross_listings_for_section_ids(section_ids=section_ids, term_id=term_id)
-    all_cross_listing_ids = list(set(section_id for k, v in cross_listings_by_section_id.items() for section_id in v))
-    all_section_ids = list(set(section_ids + all_cross_listing_ids))
-
-    sql = """
+    # principal section. Cross-listed sections of all principal sections are fetched in a single join against the
+    # cross_listing_members table.
+    sql = f"""
         SELECT
-            s.*,
-            i.dept_code AS instructor_dept_code,
-            i.email AS instructor_email,
-            i.first_name || ' ' || i.last_name AS instructor_name,
-            i.uid AS instructor_uid
-        FROM sis_sections s
+            {_feed_columns(with_room=False)},
+            m.principal_section_id
+        FROM cross_listing_members m
+        JOIN sis_sections s ON s.section_id = m.member_section_id AND s.term_id = m.term_id
         LEFT JOIN instructors i ON i.uid = s.instructor_uid
         WHERE
-            s.term_id = :term_id
-            AND s.section_id = ANY(:all_cross_listing_ids)
+            m.term_id = :term_id
+            AND m.principal_section_id = ANY(:section_ids)
             AND s.instructor_role_code = ANY(:instructor_role_codes)
             AND s.deleted_at IS NULL
-        ORDER BY course_name, section_id
+        ORDER BY m.principal_section_id, m.member_section_id, s.instructor_uid
     """
     rows = db.session.execute(
         text(sql),
         {
-            'all_cross_listing_ids': all_cross_listing_ids,
             'instructor_role_codes': AUTHORIZED_INSTRUCTOR_ROLE_CODES,
+            'section_ids': section_ids,
             'term_id': term_id,
         },
     )
-    rows_by_cross_listing_id = {section_id: [] for section_id in all_cross_listing_ids}
+    rows_by_section_id = {}
     for row in rows:
-        rows_by_cross_listing_id[row['section_id']].append(row)
+        rows_by_section_id.setdefault(row.principal_section_id, []).append(FeedRow._make(row[:-1]))
 
-    canvas_sites_by_cross_listing_id = {section_id: [] for section_id in all_section_ids}
-    for site in CanvasCourseSite.get_canvas_course_sites(section_ids=all_section_ids, term_id=term_id):
-        canvas_sites_by_cross_listing_id[site.section_id].append({
+    cross_listing_ids = set(row.section_id for rows_ in rows_by_section_id.values() for row in rows_)
+    canvas_sites_by_id = {}
+    for site in CanvasCourseSite.get_canvas_course_sites(section_ids=list(set(section_ids) | cross_listing_ids), term_id=term_id):
+        canvas_sites_by_id.setdefault(site.section_id, []).append({
             'courseSiteId': site.canvas_course_site_id,
             'courseSiteName': site.canvas_course_site_name,
         })
@@ -1015,46 +1103,44 @@ def _get_cross_listed_courses(section_ids, term_id, approvals, invited_uids):
     courses_by_section_id = {}
     instructors_by_section_id = {}
     canvas_sites_by_section_id = {}
-
-    # First, collect Canvas sites associated with principal section ids.
     for section_id in section_ids:
-        canvas_sites_by_section_id[section_id] = []
-        for canvas_site in canvas_sites_by_cross_listing_id.get(section_id, []):
-            canvas_sites_by_section_id[section_id].append(canvas_site)
-
-    # Next, collect course data, instructor data, and Canvas sites associated with cross-listings.
-    for section_id, cross_listing_ids in cross_listings_by_section_id.items():
+        # Canvas sites of the principal section come first.
+        canvas_sites_by_section_id[section_id] = list(canvas_sites_by_id.get(section_id, []))
+        canvas_course_ids = set(c['courseSiteId'] for c in canvas_sites_by_section_id[section_id])
+        if section_id not in rows_by_section_id:
+            continue
         approvals_for_section = approvals.get(section_id, [])
         invited_uids_for_section = invited_uids.get(section_id, [])
         courses_by_section_id[section_id] = []
         instructors_by_section_id[section_id] = []
-        for cross_listing_id in cross_listing_ids:
-            if rows_by_cross_listing_id[cross_listing_id]:
-                # Our first row provides course-specific data.
-                row = rows_by_cross_listing_id[cross_listing_id][0]
+        instructor_uids = set()
+        previous_cross_listing_id = None
+        for row in rows_by_section_id[section_id]:
+            cross_listing_id = row.section_id
+            if cross_listing_id != previous_cross_listing_id:
+                # First row of each cross-listing provides course-specific data.
+                previous_cross_listing_id = cross_listing_id
                 courses_by_section_id[section_id].append({
-                    'courseName': row['course_name'],
-                    'courseTitle': row['course_title'],
-                    'instructionFormat': row['instruction_format'],
-                    'sectionNum': row['section_num'],
-                    'isPrimary': row['is_primary'],
-                    'label': f"{row['course_name']}, {row['instruction_format']} {row['section_num']}",
-                    'sectionId': row['section_id'],
-                    'termId': row['term_id'],
+                    'courseName': row.course_name,
+                    'courseTitle': row.course_title,
+                    'instructionFormat': row.instruction_format,
+                    'sectionNum': row.section_num,
+                    'isPrimary': row.is_primary,
+                    'label': f'{row.course_name}, {row.instruction_format} {row.section_num}',
+                    'sectionId': row.section_id,
+                    'termId': row.term_id,
                 })
-                # Instructor-specific data may be spread across multiple rows.
-                for row in rows_by_cross_listing_id[cross_listing_id]:
-                    if row['instructor_uid'] and row['instructor_uid'] not in [i['uid'] for i in instructors_by_section_id[section_id]]:
-                        instructor_json = _to_instructor_json(row, approvals_for_section, invited_uids=invited_uids_for_section)
-                        uid = (instructor_json['uid'] or '').strip() if instructor_json else None
-                        if uid and not instructor_json['deletedAt']:
-                            instructors_by_section_id[section_id].append(instructor_json)
-                canvas_course_ids = [c['courseSiteId'] for c in canvas_sites_by_section_id[section_id]]
-                for canvas_site in canvas_sites_by_cross_listing_id[cross_listing_id]:
-                    canvas_course_id = canvas_site['courseSiteId']
-                    if canvas_course_id not in canvas_course_ids:
+                for canvas_site in canvas_sites_by_id.get(cross_listing_id, []):
+                    if canvas_site['courseSiteId'] not in canvas_course_ids:
                         canvas_sites_by_section_id[section_id].append(canvas_site)
-                        canvas_course_ids.append(canvas_course_id)
+                        canvas_course_ids.add(canvas_site['courseSiteId'])
+            # Instructor-specific data may be spread across multiple rows.
+            uid = (row.instructor_uid or '').strip()
+            if uid and row.instructor_uid not in instructor_uids:
+                instructor_json = _to_instructor_json(row, approvals_for_section, invited_uids=invited_uids_for_section)
+                if not instructor_json['deletedAt']:
+                    instructors_by_section_id[section_id].append(instructor_json)
+                    instructor_uids.add(row.instructor_uid)
     return courses_by_section_id, instructors_by_section_id, canvas_sites_by_section_id
 
 
@@ -1062,6 +1148,7 @@ def get_invited_uids_by_section_id(section_ids, term_id):
     sql = """
         SELECT section_id, recipient ->> 'uid' AS recipient_uid FROM queued_emails
         WHERE term_id = :term_id AND section_id = ANY(:section_ids) AND template_type = :template_type
+            AND dead_lettered_at IS NULL
         UNION
         SELECT section_id, recipient_uid FROM sent_emails
         WHERE term_id = :term_id AND section_id = ANY(:section_ids) AND template_type = :template_type
@@ -1094,13 +1181,13 @@ def _sections_with_at_least_one_eligible_room():
 
 
 def _to_instructor_json(row, approvals=None, invited_uids=None):
-    instructor_uid = row['instructor_uid']
+    instructor_uid = row.instructor_uid
     instructor_json = {
-        'deletedAt': safe_strftime(row['deleted_at'], '%Y-%m-%d'),
-        'deptCode': row['instructor_dept_code'],
-        'email': row['instructor_email'],
-        'name': row['instructor_name'],
-        'roleCode': row['instructor_role_code'],
+        'deletedAt': safe_strftime(row.deleted_at, '%Y-%m-%d'),
+        'deptCode': row.instructor_dept_code,
+        'email': row.instructor_email,
+        'name': row.instructor_name,
+        'roleCode': row.instructor_role_code,
         'uid': instructor_uid,
     }
     if approvals is not None:
@@ -1110,21 +1197,33 @@ def _to_instructor_json(row, approvals=None, invited_uids=None):
     return instructor_json
 
 
+def _get_meeting_signature(row):
+    # Distinct meetings of a course differ in at least one of these columns. Dates are compared as formatted in JSON.
+    return (
+        row.meeting_days,
+        safe_strftime(row.meeting_end_date, '%Y-%m-%d'),
+        row.meeting_end_time,
+        row.meeting_location,
+        safe_strftime(row.meeting_start_date, '%Y-%m-%d'),
+        row.meeting_start_time,
+    )
+
+
 def _to_meeting_json(row):
-    end_date = row['meeting_end_date']
-    start_date = row['meeting_start_date']
-    formatted_days = format_days(row['meeting_days'])
+    end_date = row.meeting_end_date
+    start_date = row.meeting_start_date
+    formatted_days = format_days(row.meeting_days)
     return {
-        'days': row['meeting_days'],
+        'days': row.meeting_days,
         'daysFormatted': formatted_days,
         'daysNames': get_names_of_days(formatted_days),
         'endDate': safe_strftime(end_date, '%Y-%m-%d'),
-        'endTime': row['meeting_end_time'],
-        'endTimeFormatted': format_time(row['meeting_end_time']),
-        'location': row['meeting_location'],
+        'endTime': row.meeting_end_time,
+        'endTimeFormatted': format_time(row.meeting_end_time),
+        'location': row.meeting_location,
         'startDate': safe_strftime(start_date, '%Y-%m-%d'),
-        'startTime': row['meeting_start_time'],
-        'startTimeFormatted': format_time(row['meeting_start_time']),
+        'startTime': row.meeting_start_time,
+        'startTimeFormatted': format_time(row.meeting_start_time),
     }
 
 
@@ -22,12 +22,58 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from diablo import cache
 from diablo.merged.calnet import get_calnet_user_for_uid
 from diablo.models.admin_user import AdminUser
 from diablo.models.sis_section import SisSection
 from flask import current_app as app
 from flask_login import UserMixin
 
+# Principals (profile, is_admin, is_teaching) per uid, in least-recently-used order. Entries expire after USER_CACHE_TTL
+# seconds. Each entry also records the version of the user cache, a counter in the shared cache tier, when it was loaded.
+# Changes to admin_users or sis_sections bump the version. Each process reads the version at most once per
+# USER_CACHE_VERSION_POLL_INTERVAL seconds, which bounds staleness of entries on other app servers.
+_principals = OrderedDict()
+_principals_lock = Lock()
+
+# Version of the user cache, as last read from the shared cache tier, and when (per time.monotonic) it was read.
+_version = {'polled_at': None, 'value': None}
+
+USER_CACHE_VERSION_KEY = 'user_cache/version'
+
+
+def clear_user_cache(uid=None):
+    version = _shared_cache().inc(USER_CACHE_VERSION_KEY)
+    with _principals_lock:
+        if uid:
+            _principals.pop(str(uid), None)
+        else:
+            _principals.clear()
+        # A version of None (i.e., backend error) is read again on next use.
+        _version.update(polled_at=None if version is None else time.monotonic(), value=version)
+
+
+def _get_user_cache_version():
+    now = time.monotonic()
+    with _principals_lock:
+        polled_at = _version['polled_at']
+        if polled_at is not None and now - polled_at < app.config['USER_CACHE_VERSION_POLL_INTERVAL']:
+            return _version['value']
+    version = _shared_cache().get(USER_CACHE_VERSION_KEY) or 0
+    with _principals_lock:
+        _version.update(polled_at=now, value=version)
+    return version
+
+
+def _shared_cache():
+    # The version must not be served from the in-process tier of TwoTierCache.
+    backend = cache.cache
+    return getattr(backend, 'shared', backend)
+
 
 class User(UserMixin):
 
@@ -95,6 +141,26 @@ class User(UserMixin):
 
     @classmethod
     def _load_user(cls, uid=None):
+        ttl = app.config['USER_CACHE_TTL']
+        if not uid or not ttl:
+            return cls._load_principal(uid)
+        now = time.monotonic()
+        version = _get_user_cache_version()
+        with _principals_lock:
+            expires_at, cached_version, principal = _principals.get(uid, (0, None, None))
+            if expires_at > now and cached_version == version:
+                _principals.move_to_end(uid)
+                return dict(principal)
+        principal = cls._load_principal(uid)
+        with _principals_lock:
+            _principals[uid] = (now + ttl, version, principal)
+            _principals.move_to_end(uid)
+            while len(_principals) > app.config['USER_CACHE_MAX_SIZE']:
+                _principals.popitem(last=False)
+        return dict(principal)
+
+    @classmethod
+    def _load_principal(cls, uid=None):
         calnet_profile = get_calnet_user_for_uid(app, uid) if uid else {}
         expired = calnet_profile.get('isExpiredPerLdap', True)
         is_admin = not expired and AdminUser.is_admin(uid)
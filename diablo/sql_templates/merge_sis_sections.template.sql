@@ -0,0 +1,116 @@
+/**
+ * Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+ *
+ * Permission to use, copy, modify, and distribute this software and its documentation
+ * for educational, research, and not-for-profit purposes, without fee and without a
+ * signed licensing agreement, is hereby granted, provided that the above copyright
+ * notice, this paragraph and the following two paragraphs appear in all copies,
+ * modifications, and distributions.
+ *
+ * Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+ * Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+ * http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+ *
+ * IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+ * INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+ * THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+ * OF THE POSSIBILITY OF SUCH DAMAGE.
+ *
+ * REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+ * IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+ * SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+ * "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ * ENHANCEMENTS, OR MODIFICATIONS.
+ */
+
+-- Apply staged SIS data (tmp_sis_sections) to sis_sections. Sections are compared by a hash of their content; only
+-- added, changed and removed sections are written. The change set is recorded in sis_section_changes.
+
+DROP TABLE IF EXISTS tmp_sis_section_hashes;
+
+CREATE TEMPORARY TABLE tmp_sis_section_hashes AS
+  SELECT
+    COALESCE(latest.section_id, current.section_id) AS section_id,
+    latest.content_hash AS latest_hash,
+    current.content_hash AS current_hash
+  FROM (
+    SELECT section_id, md5(string_agg(content, '|' ORDER BY content)) AS content_hash
+    FROM (
+      SELECT section_id, ROW(
+        allowed_units, course_name, course_title, instruction_format, instructor_name, instructor_role_code,
+        instructor_uid, is_primary, meeting_days, meeting_end_date, meeting_end_time, meeting_location,
+        meeting_start_date, meeting_start_time, section_num
+      )::TEXT AS content
+      FROM tmp_sis_sections
+      WHERE term_id = {term_id}
+    ) t
+    GROUP BY section_id
+  ) latest
+  FULL OUTER JOIN (
+    SELECT section_id, md5(string_agg(content, '|' ORDER BY content)) AS content_hash
+    FROM (
+      SELECT section_id, ROW(
+        allowed_units, course_name, course_title, instruction_format, instructor_name, instructor_role_code,
+        instructor_uid, is_primary, meeting_days, meeting_end_date, meeting_end_time, meeting_location,
+        meeting_start_date, meeting_start_time, section_num
+      )::TEXT AS content
+      FROM sis_sections
+      WHERE term_id = {term_id} AND deleted_at IS NULL
+    ) s
+    GROUP BY section_id
+  ) current ON current.section_id = latest.section_id
+  WHERE latest.content_hash IS DISTINCT FROM current.content_hash;
+
+DELETE FROM sis_section_changes WHERE term_id = {term_id};
+
+INSERT INTO sis_section_changes (term_id, section_id, change_type, created_at)
+  SELECT
+    {term_id},
+    section_id,
+    CASE
+      WHEN current_hash IS NULL THEN 'added'
+      WHEN latest_hash IS NULL THEN 'removed'
+      ELSE 'changed'
+    END::sis_section_change_types,
+    now()
+  FROM tmp_sis_section_hashes;
+
+-- Removed sections are soft-deleted.
+UPDATE sis_sections s SET deleted_at = now()
+  FROM sis_section_changes c
+  WHERE
+    c.term_id = {term_id}
+    AND c.change_type = 'removed'
+    AND s.term_id = c.term_id
+    AND s.section_id = c.section_id
+    AND s.deleted_at IS NULL;
+
+-- Rows of added and changed sections, including previously soft-deleted rows, are replaced.
+DELETE FROM sis_sections s
+  USING sis_section_changes c
+  WHERE
+    c.term_id = {term_id}
+    AND c.change_type IN ('added', 'changed')
+    AND s.term_id = c.term_id
+    AND s.section_id = c.section_id;
+
+INSERT INTO sis_sections (allowed_units, course_name, course_title, instruction_format, instructor_name,
+                          instructor_role_code, instructor_uid, is_primary, meeting_days, meeting_end_date,
+                          meeting_end_time, meeting_location, meeting_start_date, meeting_start_time, section_id,
+                          section_num, term_id)
+(
+  SELECT
+    t.allowed_units, t.course_name, t.course_title, t.instruction_format, t.instructor_name, t.instructor_role_code,
+    t.instructor_uid, t.is_primary, t.meeting_days, t.meeting_end_date, t.meeting_end_time, t.meeting_location,
+    t.meeting_start_date, t.meeting_start_time, t.section_id, t.section_num, t.term_id
+  FROM tmp_sis_sections t
+  JOIN sis_section_changes c ON
+    c.term_id = t.term_id
+    AND c.section_id = t.section_id
+    AND c.change_type IN ('added', 'changed')
+  WHERE t.term_id = {term_id}
+);
+
+DROP TABLE tmp_sis_section_hashes;
+
+DROP TABLE tmp_sis_sections;
@@ -49,7 +49,7 @@ def delete_kaltura_events(rehearsal):
         _print('Time for some Kaltura housekeeping...')
 
         kaltura = Kaltura()
-        kaltura_events = kaltura.get_events_by_tag(tags_like=CREATED_BY_DIABLO_TAG)
+        kaltura_events = kaltura.get_events_by_tag(fields=['description', 'id', 'summary'], tags_like=CREATED_BY_DIABLO_TAG)
         if kaltura_events:
             _print(f'In two seconds we will delete {len(kaltura_events)} event(s) in Kaltura. Use control-C to abort.')
             time.sleep(2)
@@ -46,7 +46,10 @@ ALTER TABLE IF EXISTS ONLY public.approvals DROP CONSTRAINT IF EXISTS approvals_
 ALTER TABLE IF EXISTS ONLY public.blackouts DROP CONSTRAINT IF EXISTS blackouts_name_unique_constraint;
 ALTER TABLE IF EXISTS ONLY public.blackouts DROP CONSTRAINT IF EXISTS blackouts_pkey;
 ALTER TABLE IF EXISTS ONLY public.canvas_course_sites DROP CONSTRAINT IF EXISTS canvas_course_sites_pkey;
+ALTER TABLE IF EXISTS ONLY public.course_document_generations DROP CONSTRAINT IF EXISTS course_document_generations_pkey;
+ALTER TABLE IF EXISTS ONLY public.course_documents DROP CONSTRAINT IF EXISTS course_documents_pkey;
 ALTER TABLE IF EXISTS ONLY public.course_preferences DROP CONSTRAINT IF EXISTS course_preferences_pkey;
+ALTER TABLE IF EXISTS ONLY public.cross_listing_members DROP CONSTRAINT IF EXISTS cross_listing_members_pkey;
 ALTER TABLE IF EXISTS ONLY public.cross_listings DROP CONSTRAINT IF EXISTS cross_listings_pkey;
 ALTER TABLE IF EXISTS ONLY public.email_templates DROP CONSTRAINT IF EXISTS email_templates_name_unique_constraint;
 ALTER TABLE IF EXISTS ONLY public.email_templates DROP CONSTRAINT IF EXISTS email_templates_pkey;
@@ -59,10 +62,15 @@ ALTER TABLE IF EXISTS ONLY public.rooms DROP CONSTRAINT IF EXISTS rooms_location
 ALTER TABLE IF EXISTS ONLY public.rooms DROP CONSTRAINT IF EXISTS rooms_pkey;
 ALTER TABLE IF EXISTS ONLY public.scheduled DROP CONSTRAINT IF EXISTS scheduled_pkey;
 ALTER TABLE IF EXISTS ONLY public.sent_emails DROP CONSTRAINT IF EXISTS sent_emails_pkey;
+ALTER TABLE IF EXISTS ONLY public.sis_section_changes DROP CONSTRAINT IF EXISTS sis_section_changes_pkey;
 ALTER TABLE IF EXISTS ONLY public.sis_sections DROP CONSTRAINT IF EXISTS sis_sections_pkey;
 
 --
 
+DROP INDEX IF EXISTS public.course_documents_term_id_course_name_idx;
+DROP INDEX IF EXISTS public.cross_listing_members_term_id_member_section_id_idx;
+DROP INDEX IF EXISTS public.queued_emails_term_id_next_attempt_at_idx;
+DROP INDEX IF EXISTS public.queued_emails_unique_idx;
 DROP INDEX IF EXISTS public.rooms_location_idx;
 DROP INDEX IF EXISTS public.sent_emails_section_id_idx;
 DROP INDEX IF EXISTS public.sis_sections_instructor_uid_idx;
@@ -77,7 +85,11 @@ DROP TABLE IF EXISTS public.approvals;
 DROP TABLE IF EXISTS public.blackouts;
 DROP SEQUENCE IF EXISTS public.blackouts_id_seq;
 DROP TABLE IF EXISTS public.canvas_course_sites;
+DROP TABLE IF EXISTS public.course_document_generations;
+DROP SEQUENCE IF EXISTS public.course_document_generations_seq;
+DROP TABLE IF EXISTS public.course_documents;
 DROP TABLE IF EXISTS public.course_preferences;
+DROP TABLE IF EXISTS public.cross_listing_members;
 DROP TABLE IF EXISTS public.cross_listings;
 DROP TABLE IF EXISTS public.email_templates;
 DROP SEQUENCE IF EXISTS public.email_templates_id_seq;
@@ -94,17 +106,26 @@ DROP SEQUENCE IF EXISTS public.rooms_id_seq;
 DROP TABLE IF EXISTS public.scheduled;
 DROP TABLE IF EXISTS public.sent_emails;
 DROP SEQUENCE IF EXISTS public.sent_emails_id_seq;
+DROP TABLE IF EXISTS public.sis_section_changes;
 DROP TABLE IF EXISTS public.sis_sections;
 DROP SEQUENCE IF EXISTS public.sis_sections_id_seq;
 
 --
 
+DROP FUNCTION IF EXISTS public.invalidate_all_course_documents();
+DROP FUNCTION IF EXISTS public.invalidate_course_documents();
+DROP FUNCTION IF EXISTS public.delete_all_course_documents();
+DROP FUNCTION IF EXISTS public.delete_course_documents(INTEGER, INTEGER);
+
+--
+
 DROP TYPE IF EXISTS public.approver_types;
 DROP TYPE IF EXISTS public.email_template_types;
 DROP TYPE IF EXISTS public.job_schedule_types;
 DROP TYPE IF EXISTS public.publish_types;
 DROP TYPE IF EXISTS public.recording_types;
 DROP TYPE IF EXISTS public.room_capability_types;
+DROP TYPE IF EXISTS public.sis_section_change_types;
 DROP TYPE IF EXISTS public.user_types;
 
 --
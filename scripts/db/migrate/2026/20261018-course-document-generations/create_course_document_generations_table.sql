@@ -0,0 +1,89 @@
+/**
+ * Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+ *
+ * Permission to use, copy, modify, and distribute this software and its documentation
+ * for educational, research, and not-for-profit purposes, without fee and without a
+ * signed licensing agreement, is hereby granted, provided that the above copyright
+ * notice, this paragraph and the following two paragraphs appear in all copies,
+ * modifications, and distributions.
+ *
+ * Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+ * Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+ * http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+ *
+ * IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+ * INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+ * THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+ * OF THE POSSIBILITY OF SUCH DAMAGE.
+ *
+ * REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+ * IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+ * SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+ * "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ * ENHANCEMENTS, OR MODIFICATIONS.
+ */
+
+BEGIN;
+
+-- Invalidation generation per (term_id, section_id). The row (0, 0) is the generation of all course documents.
+CREATE SEQUENCE IF NOT EXISTS course_document_generations_seq AS BIGINT;
+ALTER TABLE course_document_generations_seq OWNER TO diablo;
+
+CREATE TABLE IF NOT EXISTS course_document_generations (
+    term_id INTEGER NOT NULL,
+    section_id INTEGER NOT NULL,
+    generation BIGINT NOT NULL DEFAULT nextval('course_document_generations_seq')
+);
+ALTER TABLE course_document_generations OWNER TO diablo;
+ALTER TABLE course_document_generations ADD CONSTRAINT course_document_generations_pkey PRIMARY KEY (section_id, term_id);
+INSERT INTO course_document_generations (term_id, section_id) VALUES (0, 0) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION delete_course_documents(_term_id INTEGER, _section_id INTEGER) RETURNS VOID AS $$
+    -- Principal sections carry data of their cross-listings. The generation of each affected section is bumped before
+    -- its document is deleted, so that documents built concurrently from older data are not stored.
+    -- See CourseDocument.upsert.
+    INSERT INTO course_document_generations (term_id, section_id)
+    SELECT _term_id, _section_id WHERE _term_id IS NOT NULL AND _section_id IS NOT NULL
+    UNION
+    SELECT term_id, principal_section_id FROM cross_listing_members
+    WHERE term_id = _term_id AND member_section_id = _section_id
+    ON CONFLICT (section_id, term_id) DO UPDATE SET generation = EXCLUDED.generation;
+
+    DELETE FROM course_documents
+    WHERE term_id = _term_id
+        AND (
+            section_id = _section_id
+            OR section_id IN (
+                SELECT principal_section_id FROM cross_listing_members
+                WHERE term_id = _term_id AND member_section_id = _section_id
+            )
+        );
+$$ LANGUAGE SQL;
+
+CREATE OR REPLACE FUNCTION delete_all_course_documents() RETURNS VOID AS $$
+    UPDATE course_document_generations SET generation = nextval('course_document_generations_seq')
+    WHERE term_id = 0 AND section_id = 0;
+
+    DELETE FROM course_documents;
+$$ LANGUAGE SQL;
+
+CREATE OR REPLACE FUNCTION invalidate_course_documents() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM delete_course_documents(OLD.term_id, OLD.section_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM delete_course_documents(NEW.term_id, NEW.section_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION invalidate_all_course_documents() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM delete_all_course_documents();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
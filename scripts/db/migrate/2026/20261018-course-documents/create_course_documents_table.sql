@@ -0,0 +1,96 @@
+/**
+ * Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+ *
+ * Permission to use, copy, modify, and distribute this software and its documentation
+ * for educational, research, and not-for-profit purposes, without fee and without a
+ * signed licensing agreement, is hereby granted, provided that the above copyright
+ * notice, this paragraph and the following two paragraphs appear in all copies,
+ * modifications, and distributions.
+ *
+ * Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+ * Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+ * http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+ *
+ * IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+ * INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+ * THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+ * OF THE POSSIBILITY OF SUCH DAMAGE.
+ *
+ * REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+ * IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+ * SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+ * "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ * ENHANCEMENTS, OR MODIFICATIONS.
+ */
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS course_documents (
+    term_id INTEGER NOT NULL,
+    section_id INTEGER NOT NULL,
+    course_name VARCHAR(80),
+    api_json JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+ALTER TABLE course_documents OWNER TO diablo;
+ALTER TABLE course_documents ADD CONSTRAINT course_documents_pkey PRIMARY KEY (section_id, term_id);
+CREATE INDEX IF NOT EXISTS course_documents_term_id_course_name_idx ON course_documents (term_id, course_name, section_id);
+
+-- Invalidate materialized course feeds (course_documents) when contributing rows change.
+
+CREATE OR REPLACE FUNCTION delete_course_documents(_term_id INTEGER, _section_id INTEGER) RETURNS VOID AS $$
+    -- Principal sections carry data of their cross-listings.
+    DELETE FROM course_documents
+    WHERE term_id = _term_id
+        AND (
+            section_id = _section_id
+            OR section_id IN (
+                SELECT section_id FROM cross_listings
+                WHERE term_id = _term_id AND _section_id = ANY(cross_listed_section_ids)
+            )
+        );
+$$ LANGUAGE SQL;
+
+CREATE OR REPLACE FUNCTION invalidate_course_documents() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM delete_course_documents(OLD.term_id, OLD.section_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM delete_course_documents(NEW.term_id, NEW.section_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION invalidate_all_course_documents() RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM course_documents;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER approvals_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON approvals
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER canvas_course_sites_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON canvas_course_sites
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER course_preferences_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON course_preferences
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER cross_listings_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON cross_listings
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER queued_emails_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON queued_emails
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER scheduled_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON scheduled
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER sent_emails_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON sent_emails
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER sis_sections_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON sis_sections
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+
+-- Room eligibility and instructor profiles are shared by many courses.
+CREATE TRIGGER instructors_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON instructors
+    FOR EACH STATEMENT EXECUTE PROCEDURE invalidate_all_course_documents();
+CREATE TRIGGER rooms_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON rooms
+    FOR EACH STATEMENT EXECUTE PROCEDURE invalidate_all_course_documents();
+
+COMMIT;
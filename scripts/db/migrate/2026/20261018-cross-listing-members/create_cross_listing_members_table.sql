@@ -0,0 +1,53 @@
+/**
+ * Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+ *
+ * Permission to use, copy, modify, and distribute this software and its documentation
+ * for educational, research, and not-for-profit purposes, without fee and without a
+ * signed licensing agreement, is hereby granted, provided that the above copyright
+ * notice, this paragraph and the following two paragraphs appear in all copies,
+ * modifications, and distributions.
+ *
+ * Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+ * Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+ * http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+ *
+ * IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+ * INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+ * THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+ * OF THE POSSIBILITY OF SUCH DAMAGE.
+ *
+ * REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+ * IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+ * SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+ * "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ * ENHANCEMENTS, OR MODIFICATIONS.
+ */
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS cross_listing_members (
+    term_id INTEGER NOT NULL,
+    principal_section_id INTEGER NOT NULL,
+    member_section_id INTEGER NOT NULL
+);
+ALTER TABLE cross_listing_members OWNER TO diablo;
+ALTER TABLE cross_listing_members ADD CONSTRAINT cross_listing_members_pkey PRIMARY KEY (term_id, principal_section_id, member_section_id);
+CREATE INDEX IF NOT EXISTS cross_listing_members_term_id_member_section_id_idx ON cross_listing_members (term_id, member_section_id);
+
+INSERT INTO cross_listing_members (term_id, principal_section_id, member_section_id)
+    SELECT DISTINCT term_id, section_id, UNNEST(cross_listed_section_ids) FROM cross_listings;
+
+CREATE OR REPLACE FUNCTION delete_course_documents(_term_id INTEGER, _section_id INTEGER) RETURNS VOID AS $$
+    -- Principal sections carry data of their cross-listings.
+    DELETE FROM course_documents
+    WHERE term_id = _term_id
+        AND (
+            section_id = _section_id
+            OR section_id IN (
+                SELECT principal_section_id FROM cross_listing_members
+                WHERE term_id = _term_id AND member_section_id = _section_id
+            )
+        );
+$$ LANGUAGE SQL;
+
+COMMIT;
@@ -0,0 +1,47 @@
+/**
+ * Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+ *
+ * Permission to use, copy, modify, and distribute this software and its documentation
+ * for educational, research, and not-for-profit purposes, without fee and without a
+ * signed licensing agreement, is hereby granted, provided that the above copyright
+ * notice, this paragraph and the following two paragraphs appear in all copies,
+ * modifications, and distributions.
+ *
+ * Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+ * Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+ * http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+ *
+ * IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+ * INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+ * THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+ * OF THE POSSIBILITY OF SUCH DAMAGE.
+ *
+ * REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+ * IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+ * SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+ * "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ * ENHANCEMENTS, OR MODIFICATIONS.
+ */
+
+BEGIN;
+
+ALTER TABLE queued_emails ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE queued_emails ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE queued_emails ADD COLUMN IF NOT EXISTS dead_lettered_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE queued_emails ADD COLUMN IF NOT EXISTS last_error TEXT;
+
+CREATE INDEX IF NOT EXISTS queued_emails_term_id_next_attempt_at_idx
+    ON queued_emails (term_id, next_attempt_at) WHERE dead_lettered_at IS NULL;
+
+-- Dead letters do not block a new, identical email.
+DROP INDEX IF EXISTS queued_emails_unique_idx;
+CREATE UNIQUE INDEX queued_emails_unique_idx
+    ON queued_emails (term_id, section_id, template_type, md5(recipient::text), md5(message)) WHERE dead_lettered_at IS NULL;
+
+-- Delivery bookkeeping of queued emails (attempts, leases) does not affect course documents. A dead letter does: its
+-- invitation was never sent.
+DROP TRIGGER IF EXISTS queued_emails_course_documents_trigger ON queued_emails;
+CREATE TRIGGER queued_emails_course_documents_trigger AFTER INSERT OR UPDATE OF dead_lettered_at, section_id, template_type, term_id OR DELETE ON queued_emails
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+
+COMMIT;
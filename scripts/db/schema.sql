@@ -91,6 +91,14 @@ CREATE TYPE room_capability_types AS ENUM (
 
 --
 
+CREATE TYPE sis_section_change_types AS ENUM (
+    'added',
+    'changed',
+    'removed'
+);
+
+--
+
 CREATE TABLE admin_users (
     id integer NOT NULL,
     uid character varying(255) NOT NULL,
@@ -170,6 +178,35 @@ ALTER TABLE canvas_course_sites ADD CONSTRAINT canvas_course_sites_pkey PRIMARY
 
 --
 
+CREATE TABLE course_documents (
+    term_id INTEGER NOT NULL,
+    section_id INTEGER NOT NULL,
+    course_name VARCHAR(80),
+    api_json JSONB NOT NULL,
+    format_key VARCHAR(32) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+ALTER TABLE course_documents OWNER TO diablo;
+ALTER TABLE course_documents ADD CONSTRAINT course_documents_pkey PRIMARY KEY (section_id, term_id);
+CREATE INDEX course_documents_term_id_course_name_idx ON course_documents (term_id, course_name, section_id);
+
+--
+
+-- Invalidation generation per (term_id, section_id). The row (0, 0) is the generation of all course documents.
+CREATE SEQUENCE course_document_generations_seq AS BIGINT;
+ALTER TABLE course_document_generations_seq OWNER TO diablo;
+
+CREATE TABLE course_document_generations (
+    term_id INTEGER NOT NULL,
+    section_id INTEGER NOT NULL,
+    generation BIGINT NOT NULL DEFAULT nextval('course_document_generations_seq')
+);
+ALTER TABLE course_document_generations OWNER TO diablo;
+ALTER TABLE course_document_generations ADD CONSTRAINT course_document_generations_pkey PRIMARY KEY (section_id, term_id);
+INSERT INTO course_document_generations (term_id, section_id) VALUES (0, 0);
+
+--
+
 CREATE TABLE course_preferences (
     term_id INTEGER NOT NULL,
     section_id INTEGER NOT NULL,
@@ -193,6 +230,17 @@ ALTER TABLE cross_listings ADD CONSTRAINT cross_listings_pkey PRIMARY KEY (secti
 
 --
 
+CREATE TABLE cross_listing_members (
+    term_id INTEGER NOT NULL,
+    principal_section_id INTEGER NOT NULL,
+    member_section_id INTEGER NOT NULL
+);
+ALTER TABLE cross_listing_members OWNER TO diablo;
+ALTER TABLE cross_listing_members ADD CONSTRAINT cross_listing_members_pkey PRIMARY KEY (term_id, principal_section_id, member_section_id);
+CREATE INDEX cross_listing_members_term_id_member_section_id_idx ON cross_listing_members (term_id, member_section_id);
+
+--
+
 CREATE TABLE email_templates (
     id INTEGER NOT NULL,
     template_type email_template_types NOT NULL,
@@ -297,7 +345,11 @@ CREATE TABLE queued_emails (
     section_id INTEGER NOT NULL,
     template_type email_template_types,
     term_id INTEGER NOT NULL,
-    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE,
+    dead_lettered_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT
 );
 ALTER TABLE queued_emails OWNER TO diablo;
 CREATE SEQUENCE queued_emails_id_seq
@@ -311,6 +363,9 @@ ALTER SEQUENCE queued_emails_id_seq OWNED BY queued_emails.id;
 ALTER TABLE ONLY queued_emails ALTER COLUMN id SET DEFAULT nextval('queued_emails_id_seq'::regclass);
 ALTER TABLE ONLY queued_emails
     ADD CONSTRAINT queued_emails_pkey PRIMARY KEY (id);
+CREATE UNIQUE INDEX queued_emails_unique_idx
+    ON queued_emails (term_id, section_id, template_type, md5(recipient::text), md5(message)) WHERE dead_lettered_at IS NULL;
+CREATE INDEX queued_emails_term_id_next_attempt_at_idx ON queued_emails (term_id, next_attempt_at) WHERE dead_lettered_at IS NULL;
 
 --
 
@@ -388,6 +443,17 @@ CREATE INDEX sent_emails_section_id_idx ON sent_emails USING btree (section_id);
 
 --
 
+CREATE TABLE sis_section_changes (
+    term_id INTEGER NOT NULL,
+    section_id INTEGER NOT NULL,
+    change_type sis_section_change_types NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+ALTER TABLE sis_section_changes OWNER TO diablo;
+ALTER TABLE sis_section_changes ADD CONSTRAINT sis_section_changes_pkey PRIMARY KEY (term_id, section_id);
+
+--
+
 CREATE TABLE sis_sections (
     id INTEGER NOT NULL,
     allowed_units VARCHAR(80),
@@ -437,3 +503,80 @@ ALTER TABLE ONLY scheduled
     ADD CONSTRAINT scheduled_room_id_fkey FOREIGN KEY (room_id) REFERENCES rooms(id);
 
 --
+
+-- Invalidate materialized course feeds (course_documents) when contributing rows change.
+
+CREATE OR REPLACE FUNCTION delete_course_documents(_term_id INTEGER, _section_id INTEGER) RETURNS VOID AS $$
+    -- Principal sections carry data of their cross-listings. The generation of each affected section is bumped before
+    -- its document is deleted, so that documents built concurrently from older data are not stored.
+    -- See CourseDocument.upsert.
+    INSERT INTO course_document_generations (term_id, section_id)
+    SELECT _term_id, _section_id WHERE _term_id IS NOT NULL AND _section_id IS NOT NULL
+    UNION
+    SELECT term_id, principal_section_id FROM cross_listing_members
+    WHERE term_id = _term_id AND member_section_id = _section_id
+    ON CONFLICT (section_id, term_id) DO UPDATE SET generation = EXCLUDED.generation;
+
+    DELETE FROM course_documents
+    WHERE term_id = _term_id
+        AND (
+            section_id = _section_id
+            OR section_id IN (
+                SELECT principal_section_id FROM cross_listing_members
+                WHERE term_id = _term_id AND member_section_id = _section_id
+            )
+        );
+$$ LANGUAGE SQL;
+
+CREATE OR REPLACE FUNCTION delete_all_course_documents() RETURNS VOID AS $$
+    UPDATE course_document_generations SET generation = nextval('course_document_generations_seq')
+    WHERE term_id = 0 AND section_id = 0;
+
+    DELETE FROM course_documents;
+$$ LANGUAGE SQL;
+
+CREATE OR REPLACE FUNCTION invalidate_course_documents() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM delete_course_documents(OLD.term_id, OLD.section_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM delete_course_documents(NEW.term_id, NEW.section_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION invalidate_all_course_documents() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM delete_all_course_documents();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER approvals_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON approvals
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER canvas_course_sites_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON canvas_course_sites
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER course_preferences_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON course_preferences
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER cross_listings_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON cross_listings
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+-- Delivery bookkeeping of queued emails (attempts, leases) does not affect course documents. A dead letter does: its
+-- invitation was never sent.
+CREATE TRIGGER queued_emails_course_documents_trigger AFTER INSERT OR UPDATE OF dead_lettered_at, section_id, template_type, term_id OR DELETE ON queued_emails
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER scheduled_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON scheduled
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER sent_emails_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON sent_emails
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+CREATE TRIGGER sis_sections_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON sis_sections
+    FOR EACH ROW EXECUTE PROCEDURE invalidate_course_documents();
+
+-- Room eligibility and instructor profiles are shared by many courses.
+CREATE TRIGGER instructors_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON instructors
+    FOR EACH STATEMENT EXECUTE PROCEDURE invalidate_all_course_documents();
+CREATE TRIGGER rooms_course_documents_trigger AFTER INSERT OR UPDATE OR DELETE ON rooms
+    FOR EACH STATEMENT EXECUTE PROCEDURE invalidate_all_course_documents();
+
+--
@@ -22,6 +22,10 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+import json
+
+from diablo import cache
+from diablo.models.course_document import CourseDocument
 from flask import current_app as app
 import pytest
 from tests.util import override_config
@@ -72,6 +76,99 @@ class TestCacheClear:
         assert self._api_clear_cache(client) is True
 
 
+class TestCacheStats:
+
+    @staticmethod
+    def _api_cache_stats(client, expected_status_code=200):
+        response = client.get('/api/cache/stats')
+        assert response.status_code == expected_status_code
+        return response.json
+
+    def test_anonymous(self, client):
+        """Deny anonymous access."""
+        self._api_cache_stats(client, expected_status_code=401)
+
+    def test_unauthorized(self, client, instructor_session):
+        """Deny access if user is not an admin."""
+        self._api_cache_stats(client, expected_status_code=401)
+
+    def test_authorized(self, client, admin_session):
+        """Admin user gets CalNet cache hits and misses."""
+        api_json = self._api_cache_stats(client)
+        assert api_json['calnet']['hits'] >= 0
+        assert api_json['calnet']['misses'] >= 0
+
+    def test_key_families(self, client, admin_session):
+        """Stats and key counts are per key family."""
+        cache.set('calnet/user_for_uid_99990001', {'uid': '99990001'})
+        cache.get('calnet/user_for_uid_99990001')
+        cache.get('calnet/user_for_uid_99999999')
+        cache.set('kaltura/test_resources', [])
+        key_families = self._api_cache_stats(client)['keyFamilies']
+        calnet_stats = key_families['calnet/user_for_uid_*']
+        assert calnet_stats['hits'] > 0
+        assert calnet_stats['misses'] > 0
+        assert calnet_stats['bytes'] > 0
+        assert calnet_stats['keyCount'] > 0
+        assert 'evictions' in calnet_stats
+        assert key_families['kaltura/test_resources']['keyCount'] == 1
+
+
+class TestCacheInvalidate:
+
+    @staticmethod
+    def _api_invalidate_cache(client, params, expected_status_code=200):
+        response = client.post(
+            '/api/cache/invalidate',
+            data=json.dumps(params),
+            content_type='application/json',
+        )
+        assert response.status_code == expected_status_code
+        return response.json
+
+    def test_anonymous(self, client):
+        """Deny anonymous access."""
+        self._api_invalidate_cache(client, {'pattern': '*'}, expected_status_code=401)
+
+    def test_unauthorized(self, client, instructor_session):
+        """Deny access if user is not an admin."""
+        self._api_invalidate_cache(client, {'pattern': '*'}, expected_status_code=401)
+
+    def test_missing_parameters(self, client, admin_session):
+        """Pattern, sectionId or uid is required."""
+        self._api_invalidate_cache(client, {}, expected_status_code=400)
+
+    def test_invalidate_pattern(self, client, admin_session):
+        """Keys matching the pattern are deleted."""
+        cache.set('calnet/user_for_uid_99990001', {'uid': '99990001'})
+        cache.set('calnet/user_for_uid_99990002', {'uid': '99990002'})
+        cache.set('kaltura/test_resources', [])
+        api_json = self._api_invalidate_cache(client, {'pattern': 'calnet/user_for_uid_9999000*'})
+        assert {'calnet/user_for_uid_99990001', 'calnet/user_for_uid_99990002'} <= set(api_json['deletedKeys'])
+        assert cache.get('calnet/user_for_uid_99990001') is None
+        assert cache.get('kaltura/test_resources') == []
+
+    def test_invalidate_uid(self, client, admin_session):
+        """The CalNet profile of the uid is deleted."""
+        cache.set('calnet/user_for_uid_99990001', {'uid': '99990001'})
+        cache.set('calnet/user_for_uid_99990002', {'uid': '99990002'})
+        api_json = self._api_invalidate_cache(client, {'uid': '99990001'})
+        assert api_json['deletedKeys'] == ['calnet/user_for_uid_99990001']
+        assert cache.get('calnet/user_for_uid_99990002')
+
+    def test_invalidate_section(self, client, admin_session):
+        """Course document of the section is deleted."""
+        term_id = app.config['CURRENT_TERM_ID']
+        CourseDocument.upsert(
+            [{'courseName': 'MATH 1A', 'sectionId': 50000}],
+            generations=CourseDocument.get_generations(section_ids=[50000], term_id=term_id),
+            term_id=term_id,
+        )
+        assert CourseDocument.get_section_ids([50000], term_id=term_id) == {50000}
+        self._api_invalidate_cache(client, {'sectionId': 50000, 'termId': term_id})
+        assert CourseDocument.get_section_ids([50000], term_id=term_id) == set()
+
+
 class TestConfigController:
 
     def test_anonymous(self, client):
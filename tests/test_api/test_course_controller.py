@@ -31,6 +31,7 @@ from diablo import db, std_commit
 from diablo.jobs.canvas_job import CanvasJob
 from diablo.jobs.tasks.queued_emails_task import QueuedEmailsTask
 from diablo.lib.berkeley import get_recording_end_date, get_recording_start_date
+from diablo.models import sis_section
 from diablo.models.approval import Approval
 from diablo.models.course_preference import CoursePreference
 from diablo.models.room import Room
@@ -492,6 +493,27 @@ class TestGetCourses:
         assert response.status_code == expected_status_code
         return response.json
 
+    def _api_courses_paginated(self, client, sort_by, sort_desc=False):
+        courses = []
+        cursor = None
+        while True:
+            response = client.post(
+                '/api/courses',
+                data=json.dumps({
+                    'cursor': cursor,
+                    'filter': 'All',
+                    'sortBy': sort_by,
+                    'sortDesc': sort_desc,
+                    'termId': self.term_id,
+                }),
+                content_type='application/json',
+            )
+            assert response.status_code == 200
+            courses += response.json['courses']
+            cursor = response.json['nextCursor']
+            if not cursor:
+                return courses
+
     def test_not_authenticated(self, client):
         """Deny anonymous access."""
         self._api_courses(client, term_id=self.term_id, expected_status_code=401)
@@ -700,6 +722,165 @@ class TestGetCourses:
                 assert _find_course(api_json=api_json, section_id=section_id, term_id=self.term_id)
             assert not _find_course(api_json=api_json, section_id=section_in_ineligible_room, term_id=self.term_id)
 
+    def test_paginated(self, client, fake_auth):
+        """Cursor-based pagination walks the feed in order, one page at a time."""
+        fake_auth.login(admin_uid)
+        all_courses = self._api_courses(client, term_id=self.term_id, filter_='All')
+        courses = []
+        cursor = None
+        with override_config(app, 'SEARCH_ITEMS_PER_PAGE', 4):
+            while True:
+                response = client.post(
+                    '/api/courses',
+                    data=json.dumps({'cursor': cursor, 'filter': 'All', 'termId': self.term_id}),
+                    content_type='application/json',
+                )
+                assert response.status_code == 200
+                assert len(response.json['courses']) <= 4
+                courses += response.json['courses']
+                cursor = response.json['nextCursor']
+                if not cursor:
+                    break
+        assert [c['sectionId'] for c in courses] == [c['sectionId'] for c in all_courses]
+
+    def test_paginated_sort(self, client, fake_auth):
+        """Pages are sorted in SQL, per whitelisted sort key, in either direction."""
+        fake_auth.login(admin_uid)
+        all_courses = self._api_courses(client, term_id=self.term_id, filter_='All')
+        with override_config(app, 'SEARCH_ITEMS_PER_PAGE', 4):
+            courses = self._api_courses_paginated(client, sort_by='sectionId', sort_desc=True)
+            assert [c['sectionId'] for c in courses] == sorted([c['sectionId'] for c in all_courses], reverse=True)
+
+            courses = self._api_courses_paginated(client, sort_by='location')
+            assert sorted(c['sectionId'] for c in courses) == sorted(c['sectionId'] for c in all_courses)
+            locations = [min(m['location'] for m in c['meetings']['eligible'] + c['meetings']['ineligible']) for c in courses]
+            assert locations == sorted(locations)
+
+    def test_invalid_sort(self, client, fake_auth):
+        """Reject a sort key that is not whitelisted, and a cursor of another sort order."""
+        fake_auth.login(admin_uid)
+        for params in [{'sortBy': 's.course_title'}, {'sortBy': 'courseName', 'sortDesc': 'true'}]:
+            response = client.post(
+                '/api/courses',
+                data=json.dumps({'cursor': None, 'filter': 'All', 'termId': self.term_id, **params}),
+                content_type='application/json',
+            )
+            assert response.status_code == 400
+        with override_config(app, 'SEARCH_ITEMS_PER_PAGE', 4):
+            response = client.post(
+                '/api/courses',
+                data=json.dumps({'cursor': None, 'filter': 'All', 'sortBy': 'sectionId', 'termId': self.term_id}),
+                content_type='application/json',
+            )
+            cursor = response.json['nextCursor']
+            assert cursor
+            response = client.post(
+                '/api/courses',
+                data=json.dumps({'cursor': cursor, 'filter': 'All', 'sortBy': 'courseName', 'termId': self.term_id}),
+                content_type='application/json',
+            )
+            assert response.status_code == 400
+
+    def test_invalid_cursor(self, client, fake_auth):
+        """Reject a malformed cursor."""
+        fake_auth.login(admin_uid)
+        response = client.post(
+            '/api/courses',
+            data=json.dumps({'cursor': 'not-a-cursor', 'filter': 'All', 'termId': self.term_id}),
+            content_type='application/json',
+        )
+        assert response.status_code == 400
+
+    def test_search(self, client, fake_auth):
+        """Search is applied in SQL, by course name and section id."""
+        fake_auth.login(admin_uid)
+        course = SisSection.get_course(section_id=section_1_id, term_id=self.term_id)
+        response = client.post(
+            '/api/courses',
+            data=json.dumps({'filter': 'All', 'search': str(section_1_id), 'termId': self.term_id}),
+            content_type='application/json',
+        )
+        assert response.status_code == 200
+        assert [c['sectionId'] for c in response.json] == [section_1_id]
+        response = client.post(
+            '/api/courses',
+            data=json.dumps({'filter': 'All', 'search': course['courseName'].lower(), 'termId': self.term_id}),
+            content_type='application/json',
+        )
+        assert section_1_id in [c['sectionId'] for c in response.json]
+
+
+class TestGetCourseCounts:
+
+    @property
+    def term_id(self):
+        return app.config['CURRENT_TERM_ID']
+
+    @staticmethod
+    def _api_course_counts(client, term_id, expected_status_code=200):
+        response = client.get(f'/api/courses/counts/{term_id}')
+        assert response.status_code == expected_status_code
+        return response.json
+
+    def test_not_authenticated(self, client):
+        """Deny anonymous access."""
+        self._api_course_counts(client, term_id=self.term_id, expected_status_code=401)
+
+    def test_not_authorized(self, client, fake_auth):
+        """Deny access to instructors."""
+        instructor_uids = get_instructor_uids(section_id=section_1_id, term_id=self.term_id)
+        fake_auth.login(instructor_uids[0])
+        self._api_course_counts(client, term_id=self.term_id, expected_status_code=401)
+
+    def test_counts_per_filter(self, client, fake_auth):
+        """Filter counts match the size of each filtered feed."""
+        fake_auth.login(admin_uid)
+        with test_approvals_workflow(app):
+            _send_invitation_email(section_id=section_4_id, term_id=self.term_id)
+            _create_approval(section_id=section_5_id, term_id=self.term_id)
+            CoursePreference.update_opt_out(section_id=section_1_id, term_id=self.term_id, opt_out=True)
+            mock_scheduled(section_id=section_3_id, term_id=self.term_id)
+            std_commit(allow_test_environment=True)
+
+            counts = self._api_course_counts(client, term_id=self.term_id)
+            for filter_, count in counts['filters'].items():
+                courses = TestGetCourses._api_courses(client, term_id=self.term_id, filter_=filter_)
+                assert count == len(courses), filter_
+            assert counts['filters']['Invited'] > 0
+            assert counts['filters']['Do Not Email'] > 0
+
+    def test_counts_per_status(self, client, fake_auth):
+        """Status counts agree with approvalStatus and schedulingStatus of the course feed."""
+        fake_auth.login(admin_uid)
+        with test_approvals_workflow(app):
+            _send_invitation_email(section_id=section_4_id, term_id=self.term_id)
+            _create_approval(section_id=section_5_id, term_id=self.term_id)
+            mock_scheduled(section_id=section_3_id, term_id=self.term_id)
+            std_commit(allow_test_environment=True)
+
+            counts = self._api_course_counts(client, term_id=self.term_id)
+            courses = TestGetCourses._api_courses(client, term_id=self.term_id, filter_='All')
+            for key in ('approvalStatus', 'schedulingStatus'):
+                expected = {}
+                for course in courses:
+                    expected[course[key]] = expected.get(course[key], 0) + 1
+                assert counts[key] == expected
+
+    def test_single_pass(self, client, fake_auth, monkeypatch):
+        """Filter and status counts come from one evaluation of the course statuses query."""
+        fake_auth.login(admin_uid)
+        calls = []
+        course_statuses_sql = sis_section._course_statuses_sql
+
+        def _course_statuses_sql(*args, **kwargs):
+            calls.append(args)
+            return course_statuses_sql(*args, **kwargs)
+
+        monkeypatch.setattr(sis_section, '_course_statuses_sql', _course_statuses_sql)
+        counts = self._api_course_counts(client, term_id=self.term_id)
+        assert len(calls) == 1
+        assert counts['filters']['All'] == sum(counts['approvalStatus'].values()) == sum(counts['schedulingStatus'].values())
+
 
 class TestDownloadCoursesCsv:
 
@@ -768,6 +949,20 @@ class TestDownloadCoursesCsv:
                 else:
                     assert meeting_type == 'A'
 
+    def test_download_ndjson(self, client, fake_auth):
+        """Admin users can download courses as newline-delimited JSON."""
+        fake_auth.login(admin_uid)
+        term_id = app.config['CURRENT_TERM_ID']
+        response = client.post(
+            '/api/courses/csv',
+            data=json.dumps({'filter': 'All', 'format': 'ndjson', 'termId': term_id}),
+            content_type='application/json',
+        )
+        assert response.status_code == 200
+        assert response.content_type == 'application/x-ndjson'
+        courses = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        assert [c['sectionId'] for c in courses] == [c['sectionId'] for c in SisSection.get_courses(term_id)]
+
 
 class TestCoursesChanges:
 
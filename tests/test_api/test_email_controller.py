@@ -255,3 +255,30 @@ class TestGetEmailTemplateCodes:
     def test_authorized(self, client, admin_session):
         """Admin user can get template codes."""
         self._api_email_template_codes(client)
+
+
+class TestGetEmailQueueStats:
+    """Only Admin users can get email queue stats."""
+
+    @staticmethod
+    def _api_email_queue_stats(client, expected_status_code=200):
+        response = client.get('/api/emails/queue/stats')
+        assert response.status_code == expected_status_code
+        return response.json
+
+    def test_anonymous(self, client):
+        """Denies anonymous access."""
+        self._api_email_queue_stats(client, expected_status_code=401)
+
+    def test_unauthorized(self, client, instructor_session):
+        """Denies access if user is not an admin."""
+        self._api_email_queue_stats(client, expected_status_code=401)
+
+    def test_authorized(self, client, admin_session):
+        """Admin user can get queue depth and the drain rate of the last dispatch."""
+        stats = self._api_email_queue_stats(client)
+        assert stats['deadLettered'] >= 0
+        assert stats['deferred'] >= 0
+        assert stats['due'] >= 0
+        assert 'lastDrain' in stats
+        assert 'oldestCreatedAt' in stats
@@ -0,0 +1,77 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+import time
+
+from diablo.externals.b_connected import BConnected
+from tests.util import override_config, smtp_stand_in
+
+
+class TestBConnected:
+
+    def test_session(self, app):
+        """All messages of a session are sent over one connection, with one login."""
+        with smtp_stand_in(app) as stand_in, override_config(app, 'BCOP_SMTP_MESSAGES_PER_SECOND', None):
+            with BConnected().session() as b_connected:
+                for index in range(5):
+                    assert _send(b_connected, index)
+            assert stand_in.connection_count == stand_in.login_count == 1
+            assert len(stand_in.messages) == 5
+            assert stand_in.messages[-1]['to'] == app.config['EMAIL_REDIRECT_WHEN_TESTING']
+            assert 'Message 4' in stand_in.messages[-1]['data']
+
+            # Outside of a session, each send has its own connection.
+            b_connected = BConnected()
+            for index in range(2):
+                assert _send(b_connected, index)
+            assert stand_in.connection_count == stand_in.login_count == 3
+
+    def test_reconnect(self, app):
+        """If the server drops the connection then reconnect and send."""
+        with smtp_stand_in(app, max_messages_per_connection=2) as stand_in, override_config(app, 'BCOP_SMTP_MESSAGES_PER_SECOND', None):
+            with BConnected().session() as b_connected:
+                for index in range(5):
+                    assert _send(b_connected, index)
+            assert len(stand_in.messages) == 5
+            assert stand_in.connection_count == 3
+
+    def test_throttle(self, app):
+        """Messages are sent no faster than BCOP_SMTP_MESSAGES_PER_SECOND."""
+        with smtp_stand_in(app) as stand_in, override_config(app, 'BCOP_SMTP_MESSAGES_PER_SECOND', 20):
+            started_at = time.monotonic()
+            with BConnected().session() as b_connected:
+                for index in range(5):
+                    assert _send(b_connected, index)
+            assert time.monotonic() - started_at >= 0.2
+            assert len(stand_in.messages) == 5
+
+
+def _send(b_connected, index):
+    return b_connected.send(
+        message=f'Message {index}',
+        recipient={'email': 'wpblatty@berkeley.edu', 'name': 'William Peter Blatty', 'uid': '10001'},
+        section_id=50000,
+        subject_line=f'Message {index}',
+        template_type='notify_instructor_of_changes',
+    )
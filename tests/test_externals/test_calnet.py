@@ -0,0 +1,113 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+import time
+
+from diablo.externals import calnet
+from flask import current_app
+from ldap3.core.exceptions import LDAPCommunicationError
+from tests.util import ldap_stand_in, override_config
+
+
+class TestSearchUids:
+
+    def test_search_uids(self, app, monkeypatch):
+        """Attributes of SCHEMA_DICT are returned per uid, across batches."""
+        monkeypatch.setattr(calnet, 'BATCH_QUERY_MAXIMUM', 10)
+        users = [_user(uid) for uid in range(60)]
+        with ldap_stand_in(app, users) as calnet_client:
+            uids = [str(uid) for uid in range(0, len(users), 2)] + ['not_in_ldap']
+            results = calnet_client.search_uids(uids)
+        assert len(results) == len(users) / 2
+        assert set(result['uid'] for result in results) == set(uids[:-1])
+        assert next(result for result in results if result['uid'] == '42') == {
+            'dept_code': 'QHUIS',
+            'email': '42@berkeley.edu',
+            'expired': False,
+            'first_name': 'Given 42',
+            'last_name': 'Surname',
+            'primary_dept_code': 'HUISH',
+            'uid': '42',
+        }
+
+    def test_search_expired(self, app):
+        """Expired people are found only when search_expired is true."""
+        users = [_user(uid) for uid in range(3)] + [{**_user(3), 'expired': True}]
+        with ldap_stand_in(app, users) as calnet_client:
+            assert [result['uid'] for result in calnet_client.search_uids(['2', '3'])] == ['2']
+            assert [result['uid'] for result in calnet_client.search_uids(['2', '3'], search_expired=True)] == ['3']
+
+    def test_pooled_connections(self, app, monkeypatch):
+        """Connections are reused, and no more than LDAP_POOL_SIZE are opened."""
+        monkeypatch.setattr(calnet, 'BATCH_QUERY_MAXIMUM', 10)
+        users = [_user(uid) for uid in range(80)]
+        with override_config(app, 'LDAP_POOL_SIZE', 2):
+            with ldap_stand_in(app, users) as calnet_client:
+                connect = calnet_client.connect
+                connections = []
+
+                def _connect():
+                    connections.append(connect())
+                    return connections[-1]
+                calnet_client.pool._connect = _connect
+
+                uids = [str(uid) for uid in range(len(users))]
+                for _ in range(3):
+                    started_at = time.perf_counter()
+                    assert len(calnet_client.search_uids(uids)) == len(users)
+                    app.logger.info(f'{len(uids)} uids searched in {time.perf_counter() - started_at:.3f}s')
+                assert 0 < len(connections) <= 2
+
+    def test_retry_dropped_connections(self, app, monkeypatch):
+        """When pooled connections were dropped, batches are retried with new connections, in worker threads too."""
+        monkeypatch.setattr(calnet, 'BATCH_QUERY_MAXIMUM', 10)
+        users = [_user(uid) for uid in range(40)]
+        uids = [str(uid) for uid in range(len(users))]
+        with override_config(app, 'LDAP_POOL_SIZE', 2):
+            # The client gets the current_app proxy, as in production.
+            with ldap_stand_in(current_app, users) as calnet_client:
+                assert len(calnet_client.search_uids(uids)) == len(users)
+                dropped = list(calnet_client.pool._idle.queue)
+                assert dropped
+
+                def _drop(conn):
+                    def _fail(*args, **kwargs):
+                        raise LDAPCommunicationError('Connection dropped by server')
+                    conn.search = _fail
+                    conn.unbind = _fail
+                for conn in dropped:
+                    _drop(conn)
+                assert len(calnet_client.search_uids(uids)) == len(users)
+                assert not set(calnet_client.pool._idle.queue) & set(dropped)
+
+
+def _user(uid):
+    return {
+        'dept_code': 'QHUIS',
+        'email': f'{uid}@berkeley.edu',
+        'first_name': f'Given {uid}',
+        'last_name': 'Surname',
+        'primary_dept_code': 'HUISH',
+        'uid': str(uid),
+    }
@@ -0,0 +1,304 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from threading import Lock
+import time
+
+from diablo.externals.kaltura import _events_to_api_json, _get_kaltura_objects, get_kaltura_sessions, Kaltura, KalturaBatch
+from KalturaClient.exceptions import KalturaClientException, KalturaException
+from KalturaClient.Plugins.Schedule import KalturaRecordScheduleEvent, KalturaScheduleEventRecurrenceType, KalturaScheduleResourceFilter
+import pytest
+from tests.util import kaltura_error, kaltura_list_response, kaltura_stand_in, override_config
+
+
+class TestKalturaBatch:
+
+    def test_flush_per_batch_size(self, app):
+        """Queued calls are sent as multirequests of no more than batch_size calls."""
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            batch = KalturaBatch(client=stand_in.client(), batch_size=2)
+            results = [batch.add(lambda client, id_=id_: client.baseEntry.get(entryId=id_)) for id_ in ['0_a', '0_b', '0_c']]
+            assert stand_in.round_trips == 1
+            assert [r.is_resolved for r in results] == [True, True, False]
+            batch.flush()
+        assert stand_in.round_trips == batch.round_trips == 2
+        assert [len(calls) for calls in stand_in.calls_per_request] == [2, 1]
+        assert [r.value.name for r in results] == ['Entry 0_a', 'Entry 0_b', 'Entry 0_c']
+
+    def test_error_per_call(self, app):
+        """A failed call does not spoil the other calls of the multirequest."""
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            client = stand_in.client()
+            batch = KalturaBatch(client=client, batch_size=10)
+            found = batch.add(lambda c: c.baseEntry.get(entryId='0_a'))
+            not_found = batch.add(lambda c: c.baseEntry.get(entryId='not_found'))
+            batch.flush()
+            assert found.value.id == '0_a' and found.error is None
+            assert not_found.value is None
+            assert isinstance(not_found.error, KalturaException)
+            assert not_found.error.code == 'ENTRY_ID_NOT_FOUND'
+            # The client is no longer in multirequest mode.
+            assert client.isMultiRequest() is False
+            assert client.baseEntry.get(entryId='0_b').name == 'Entry 0_b'
+
+    def test_bulk_get(self, app):
+        """Kaltura objects of many ids are fetched in few round trips."""
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            with override_config(app, 'KALTURA_BATCH_SIZE', 5):
+                kaltura = Kaltura()
+                entry_ids = [f'0_{index}' for index in range(12)] + ['not_found']
+                round_trips = stand_in.round_trips
+                base_entries_per_id = kaltura.get_base_entries_per_id(entry_ids)
+                assert stand_in.round_trips - round_trips == 3
+                assert len(base_entries_per_id) == 12
+                assert base_entries_per_id['0_7']['entitledUsersEdit'] == '10001'
+
+                round_trips = stand_in.round_trips
+                categories_per_entry_id = kaltura.get_categories_per_entry_id(entry_ids[0:3])
+                assert stand_in.round_trips - round_trips == 2
+                assert [c['name'] for c in categories_per_entry_id['0_1']] == ['Course Capture', '101']
+
+
+class TestGetKalturaObjects:
+
+    def test_concurrent_pages(self, app):
+        """Pages beyond the first are fetched concurrently, by no more than KALTURA_PAGE_FETCH_THREADS threads, in order."""
+        resources = _ResourcePages(total_count=23)
+        with kaltura_stand_in(app, resources.handle_call) as stand_in:
+            with override_config(app, 'KALTURA_PAGE_SIZE', 5), override_config(app, 'KALTURA_PAGE_FETCH_THREADS', 2):
+                objects = _get_kaltura_objects(stand_in.client(), _list_schedule_resources)
+        assert [o.id for o in objects] == list(range(1, 24))
+        assert sorted(resources.page_indexes) == [1, 2, 3, 4, 5]
+        assert resources.max_concurrent_requests == 2
+
+    def test_transient_failure(self, app):
+        """A page fetch that fails on a network or parsing error is retried."""
+        resources = _ResourcePages(total_count=12, failures_per_page={2: 1, 3: 2})
+        with kaltura_stand_in(app, resources.handle_call) as stand_in:
+            with override_config(app, 'KALTURA_PAGE_SIZE', 5):
+                objects = _get_kaltura_objects(stand_in.client(), _list_schedule_resources)
+        assert [o.id for o in objects] == list(range(1, 13))
+        assert sorted(resources.page_indexes) == [1, 2, 2, 3, 3, 3]
+
+        resources = _ResourcePages(total_count=12, failures_per_page={3: 3})
+        with kaltura_stand_in(app, resources.handle_call) as stand_in:
+            with override_config(app, 'KALTURA_PAGE_SIZE', 5), pytest.raises(KalturaClientException):
+                _get_kaltura_objects(stand_in.client(), _list_schedule_resources)
+
+    def test_max_page_size(self, app):
+        """Page size is capped at Kaltura's maximum."""
+        resources = _ResourcePages(total_count=501)
+        with kaltura_stand_in(app, resources.handle_call) as stand_in:
+            with override_config(app, 'KALTURA_PAGE_SIZE', 1000):
+                assert len(_get_kaltura_objects(stand_in.client(), _list_schedule_resources)) == 501
+        assert sorted(resources.page_indexes) == [1, 2]
+
+
+class TestKalturaSessions:
+
+    def test_session_reuse(self, app):
+        """Kaltura instances share the KS and, per thread, a keep-alive client."""
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            for _ in range(3):
+                assert Kaltura().get_base_entry('0_a')['id'] == '0_a'
+        assert stand_in.session_count == 1
+        # Two calls to start the session, then one call per Kaltura instance.
+        assert stand_in.round_trips == 5
+        assert len(set(stand_in.client_addresses[2:])) == 1
+
+    def test_refresh(self, app):
+        """The KS is refreshed in the background shortly before it expires, and in the foreground if it has expired."""
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            with override_config(app, 'KALTURA_EXPIRY', 2), override_config(app, 'KALTURA_SESSION_REFRESH_MARGIN', 1):
+                kaltura = Kaltura()
+                assert kaltura.client.getKs() == 'admin_ks_1'
+                # Past the refresh margin, Kaltura instances get the current KS while a new one is started.
+                time.sleep(1.1)
+                assert Kaltura().client.getKs() in ['admin_ks_1', 'admin_ks_2']
+                _wait_for(lambda: kaltura.client.getKs() == 'admin_ks_2')
+                assert stand_in.session_count == 2
+                # Once expired, the KS is refreshed before it is handed out.
+                time.sleep(2.1)
+                assert Kaltura().client.getKs() == 'admin_ks_3'
+
+    def test_pooled_clients(self, app):
+        """Concurrent page fetches borrow pooled clients of the shared session."""
+        resources = _ResourcePages(total_count=35)
+        with kaltura_stand_in(app, resources.handle_call) as stand_in:
+            with override_config(app, 'KALTURA_PAGE_SIZE', 5), override_config(app, 'KALTURA_PAGE_FETCH_THREADS', 3):
+                for _ in range(2):
+                    objects = _get_kaltura_objects(Kaltura().client, _list_schedule_resources)
+                    assert [o.id for o in objects] == list(range(1, 36))
+                assert get_kaltura_sessions()._idle_clients.qsize() <= 3
+        assert stand_in.session_count == 1
+        assert len(set(stand_in.client_addresses[2:])) <= 4
+
+
+class TestCategoriesPerFullName:
+
+    def test_bulk_lookup(self, app):
+        """Categories of many Canvas sites are listed with fullNameIn filters, and cached, including those not found."""
+        site_ids = [f'{time.time_ns()}{index}' for index in range(300)]
+        full_names_requested = []
+
+        def _handle_call(service, action, params):
+            assert (service, action) == ('category', 'list')
+            full_names = params['filter']['fullNameIn'].split(',')
+            full_names_requested.extend(full_names)
+            # Sites with odd ids have no category in Kaltura.
+            categories = [_category(index, name) for index, name in enumerate(full_names) if int(name[-1]) % 2 == 0]
+            return kaltura_list_response('KalturaCategoryListResponse', categories)
+
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            kaltura = Kaltura()
+            categories_per_site_id = kaltura.get_canvas_category_objects_per_site_id(site_ids)
+            assert stand_in.round_trips == 2 + 2
+            assert len(full_names_requested) == 300
+            assert sorted(categories_per_site_id) == sorted(id_ for id_ in site_ids if int(id_[-1]) % 2 == 0)
+            assert categories_per_site_id[site_ids[2]]['name'] == site_ids[2]
+
+            # Cached categories, and names not found, are not listed again.
+            round_trips = stand_in.round_trips
+            assert kaltura.get_canvas_category_objects_per_site_id(site_ids) == categories_per_site_id
+            assert kaltura.get_canvas_category_object(site_ids[1]) is None
+            assert kaltura.get_canvas_category_object(site_ids[4]) == categories_per_site_id[site_ids[4]]
+            assert stand_in.round_trips == round_trips
+
+            new_site_id = f'{time.time_ns()}0'
+            assert kaltura.get_canvas_category_objects_per_site_id(site_ids[0:10] + [new_site_id])[new_site_id]['name'] == new_site_id
+            assert stand_in.round_trips == round_trips + 1
+            assert full_names_requested[-1] == f'Canvas>site>channels>{new_site_id}'
+
+
+class TestEventsToApiJson:
+
+    def test_recurrences_per_series(self):
+        """Recurrences are grouped under their series; orphans and other events follow the series."""
+        events = [
+            _event(11, parent_id=1, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRENCE),
+            _event(1, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRING),
+            _event(41, recurrence_type=KalturaScheduleEventRecurrenceType.NONE),
+            _event(31, parent_id=3, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRENCE),
+            _event(21, parent_id=2, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRENCE),
+            _event(2, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRING),
+            _event(12, parent_id=1, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRENCE),
+        ]
+        api_json = _events_to_api_json(events, fields=['tags'])
+        assert [e['id'] for e in api_json] == [1, 2, 41, 31]
+        assert [r['id'] for r in api_json[0]['recurrences']] == [11, 12]
+        assert [r['id'] for r in api_json[1]['recurrences']] == [21]
+        assert set(api_json[2].keys()) == {'id', 'parentId', 'recurrenceType', 'tags'}
+        assert api_json[2]['tags'] == 'rtl_course_capture'
+
+    def test_many_recurrences(self):
+        """Grouping thousands of recurrences is a single pass."""
+        events = []
+        for series_id in range(1, 501):
+            events.append(_event(series_id, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRING))
+            for index in range(20):
+                events.append(_event(series_id * 1000 + index, parent_id=series_id, recurrence_type=KalturaScheduleEventRecurrenceType.RECURRENCE))
+        started_at = time.perf_counter()
+        api_json = _events_to_api_json(events, fields=['id'])
+        assert time.perf_counter() - started_at < 2
+        assert len(api_json) == 500
+        assert all(len(series['recurrences']) == 20 for series in api_json)
+
+
+class _ResourcePages:
+
+    def __init__(self, total_count, failures_per_page=None):
+        self.failures_per_page = failures_per_page or {}
+        self.max_concurrent_requests = 0
+        self.page_indexes = []
+        self.total_count = total_count
+        self._concurrent_requests = 0
+        self._lock = Lock()
+
+    def handle_call(self, service, action, params):
+        page_index = int(params['pager']['pageIndex'])
+        page_size = min(int(params['pager']['pageSize']), 500)
+        with self._lock:
+            self.page_indexes.append(page_index)
+            self._concurrent_requests += 1
+            self.max_concurrent_requests = max(self.max_concurrent_requests, self._concurrent_requests)
+        try:
+            time.sleep(0.05)
+            if self.failures_per_page.get(page_index):
+                self.failures_per_page[page_index] -= 1
+                raise RuntimeError(f'Page {page_index} is unavailable')
+            start = (page_index - 1) * page_size
+            resources = [
+                {'objectType': 'KalturaLocationScheduleResource', 'id': id_, 'name': f'Room {id_}'}
+                for id_ in range(start + 1, min(start + page_size, self.total_count) + 1)
+            ]
+            return kaltura_list_response('KalturaScheduleResourceListResponse', resources, total_count=self.total_count)
+        finally:
+            with self._lock:
+                self._concurrent_requests -= 1
+
+
+def _category(category_id, full_name):
+    return {'objectType': 'KalturaCategory', 'fullName': full_name, 'id': category_id, 'name': full_name.split('>')[-1]}
+
+
+def _event(event_id, recurrence_type, parent_id=None):
+    recurrence_type = KalturaScheduleEventRecurrenceType(recurrence_type)
+    return KalturaRecordScheduleEvent(id=event_id, parentId=parent_id, recurrenceType=recurrence_type, tags='rtl_course_capture')
+
+
+def _wait_for(condition, timeout=3):
+    started_at = time.monotonic()
+    while not condition():
+        assert time.monotonic() - started_at < timeout
+        time.sleep(0.05)
+
+
+def _list_schedule_resources(client, pager):
+    return client.schedule.scheduleResource.list(filter=KalturaScheduleResourceFilter(), pager=pager)
+
+
+def _handle_call(service, action, params):
+    if (service, action) == ('baseentry', 'get'):
+        entry_id = params['entryId']
+        if entry_id == 'not_found':
+            return kaltura_error('ENTRY_ID_NOT_FOUND', f'Entry id "{entry_id}" not found')
+        return {
+            'objectType': 'KalturaMediaEntry',
+            'entitledUsersEdit': '10001',
+            'entitledUsersPublish': '10001',
+            'id': entry_id,
+            'name': f'Entry {entry_id}',
+        }
+    if (service, action) == ('categoryentry', 'list'):
+        index = int(params['filter']['entryIdEqual'].split('_')[-1])
+        return kaltura_list_response('KalturaCategoryEntryListResponse', [
+            {'objectType': 'KalturaCategoryEntry', 'categoryId': 1, 'status': 2},
+            {'objectType': 'KalturaCategoryEntry', 'categoryId': 100 + index, 'status': 2},
+        ])
+    if (service, action) == ('category', 'list'):
+        category_ids = [int(id_) for id_ in params['filter']['idIn'].split(',')]
+        return kaltura_list_response('KalturaCategoryListResponse', [
+            _category(id_, 'Course Capture' if id_ == 1 else f'Canvas>site>channels>{id_}') for id_ in category_ids
+        ])
+    raise ValueError(f'Unexpected Kaltura call: {service}.{action}')
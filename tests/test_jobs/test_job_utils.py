@@ -24,7 +24,9 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 import csv
 
+from diablo import db
 from diablo.jobs.util import register_cross_listings
+from sqlalchemy import text
 
 
 class TestIdentifyCrossListings:
@@ -43,3 +45,19 @@ class TestIdentifyCrossListings:
             assert cross_listings[32712] == [32713, 32943, 32945]
             for non_cross_listed in [28135, 31049]:
                 assert non_cross_listed not in cross_listings
+
+    def test_cross_listing_members(self, app):
+        """Registered cross-listings are normalized into one cross_listing_members row per cross-listed section."""
+        term_id = app.config['CURRENT_TERM_ID']
+        rows = []
+        with open(f"{app.config['FIXTURES_PATH']}/sis/class_schedule_by_section_id.csv", 'r') as csv_file:
+            for row in csv.DictReader(csv_file):
+                rows.append({
+                    'section_id': int(row['section_id']),
+                    'schedule': row['schedule'],
+                })
+        cross_listings = register_cross_listings(rows, term_id)
+        sql = 'SELECT principal_section_id, member_section_id FROM cross_listing_members WHERE term_id = :term_id'
+        members = set((row['principal_section_id'], row['member_section_id']) for row in db.session.execute(text(sql), {'term_id': term_id}))
+        assert members == set((section_id, member_id) for section_id, member_ids in cross_listings.items() for member_id in member_ids)
+        assert (32712, 32943) in members
@@ -22,8 +22,8 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
-from diablo import std_commit
-from diablo.jobs.kaltura_job import KalturaJob
+from diablo import cache, std_commit
+from diablo.jobs.kaltura_job import _update_already_scheduled_events, KalturaJob
 from diablo.jobs.tasks.queued_emails_task import QueuedEmailsTask
 from diablo.models.approval import Approval
 from diablo.models.room import Room
@@ -31,7 +31,9 @@ from diablo.models.scheduled import Scheduled
 from diablo.models.sent_email import SentEmail
 from diablo.models.sis_section import SisSection
 from flask import current_app as app
-from tests.util import simply_yield, test_approvals_workflow
+import pytest
+from tests.test_api.api_test_utils import mock_scheduled
+from tests.util import kaltura_list_response, kaltura_stand_in, override_config, simply_yield, test_approvals_workflow
 
 admin_uid = '90001'
 
@@ -153,3 +155,103 @@ class TestKalturaJob:
             std_commit(allow_test_environment=True)
             # Admin approval is all we need.
             assert Scheduled.get_scheduled(section_id=section_id, term_id=term_id)
+
+
+class TestUpdateAlreadyScheduledEvents:
+
+    @pytest.mark.parametrize('sync_mode', ['batch', 'prefetch'])
+    def test_round_trips(self, app, sync_mode):
+        """Kaltura objects of all scheduled courses are fetched, and updated, in a few round trips."""
+        term_id = app.config['CURRENT_TERM_ID']
+        section_ids = [50005, 50012]
+        for section_id in section_ids:
+            if not Scheduled.get_scheduled(section_id=section_id, term_id=term_id):
+                mock_scheduled(section_id=section_id, term_id=term_id)
+        courses = SisSection.get_courses_scheduled(include_administrative_proxies=True, term_id=term_id)
+        assert set(section_ids).issubset(c['sectionId'] for c in courses)
+        event_id_per_section_id = dict((c['sectionId'], c['scheduled']['kalturaScheduleId']) for c in courses)
+        canvas_course_site_ids = [str(s['courseSiteId']) for s in _get_course(courses, 50012)['canvasCourseSites']]
+        assert len(canvas_course_site_ids) == 2
+
+        def _handle_call(service, action, params):
+            filter_ = params.get('filter', {})
+            if (service, action) == ('schedule_scheduleevent', 'list'):
+                event_ids = filter_['idIn'].split(',') if 'idIn' in filter_ else [filter_['idEqual']]
+                return kaltura_list_response('KalturaScheduleEventListResponse', [_kaltura_event(id_) for id_ in event_ids])
+            if (service, action) == ('baseentry', 'get'):
+                return _base_entry(params['entryId'])
+            if (service, action) == ('baseentry', 'list'):
+                return kaltura_list_response('KalturaBaseEntryListResponse', [_base_entry(id_) for id_ in filter_['idIn'].split(',')])
+            if (service, action) == ('categoryentry', 'list'):
+                # The first Canvas site is already mapped to the template entry.
+                entry_ids = filter_['entryIdIn'].split(',') if 'entryIdIn' in filter_ else [filter_['entryIdEqual']]
+                category_entries = [{'objectType': 'KalturaCategoryEntry', 'categoryId': 1, 'entryId': id_} for id_ in entry_ids]
+                return kaltura_list_response('KalturaCategoryEntryListResponse', category_entries)
+            if (service, action) == ('category', 'list'):
+                if 'idIn' in params['filter']:
+                    categories = [_category(1, canvas_course_site_ids[0])]
+                else:
+                    categories = [_category(2, full_name.split('>')[-1]) for full_name in filter_['fullNameIn'].split(',')]
+                return kaltura_list_response('KalturaCategoryListResponse', categories)
+            if service in ['baseentry', 'categoryentry'] and action in ['add', 'update']:
+                return {'objectType': 'KalturaCategoryEntry' if service == 'categoryentry' else 'KalturaMediaEntry'}
+            raise ValueError(f'Unexpected Kaltura call: {service}.{action}')
+
+        # Categories are cached per full name.
+        cache.delete_many(*[f'kaltura/category_Canvas>site>channels>{site_id}' for site_id in canvas_course_site_ids])
+        with kaltura_stand_in(app, _handle_call) as stand_in:
+            with override_config(app, 'KALTURA_SCHEDULED_EVENTS_SYNC_MODE', sync_mode):
+                _update_already_scheduled_events()
+        calls = [call for calls in stand_in.calls_per_request for call in calls]
+        # Two calls to start the session, five round trips of reads and one batch of writes.
+        assert stand_in.round_trips == 8
+        if sync_mode == 'prefetch':
+            # Kaltura objects are listed, not fetched one by one.
+            assert len(calls) == 2 + 5 + len(stand_in.calls_per_request[-1])
+
+        template_entry_id = f'0_{event_id_per_section_id[50012]}'
+        category_entries_added = [call['categoryEntry'] for call in calls if call.get('categoryEntry', {}).get('entryId') == template_entry_id]
+        assert len(category_entries_added) == 1
+        assert category_entries_added[0]['categoryId'] == '2'
+
+        base_entries_updated = [call for call in calls if 'baseEntry' in call]
+        assert len(base_entries_updated) == len(courses)
+        for section_id in section_ids:
+            instructor_uids = _get_course(courses, section_id)['scheduled']['instructorUids']
+            entitled_users = [
+                (set(call['baseEntry']['entitledUsersEdit'].split(',')), set(call['baseEntry']['entitledUsersPublish'].split(',')))
+                for call in base_entries_updated if call['entryId'] == f'0_{event_id_per_section_id[section_id]}'
+            ]
+            assert (set(instructor_uids + ['x']), set(instructor_uids + ['y'])) in entitled_users
+
+
+def _base_entry(entry_id):
+    return {'objectType': 'KalturaMediaEntry', 'entitledUsersEdit': 'x', 'entitledUsersPublish': 'y', 'id': entry_id}
+
+
+def _category(category_id, name):
+    return {'objectType': 'KalturaCategory', 'fullName': f'Canvas>site>channels>{name}', 'id': category_id, 'name': name}
+
+
+def _get_course(courses, section_id):
+    return next(c for c in courses if c['sectionId'] == section_id)
+
+
+def _kaltura_event(event_id):
+    return {
+        'objectType': 'KalturaRecordScheduleEvent',
+        'blackoutConflicts': [],
+        'categoryIds': '',
+        'classificationType': 1,
+        'createdAt': 1629000000,
+        'duration': 3600,
+        'endDate': 1629003600,
+        'id': event_id,
+        'name': f'Event {event_id}',
+        'recurrence': {},
+        'recurrenceType': 1,
+        'startDate': 1629000000,
+        'status': 2,
+        'templateEntryId': f'0_{event_id}',
+        'updatedAt': 1629000000,
+    }
@@ -0,0 +1,171 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from diablo import cache, db, std_commit
+from diablo.jobs.sis_data_refresh_job import SisDataRefreshJob
+from diablo.lib.db import resolve_sql_template
+from diablo.models.course_document import CourseDocument
+from diablo.models.cross_listing import CrossListing
+from diablo.models.room import Room
+from diablo.models.sis_section import SisSection
+from sqlalchemy import text
+
+section_columns = """
+    allowed_units, course_name, course_title, instruction_format, instructor_name, instructor_role_code, instructor_uid,
+    is_primary, meeting_days, meeting_end_date, meeting_end_time, meeting_location, meeting_start_date,
+    meeting_start_time, section_id, section_num, term_id
+"""
+
+
+class TestMergeSisSections:
+
+    def test_unchanged(self, app):
+        """Nothing is written when SIS data is unchanged."""
+        term_id = app.config['CURRENT_TERM_ID']
+        _stage_current_sis_sections(term_id)
+        row_ids = _get_row_ids(term_id)
+        _merge_sis_sections()
+        assert SisSection.get_sis_section_changes(term_id) == {'added': [], 'changed': [], 'removed': []}
+        assert _get_row_ids(term_id) == row_ids
+
+    def test_change_set(self, app):
+        """Only added, changed and removed sections are written."""
+        term_id = app.config['CURRENT_TERM_ID']
+        _stage_current_sis_sections(term_id)
+        params = {'term_id': term_id}
+        db.session.execute(text("UPDATE tmp_sis_sections SET course_title = 'Changed' WHERE section_id = 50000"))
+        db.session.execute(text('DELETE FROM tmp_sis_sections WHERE section_id = 50001'))
+        db.session.execute(
+            text(f"""
+                INSERT INTO tmp_sis_sections ({section_columns})
+                SELECT {section_columns.replace('section_id', '59999 AS section_id')}
+                FROM tmp_sis_sections WHERE section_id = 50002
+            """),
+        )
+        unchanged_row_ids = _get_row_ids(term_id, excluded_section_ids=[50000, 50001])
+        _merge_sis_sections()
+
+        assert SisSection.get_sis_section_changes(term_id) == {'added': [59999], 'changed': [50000], 'removed': [50001]}
+        assert _get_row_ids(term_id, excluded_section_ids=[50000, 50001, 59999]) == unchanged_row_ids
+        assert SisSection.get_course(term_id, 50000)['courseTitle'] == 'Changed'
+        assert SisSection.get_course(term_id, 50001) is None
+        assert SisSection.get_course(term_id, 50001, include_deleted=True)['deletedAt']
+        assert SisSection.get_course(term_id, 59999)['sectionId'] == 59999
+        # Sections are restored when they reappear.
+        _stage_current_sis_sections(term_id)
+        db.session.execute(
+            text(f"""
+                INSERT INTO tmp_sis_sections ({section_columns})
+                SELECT {section_columns} FROM sis_sections WHERE term_id = :term_id AND section_id = 50001
+            """),
+            params,
+        )
+        _merge_sis_sections()
+        assert SisSection.get_sis_section_changes(term_id) == {'added': [50001], 'changed': [], 'removed': []}
+        assert SisSection.get_course(term_id, 50001)['deletedAt'] is None
+
+
+class TestAfterSisDataRefresh:
+
+    def test_empty_change_set(self, app):
+        """Nothing downstream is rebuilt when no section changed."""
+        term_id = app.config['CURRENT_TERM_ID']
+        room_count = Room.total_room_count()
+        cross_listings = _get_cross_listings(term_id)
+        SisDataRefreshJob.after_sis_data_refresh(term_id, changes={'added': [], 'changed': [], 'removed': []})
+        assert Room.total_room_count() == room_count
+        assert _get_cross_listings(term_id) == cross_listings
+
+    def test_course_documents(self, app):
+        """Course documents are built after the refresh."""
+        term_id = app.config['CURRENT_TERM_ID']
+        CourseDocument.delete_all()
+        SisDataRefreshJob.after_sis_data_refresh(term_id, changes={'added': [], 'changed': [], 'removed': []})
+        section_ids = [c['sectionId'] for c in SisSection.get_courses(term_id=term_id)]
+        assert CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id) == set(section_ids)
+
+    def test_changed_section(self, app):
+        """Only instructors, locations and cross-listings of changed sections are refreshed."""
+        term_id = app.config['CURRENT_TERM_ID']
+        changes = {'added': [], 'changed': [50013], 'removed': []}
+        cross_listings = _get_cross_listings(term_id)
+        assert cross_listings[50012] == [50013]
+        assert SisSection.get_distinct_instructor_uids(section_ids=[50013], term_id=term_id) == ['10010']
+
+        kaltura_resource_ids_per_room = dict((room.id, room.kaltura_resource_id) for room in Room.all_rooms())
+        _set_meeting_location(location='Mulford 159', section_id=50013, term_id=term_id)
+        cached_schedule_resources = cache.get('kaltura/schedule_resources')
+        cache.set('kaltura/schedule_resources', [{'id': 159, 'name': 'Mulford 159'}])
+        try:
+            SisDataRefreshJob.after_sis_data_refresh(term_id, changes=changes)
+        finally:
+            cache.set('kaltura/schedule_resources', cached_schedule_resources)
+        new_room = Room.find_room('Mulford 159')
+        assert new_room.kaltura_resource_id == 159
+        for room in Room.all_rooms():
+            if room.id != new_room.id:
+                assert room.kaltura_resource_id == kaltura_resource_ids_per_room[room.id]
+        expected = dict((section_id, section_ids) for section_id, section_ids in cross_listings.items() if section_id != 50012)
+        assert _get_cross_listings(term_id) == expected
+        assert _is_principal_listing(section_id=50013, term_id=term_id) is True
+
+        _set_meeting_location(location="O'Brien 212", section_id=50013, term_id=term_id)
+        SisDataRefreshJob.after_sis_data_refresh(term_id, changes=changes)
+        assert _get_cross_listings(term_id) == cross_listings
+        assert _is_principal_listing(section_id=50013, term_id=term_id) is False
+
+
+def _get_cross_listings(term_id):
+    return CrossListing.get_cross_listings_for_section_ids(
+        section_ids=[row['section_id'] for row in db.session.execute(text('SELECT section_id FROM cross_listings'))],
+        term_id=term_id,
+    )
+
+
+def _get_row_ids(term_id, excluded_section_ids=()):
+    sql = 'SELECT id FROM sis_sections WHERE term_id = :term_id AND NOT (section_id = ANY(:section_ids)) ORDER BY id'
+    return [row['id'] for row in db.session.execute(text(sql), {'section_ids': list(excluded_section_ids), 'term_id': term_id})]
+
+
+def _is_principal_listing(section_id, term_id):
+    sql = 'SELECT DISTINCT is_principal_listing FROM sis_sections WHERE term_id = :term_id AND section_id = :section_id'
+    return db.session.execute(text(sql), {'section_id': section_id, 'term_id': term_id}).scalar()
+
+
+def _merge_sis_sections():
+    db.session.execute(text(resolve_sql_template('merge_sis_sections.template.sql')))
+    std_commit()
+
+
+def _set_meeting_location(location, section_id, term_id):
+    sql = 'UPDATE sis_sections SET meeting_location = :location WHERE term_id = :term_id AND section_id = :section_id'
+    db.session.execute(text(sql), {'location': location, 'section_id': section_id, 'term_id': term_id})
+
+
+def _stage_current_sis_sections(term_id):
+    db.session.execute(text('DROP TABLE IF EXISTS tmp_sis_sections'))
+    db.session.execute(
+        text(f'CREATE TABLE tmp_sis_sections AS SELECT {section_columns} FROM sis_sections WHERE term_id = :term_id AND deleted_at IS NULL'),
+        {'term_id': term_id},
+    )
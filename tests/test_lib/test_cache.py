@@ -0,0 +1,180 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import diablo
+from diablo import cache as app_cache, cachify
+from diablo.lib.cache import TwoTierCache
+from flask_caching.backends import RedisCache
+from tests.util import RedisStandIn
+
+
+class TestTwoTierCache:
+
+    def test_local_hit(self):
+        """Local hits do not reach the shared tier."""
+        redis = RedisStandIn()
+        cache = _two_tier_cache(redis)
+        cache.set('calnet/user_for_uid_1', {'uid': '1'})
+        redis.commands.clear()
+        for _ in range(3):
+            assert cache.get('calnet/user_for_uid_1') == {'uid': '1'}
+        assert cache.get_many('calnet/user_for_uid_1') == [{'uid': '1'}]
+        assert redis.commands == []
+
+    def test_shared_hit(self):
+        """Shared hits, e.g. set by another process, are kept in the local tier."""
+        redis = RedisStandIn()
+        cache = _two_tier_cache(redis)
+        cache.shared.set('kaltura/schedule_resources', [{'id': 1}])
+        assert cache.get_many('kaltura/schedule_resources', 'kaltura/nothing') == [[{'id': 1}], None]
+        redis.commands.clear()
+        assert cache.get('kaltura/schedule_resources') == [{'id': 1}]
+        assert redis.commands == []
+
+    def test_cached_values_are_copies(self):
+        """Callers cannot mutate cached values."""
+        cache = _two_tier_cache(RedisStandIn())
+        cache.set('a', {'uid': '1'})
+        cache.get('a')['uid'] = '2'
+        assert cache.get('a') == {'uid': '1'}
+
+    def test_lru_eviction(self):
+        """Least recently used entries are evicted from the local tier, not from the shared tier."""
+        redis = RedisStandIn()
+        cache = _two_tier_cache(redis, local_max_size=2)
+        for key in ['a', 'b', 'c']:
+            cache.set(key, key)
+        redis.commands.clear()
+        assert [cache.get(key) for key in ['c', 'b', 'a']] == ['c', 'b', 'a']
+        assert redis.commands == ['mget']
+
+    def test_per_key_timeout(self):
+        """Entries expire per their own timeout, in both tiers."""
+        cache = _two_tier_cache(RedisStandIn())
+        cache.set('short', 'lived', timeout=1)
+        cache.set('long', 'lived')
+        assert cache.get('short') == 'lived'
+        time.sleep(1.1)
+        assert cache.get('short') is None
+        assert cache.get('long') == 'lived'
+
+    def test_delete_and_clear(self):
+        """Deletes and clear apply to both tiers."""
+        cache = _two_tier_cache(RedisStandIn())
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        cache.delete('a')
+        assert cache.get('a') is None
+        assert cache.has('b')
+        cache.clear()
+        assert cache.get_many('b', 'c') == [None, None]
+
+
+class TestCachify:
+
+    def test_negative_caching(self, app):
+        """None results are cached when negative_timeout is set."""
+        calls = []
+        app_cache.delete('test_cachify/negative_1')
+
+        @cachify('test_cachify/negative_{uid}', negative_timeout=60)
+        def _fetch(uid):
+            calls.append(uid)
+            return None
+
+        assert _fetch('1') is None
+        assert _fetch('1') is None
+        assert calls == ['1']
+
+    def test_single_flight(self, app):
+        """Concurrent misses on a key are fetched once."""
+        calls = []
+        app_cache.delete('test_cachify/single_flight_1')
+
+        @cachify('test_cachify/single_flight_{uid}', timeout=60)
+        def _fetch(uid):
+            calls.append(uid)
+            time.sleep(0.2)
+            return {'uid': uid}
+
+        def _call(uid):
+            with app.app_context():
+                return _fetch(uid)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(_call, ['1'] * 8))
+        assert results == [{'uid': '1'}] * 8
+        assert calls == ['1']
+
+    def test_one_miss_counted_once(self, app):
+        """A cold miss, and the fetch it triggers, count as one miss."""
+        app_cache.delete('test_cachify/counted_1')
+
+        @cachify('test_cachify/counted_{uid}', timeout=60)
+        def _fetch(uid):
+            return {'uid': uid}
+
+        def _stats():
+            return app_cache.cache.get_stats().get('test_cachify/counted_*', {'hits': 0, 'misses': 0})
+
+        stats = _stats()
+        assert _fetch('1') == {'uid': '1'}
+        assert _fetch('1') == {'uid': '1'}
+        assert _stats()['misses'] == stats['misses'] + 1
+        assert _stats()['hits'] == stats['hits'] + 1
+
+    def test_single_flight_per_key(self, app):
+        """A miss in flight does not hold up misses on other keys, nested or concurrent."""
+        app_cache.delete_many(*[f'test_cachify/per_key_{uid}' for uid in ['a', 'b', 'c']])
+        a_in_flight = threading.Event()
+        b_fetched = threading.Event()
+
+        @cachify('test_cachify/per_key_{uid}', timeout=60)
+        def _fetch(uid):
+            if uid == 'a':
+                # Nested miss on another key, then wait for a concurrent miss on a third key.
+                assert _fetch('c') == {'uid': 'c'}
+                a_in_flight.set()
+                assert b_fetched.wait(timeout=5)
+            elif uid == 'b':
+                b_fetched.set()
+            return {'uid': uid}
+
+        def _call(uid):
+            if uid == 'b':
+                assert a_in_flight.wait(timeout=5)
+            with app.app_context():
+                return _fetch(uid)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(_call, ['a', 'b']))
+        assert results == [{'uid': 'a'}, {'uid': 'b'}]
+        assert diablo._in_flight_locks == {}
+
+
+def _two_tier_cache(redis, local_max_size=100):
+    return TwoTierCache(shared=RedisCache(host=redis, default_timeout=300), local_max_size=local_max_size)
@@ -23,9 +23,11 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 import re
+import time
 
 from diablo.externals.b_connected import BConnected
-from diablo.lib.interpolator import interpolate_content
+from diablo.lib.interpolator import compile_template, get_course_substitutions, get_template_substitutions, interpolate_content, \
+    render_template
 from diablo.merged.calnet import get_calnet_user_for_uid
 from diablo.models.sis_section import SisSection
 from flask import current_app as app
@@ -46,6 +48,14 @@ class TestInterpolator:
         expected = _normalize(_get_expected_email())
         assert expected == actual
 
+    def test_tokens_without_substitution(self):
+        """Unknown tokens are left as is, and substituted values are inserted verbatim."""
+        templated_string = 'Dear <code>recipient.name</code>, see <code> no.such.token </code> and <code>course.name</code>.'
+        interpolated = render_template(templated_string, {'course.name': None, 'recipient.name': 'C:\\Users\\1'})
+        assert interpolated == 'Dear C:\\Users\\1, see <code> no.such.token </code> and None.'
+        # A template is parsed once.
+        assert compile_template(templated_string) is compile_template(templated_string)
+
     def test_email_test_mode_on(self):
         with override_config(app, 'EMAIL_TEST_MODE', True):
             recipient = _get_mock_recipient()
@@ -63,6 +73,46 @@ class TestInterpolator:
             assert BConnected.get_email_addresses(recipient) == [recipient['email']]
 
 
+class TestInterpolatorPerformance:
+
+    def test_render_10k_emails(self):
+        """Rendering 10,000 emails (1,000 courses, ten recipients each) from compiled templates beats per-token regex."""
+        course = SisSection.get_course(app.config['CURRENT_TERM_ID'], '50003')
+        courses = [{**course, 'courseName': f'PHYSICS {index}', 'sectionId': 60000 + index} for index in range(1000)]
+        recipient_names = [f'Instructor {index}' for index in range(10)]
+        templated_string = _get_email_template()
+
+        started_at = time.perf_counter()
+        expected = [
+            _interpolate_per_token(course=c, recipient_name=name, templated_string=templated_string) for c in courses for name in recipient_names
+        ]
+        per_token_elapsed = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        actual = []
+        for c in courses:
+            course_substitutions = get_course_substitutions(course=c)
+            for name in recipient_names:
+                actual.append(render_template(templated_string, {**course_substitutions, 'recipient.name': name}))
+        compiled_elapsed = time.perf_counter() - started_at
+
+        assert len(actual) == 10000
+        assert actual == expected
+        assert compiled_elapsed < per_token_elapsed, f'Compiled: {compiled_elapsed:.3f}s. Per-token regex: {per_token_elapsed:.3f}s.'
+
+
+def _interpolate_per_token(course, recipient_name, templated_string):
+    # The former implementation: one regex substitution per token, over the whole template.
+    interpolated = templated_string
+    for token, value in get_template_substitutions(course=course, recipient_name=recipient_name).items():
+        if value is None:
+            value = 'None'
+        elif type(value) == list:
+            value = ','.join(value)
+        interpolated = re.sub(f'<code>[ \n\t]*{token}[ \n\t]*</code>', value, interpolated)
+    return interpolated
+
+
 def _get_mock_recipient():
     return {
         'email': 'sukie@graveyard.com',
@@ -0,0 +1,50 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from diablo import cache
+from diablo.merged.calnet import get_calnet_cache_stats, get_calnet_user_for_uid, get_calnet_users_for_uids
+
+
+class TestGetCalnetUsersForUids:
+
+    def test_cache_hits_and_misses(self, app):
+        """Cached users are served from cache and only misses are fetched from CalNet."""
+        uids = ['10001', '10002', '10003']
+        for uid in uids:
+            cache.delete(f'calnet/user_for_uid_{uid}')
+        get_calnet_user_for_uid(app, '10002')
+
+        stats = get_calnet_cache_stats()
+        users = get_calnet_users_for_uids(app, uids + ['10001'])
+        assert list(users.keys()) == uids
+        assert users['10002'] == get_calnet_user_for_uid(app, '10002')
+        assert get_calnet_cache_stats() == {'hits': stats['hits'] + 2, 'misses': stats['misses'] + 2}
+
+        stats = get_calnet_cache_stats()
+        assert get_calnet_users_for_uids(app, uids) == users
+        assert get_calnet_cache_stats() == {'hits': stats['hits'] + 3, 'misses': stats['misses']}
+
+    def test_empty(self, app):
+        """No uids, no users."""
+        assert get_calnet_users_for_uids(app, []) == {}
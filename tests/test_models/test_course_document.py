@@ -0,0 +1,158 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from diablo import db, std_commit
+from diablo.models import sis_section
+from diablo.models.course_document import CourseDocument
+from diablo.models.course_preference import CoursePreference
+from diablo.models.sis_section import SisSection
+from flask import current_app as app
+from sqlalchemy import text
+from tests.util import override_config
+
+
+class TestCourseDocument:
+
+    def test_materialize_feed(self):
+        """Course feed is materialized per section, out of band, and served from course_documents."""
+        term_id = app.config['CURRENT_TERM_ID']
+        CourseDocument.delete_all()
+        courses = SisSection.get_courses(term_id=term_id)
+        assert len(courses) > 0
+        section_ids = [c['sectionId'] for c in courses]
+        assert CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id) == set()
+
+        assert SisSection.refresh_course_documents(term_id=term_id, batch_size=4) == len(courses)
+        assert CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id) == set(section_ids)
+        # Served from materialized documents, in the same order.
+        assert SisSection.get_courses(term_id=term_id) == courses
+        # Nothing left to build.
+        assert SisSection.refresh_course_documents(term_id=term_id) == 0
+
+    def test_documents_match_feed(self):
+        """Materialized documents are identical to a freshly constructed feed."""
+        term_id = app.config['CURRENT_TERM_ID']
+        SisSection.refresh_course_documents(term_id=term_id)
+        courses = SisSection.get_courses(term_id=term_id)
+        CourseDocument.delete_all()
+        assert SisSection.get_courses(term_id=term_id) == courses
+
+    def test_read_only(self, monkeypatch):
+        """Requests for the course feed neither write nor commit."""
+        term_id = app.config['CURRENT_TERM_ID']
+        CourseDocument.delete_all()
+        std_commit()
+        generation_count = _count_generations()
+        monkeypatch.setattr(sis_section, 'std_commit', None)
+        courses = SisSection.get_courses(term_id=term_id)
+        assert len(courses) > 0
+        assert CourseDocument.get_section_ids(section_ids=[c['sectionId'] for c in courses], term_id=term_id) == set()
+        assert _count_generations() == generation_count
+
+    def test_format_key(self):
+        """Documents built per another format (e.g., other term dates) are ignored, and rebuilt."""
+        term_id = app.config['CURRENT_TERM_ID']
+        SisSection.refresh_course_documents(term_id=term_id)
+        courses = SisSection.get_courses(term_id=term_id)
+        section_ids = [c['sectionId'] for c in courses]
+        assert next(c for c in courses if c['meetings']['eligible'] and not c['nonstandardMeetingDates'])
+        with override_config(app, 'CURRENT_TERM_END', '2099-12-31'):
+            assert CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id) == set()
+            feed = SisSection.get_courses(term_id=term_id)
+            # Meeting dates are nonstandard per the new term dates.
+            assert all(c['nonstandardMeetingDates'] for c in feed if c['meetings']['eligible'])
+            assert SisSection.refresh_course_documents(term_id=term_id) == len(courses)
+            assert SisSection.get_courses(term_id=term_id) == feed
+        assert CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id) == set()
+        SisSection.refresh_course_documents(term_id=term_id)
+
+    def test_invalidate_on_opt_out(self):
+        """Changes to course preferences delete the stale document."""
+        term_id = app.config['CURRENT_TERM_ID']
+        section_id = 50000
+        course = SisSection.get_course(section_id=section_id, term_id=term_id)
+        assert course['hasOptedOut'] is False
+        SisSection.refresh_course_documents(term_id=term_id)
+        assert section_id in CourseDocument.get_section_ids(section_ids=[section_id], term_id=term_id)
+
+        CoursePreference.update_opt_out(term_id=term_id, section_id=section_id, opt_out=True)
+        std_commit()
+        assert section_id not in CourseDocument.get_section_ids(section_ids=[section_id], term_id=term_id)
+        course = next(c for c in SisSection.get_courses(term_id=term_id) if c['sectionId'] == section_id)
+        assert course['hasOptedOut'] is True
+        CoursePreference.update_opt_out(term_id=term_id, section_id=section_id, opt_out=False)
+        std_commit()
+
+    def test_invalidated_during_build(self, monkeypatch):
+        """A document invalidated while it is built is not stored."""
+        term_id = app.config['CURRENT_TERM_ID']
+        section_id = 50000
+        CoursePreference.update_opt_out(term_id=term_id, section_id=section_id, opt_out=False)
+        CourseDocument.delete_all()
+        std_commit()
+        to_api_json = sis_section._to_api_json
+
+        def _to_api_json_then_opt_out(**kwargs):
+            courses = to_api_json(**kwargs)
+            # A change committed after the feed query, before the documents are stored.
+            CoursePreference.update_opt_out(term_id=term_id, section_id=section_id, opt_out=True)
+            std_commit()
+            return courses
+
+        monkeypatch.setattr(sis_section, '_to_api_json', _to_api_json_then_opt_out)
+        stored_count = SisSection.refresh_course_documents(term_id=term_id)
+        monkeypatch.undo()
+        section_ids = [c['sectionId'] for c in SisSection.get_courses(term_id=term_id)]
+        assert stored_count == len(section_ids) - 1
+        # Other documents are stored.
+        assert CourseDocument.get_section_ids(section_ids=section_ids, term_id=term_id) == set(section_ids) - {section_id}
+        course = next(c for c in SisSection.get_courses(term_id=term_id) if c['sectionId'] == section_id)
+        assert course['hasOptedOut'] is True
+        CoursePreference.update_opt_out(term_id=term_id, section_id=section_id, opt_out=False)
+        std_commit()
+
+    def test_all_invalidated_during_build(self, monkeypatch):
+        """No document is stored if all documents are invalidated (e.g., rooms changed) while they are built."""
+        term_id = app.config['CURRENT_TERM_ID']
+        CourseDocument.delete_all()
+        std_commit()
+        to_api_json = sis_section._to_api_json
+
+        def _to_api_json_then_invalidate_all(**kwargs):
+            courses = to_api_json(**kwargs)
+            CourseDocument.delete_all()
+            std_commit()
+            return courses
+
+        monkeypatch.setattr(sis_section, '_to_api_json', _to_api_json_then_invalidate_all)
+        assert SisSection.refresh_course_documents(term_id=term_id) == 0
+        monkeypatch.undo()
+        courses = SisSection.get_courses(term_id=term_id)
+        assert len(courses) > 0
+        assert CourseDocument.get_section_ids(section_ids=[c['sectionId'] for c in courses], term_id=term_id) == set()
+
+
+def _count_generations():
+    return db.session.execute(text('SELECT COUNT(*) FROM course_document_generations')).scalar()
@@ -22,9 +22,11 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from diablo import std_commit
 from diablo.models.queued_email import QueuedEmail
 from diablo.models.sis_section import SisSection
 from flask import current_app as app
+from tests.util import override_config
 
 
 class TestQueuedEmail:
@@ -40,3 +42,58 @@ class TestQueuedEmail:
         # Queued email creation fails.
         assert not QueuedEmail.create(section_id, email_template_type, term_id, recipient=None)
         assert section_id not in QueuedEmail.get_all_section_ids(template_type=email_template_type, term_id=term_id)
+
+    def test_create_is_idempotent(self):
+        """Queueing an identical email returns the email already queued."""
+        term_id = app.config['CURRENT_TERM_ID']
+        recipient = {'email': 'admin@berkeley.edu', 'name': 'Course Capture Admin', 'uid': app.config['EMAIL_DIABLO_ADMIN_UID']}
+        queued_email = QueuedEmail.create(50002, 'admin_alert_room_change', term_id, recipient=recipient)
+        assert queued_email.id
+        assert queued_email.message and queued_email.subject_line
+        assert QueuedEmail.create(50002, 'admin_alert_room_change', term_id, recipient=recipient).id == queued_email.id
+        QueuedEmail.delete(queued_email)
+        std_commit(allow_test_environment=True)
+
+    def test_queue_again_after_dead_letter(self):
+        """A dead letter does not block a new, identical email."""
+        term_id = app.config['CURRENT_TERM_ID']
+        recipient = {'email': 'admin@berkeley.edu', 'name': 'Course Capture Admin', 'uid': app.config['EMAIL_DIABLO_ADMIN_UID']}
+        dead_letter = QueuedEmail.create(50002, 'admin_alert_room_change', term_id, recipient=recipient)
+        QueuedEmail.dead_letter(dead_letter, error='SMTPServerDisconnected: Connection unexpectedly closed')
+        std_commit(allow_test_environment=True)
+
+        queued_email = QueuedEmail.create(50002, 'admin_alert_room_change', term_id, recipient=recipient)
+        assert queued_email.id != dead_letter.id
+        assert queued_email.dead_lettered_at is None
+        assert queued_email.message == dead_letter.message
+        # The new email, not the dead letter, is already queued.
+        assert QueuedEmail.create(50002, 'admin_alert_room_change', term_id, recipient=recipient).id == queued_email.id
+        assert queued_email.id in [e.id for e in QueuedEmail.get_all(term_id=term_id)]
+        QueuedEmail.delete_all([dead_letter, queued_email])
+        std_commit(allow_test_environment=True)
+
+    def test_create_all(self, monkeypatch):
+        """Emails are interpolated per course and recipient, and inserted in batches, without lookups of course feeds."""
+        term_id = app.config['CURRENT_TERM_ID']
+        courses = SisSection.get_courses(section_ids=[50000, 50001, 50002], term_id=term_id)
+        course_recipients = [(course, instructor) for course in courses for instructor in course['instructors']]
+        assert len(course_recipients) >= 3
+
+        def _queued_emails():
+            return [e for e in QueuedEmail.get_all(term_id=term_id) if e.template_type == 'remind_invitees']
+
+        assert not _queued_emails()
+        monkeypatch.setattr(SisSection, 'get_course', None)
+        with override_config(app, 'EMAIL_QUEUE_BATCH_SIZE', 2):
+            assert QueuedEmail.create_all(course_recipients, template_type='remind_invitees', term_id=term_id) == len(course_recipients)
+            # Emails already queued are skipped.
+            assert QueuedEmail.create_all(course_recipients, template_type='remind_invitees', term_id=term_id) == 0
+        std_commit(allow_test_environment=True)
+
+        queued_emails = _queued_emails()
+        assert len(queued_emails) == len(course_recipients)
+        for course, instructor in course_recipients:
+            queued_email = next(e for e in queued_emails if e.section_id == course['sectionId'] and e.recipient['uid'] == instructor['uid'])
+            assert queued_email.message and queued_email.subject_line
+        QueuedEmail.delete_all(queued_emails)
+        std_commit(allow_test_environment=True)
@@ -0,0 +1,245 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from datetime import datetime, timedelta
+import time
+import tracemalloc
+
+from diablo import db
+from diablo.lib.berkeley import get_recording_end_date, get_recording_start_date
+from diablo.lib.util import safe_strftime
+from diablo.models.room import Room
+from diablo.models.sis_section import _feed_columns, _to_api_json, _to_instructor_json, _to_meeting_json, FEED_COLUMNS, \
+    FeedRow, SisSection
+from flask import current_app as app
+from sqlalchemy import text
+
+# Synthetic feed: 5,000 co-taught sections, each with 5 instructors and 2 meeting patterns.
+SYNTHETIC_SECTION_COUNT = 5000
+SYNTHETIC_INSTRUCTOR_COUNT = 5
+SYNTHETIC_MEETING_COUNT = 2
+
+# Synthetic feed of the same size, but with many co-instructors and meeting patterns per section. Per-row scans of
+# instructors and meetings are quadratic in this shape.
+CO_TAUGHT_SECTION_COUNT = 10
+CO_TAUGHT_INSTRUCTOR_COUNT = 50
+CO_TAUGHT_MEETING_COUNT = 100
+
+
+def synthetic_rows(
+    room_id,
+    term_id,
+    section_count=SYNTHETIC_SECTION_COUNT,
+    instructor_count=SYNTHETIC_INSTRUCTOR_COUNT,
+    meeting_count=SYNTHETIC_MEETING_COUNT,
+):
+    start_date = datetime.strptime(app.config['CURRENT_TERM_BEGIN'], '%Y-%m-%d')
+    end_date = datetime.strptime(app.config['CURRENT_TERM_END'], '%Y-%m-%d')
+    rows = []
+    for index in range(section_count):
+        section_id = 900000 + index
+        for instructor_index in range(instructor_count):
+            for meeting_index in range(meeting_count):
+                rows.append(FeedRow(
+                    allowed_units='4',
+                    course_name=f'SYNTH {index:05d}',
+                    course_title='Synthetic course',
+                    deleted_at=None,
+                    instruction_format='LEC',
+                    instructor_dept_code='SYNTH',
+                    instructor_email=f'{instructor_index}@berkeley.edu',
+                    instructor_name=f'Instructor {instructor_index}',
+                    instructor_role_code='PI',
+                    instructor_uid=str(800000 + instructor_index),
+                    is_primary=True,
+                    meeting_days='MOWE' if meeting_index else 'TUTH',
+                    meeting_end_date=end_date,
+                    meeting_end_time='10:59',
+                    meeting_location='Barker 101',
+                    meeting_start_date=start_date + timedelta(days=meeting_index),
+                    meeting_start_time='10:00',
+                    room_id=room_id,
+                    section_id=section_id,
+                    section_num='001',
+                    term_id=term_id,
+                ))
+    return rows
+
+
+def insert_synthetic_sis_sections(term_id):
+    sql = f"""
+        INSERT INTO sis_sections (
+            id, allowed_units, course_name, course_title, created_at, instruction_format, instructor_name,
+            instructor_role_code, instructor_uid, is_primary, meeting_days, meeting_end_date, meeting_end_time,
+            meeting_location, meeting_start_date, meeting_start_time, section_id, section_num, term_id
+        )
+        SELECT
+            nextval('sis_sections_id_seq'), '4', 'SYNTH ' || lpad(n::text, 5, '0'), 'Synthetic course', now(), 'LEC',
+            'Instructor ' || i, 'PI', (800000 + i)::text, TRUE, CASE WHEN m = 0 THEN 'TUTH' ELSE 'MOWE' END,
+            :term_end, '10:59', 'Barker 101', :term_begin, '10:00', 900000 + n, '001', :term_id
+        FROM
+            generate_series(0, {SYNTHETIC_SECTION_COUNT // 5 - 1}) AS n,
+            generate_series(0, {SYNTHETIC_INSTRUCTOR_COUNT - 1}) AS i,
+            generate_series(0, {SYNTHETIC_MEETING_COUNT - 1}) AS m
+    """
+    db.session.execute(
+        text(sql),
+        {
+            'term_begin': app.config['CURRENT_TERM_BEGIN'],
+            'term_end': app.config['CURRENT_TERM_END'],
+            'term_id': term_id,
+        },
+    )
+
+
+def _assemble_per_row(rows, rooms_by_id):
+    # The former implementation: per row, scan the instructors and meetings of the course, and sort meetings on each append.
+    courses_per_id = {}
+    for row in rows:
+        course = courses_per_id.setdefault(int(row.section_id), {'instructors': [], 'meetings': {'eligible': [], 'ineligible': []}})
+        instructor_uid = row.instructor_uid.strip() if row.instructor_uid else None
+        if instructor_uid and instructor_uid not in [i['uid'] for i in course['instructors']]:
+            course['instructors'].append(_to_instructor_json(row=row, approvals=[], invited_uids=[]))
+        meeting = _to_meeting_json(row)
+        eligible_meetings = course['meetings']['eligible']
+        ineligible_meetings = course['meetings']['ineligible']
+        if not next((m for m in (eligible_meetings + ineligible_meetings) if meeting.items() <= m.items()), None):
+            room = rooms_by_id.get(row.room_id)
+            meetings = eligible_meetings if room and room.capability else ineligible_meetings
+            if room and room.capability:
+                meeting.update({
+                    'eligible': True,
+                    'recordingEndDate': safe_strftime(get_recording_end_date(meeting), '%Y-%m-%d'),
+                    'recordingStartDate': safe_strftime(get_recording_start_date(meeting), '%Y-%m-%d'),
+                })
+            meetings.append(meeting)
+            meetings.sort(key=lambda m: f"{m['startDate']} {m['startTime']}")
+    return list(courses_per_id.values())
+
+
+def measure(func):
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started_at
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+class TestGetHasOptedOutPerSectionId:
+
+    def test_consistent_with_get_course(self):
+        """Opt-out per section_id, in one query, agrees with the course feed."""
+        term_id = app.config['CURRENT_TERM_ID']
+        section_ids = list(range(50000, 50020)) + [9999999]
+        for include_deleted in [False, True]:
+            has_opted_out_per_section_id = SisSection.get_has_opted_out_per_section_id(
+                include_deleted=include_deleted,
+                section_ids=section_ids,
+                term_id=term_id,
+            )
+            assert 9999999 not in has_opted_out_per_section_id
+            for section_id in section_ids:
+                course = SisSection.get_course(term_id, section_id, include_deleted=include_deleted)
+                assert has_opted_out_per_section_id.get(section_id) == (course['hasOptedOut'] if course else None)
+
+
+class TestToApiJsonPerformance:
+
+    def test_synthetic_feed(self):
+        """Course feed of 50,000 rows, with many co-instructors and meetings per section, beats per-row scans."""
+        term_id = app.config['CURRENT_TERM_ID']
+        room = Room.find_room('Barker 101')
+        rows = synthetic_rows(
+            room_id=room.id,
+            term_id=term_id,
+            section_count=CO_TAUGHT_SECTION_COUNT,
+            instructor_count=CO_TAUGHT_INSTRUCTOR_COUNT,
+            meeting_count=CO_TAUGHT_MEETING_COUNT,
+        )
+        assert len(rows) == 50000
+
+        started_at = time.perf_counter()
+        expected = _assemble_per_row(rows=rows, rooms_by_id={room.id: room})
+        per_row_elapsed = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        api_json = _to_api_json(term_id=term_id, rows=rows)
+        elapsed = time.perf_counter() - started_at
+
+        assert len(api_json) == CO_TAUGHT_SECTION_COUNT
+        for course, expected_course in zip(api_json, expected):
+            assert len(course['instructors']) == CO_TAUGHT_INSTRUCTOR_COUNT
+            assert [i['uid'] for i in course['instructors']] == [i['uid'] for i in expected_course['instructors']]
+            eligible_meetings = course['meetings']['eligible']
+            assert len(eligible_meetings) == CO_TAUGHT_MEETING_COUNT
+            assert [m['startDate'] for m in eligible_meetings] == [m['startDate'] for m in expected_course['meetings']['eligible']]
+            assert eligible_meetings[0]['days'] == 'TUTH'
+            assert course['nonstandardMeetingDates'] is True
+        assert elapsed < per_row_elapsed, f'Keyed accumulator: {elapsed:.3f}s. Per-row scans: {per_row_elapsed:.3f}s.'
+
+
+class TestFeedRowPerformance:
+
+    def test_compact_rows(self):
+        """Compact feed rows cost less memory than wide sis_sections rows."""
+        term_id = app.config['CURRENT_TERM_ID']
+        insert_synthetic_sis_sections(term_id)
+        from_and_where_clauses = """
+            FROM sis_sections s
+            JOIN rooms r ON r.location = s.meeting_location
+            LEFT JOIN instructors i ON i.uid = s.instructor_uid
+            WHERE s.term_id = :term_id AND s.section_id >= 900000
+            ORDER BY s.course_name, s.section_id, s.id
+        """
+
+        def _wide_path():
+            # Every sis_sections column, with per-row lookups by string key.
+            sql = f"""
+                SELECT
+                    s.*,
+                    i.dept_code AS instructor_dept_code,
+                    i.email AS instructor_email,
+                    i.first_name || ' ' || i.last_name AS instructor_name,
+                    i.uid AS instructor_uid,
+                    r.id AS room_id,
+                    r.location AS room_location
+                {from_and_where_clauses}
+            """
+            rows = db.session.execute(text(sql), {'term_id': term_id}).fetchall()
+            return rows, [[row[column] for column in FEED_COLUMNS] for row in rows]
+
+        def _compact_path():
+            sql = f'SELECT {_feed_columns()} {from_and_where_clauses}'
+            rows = [FeedRow._make(row) for row in db.session.execute(text(sql), {'term_id': term_id})]
+            return rows, [list(row) for row in rows]
+
+        (wide_rows, wide_values), wide_elapsed, wide_peak = measure(_wide_path)
+        (compact_rows, compact_values), compact_elapsed, compact_peak = measure(_compact_path)
+
+        assert len(compact_rows) == len(wide_rows) == SYNTHETIC_SECTION_COUNT // 5 * SYNTHETIC_INSTRUCTOR_COUNT * SYNTHETIC_MEETING_COUNT
+        assert compact_values == wide_values
+        assert compact_peak < wide_peak, f'Compact: {compact_peak} bytes, {compact_elapsed:.3f}s. Wide: {wide_peak} bytes, {wide_elapsed:.3f}s.'
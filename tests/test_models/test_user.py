@@ -0,0 +1,113 @@
+"""
+Copyright ©2023. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+from diablo import db
+from diablo.models.admin_user import AdminUser
+from diablo.models.user import _shared_cache, clear_user_cache, User, USER_CACHE_VERSION_KEY
+from sqlalchemy import text
+from tests.util import override_config
+
+admin_uid = '90001'
+instructor_uid = '10001'
+
+
+class TestUserCache:
+
+    def test_cached_principal(self, app):
+        """Within its TTL, a cached principal is served without queries."""
+        with override_config(app, 'USER_CACHE_TTL', 60):
+            clear_user_cache()
+            assert User(instructor_uid).is_teaching is True
+            _delete_sis_sections_of_instructor(instructor_uid)
+            assert User(instructor_uid).is_teaching is True
+
+            clear_user_cache(instructor_uid)
+            assert User(instructor_uid).is_teaching is False
+            assert User(instructor_uid).is_active is False
+        clear_user_cache()
+
+    def test_admin_user_deleted(self, app):
+        """Cached principal of an admin is invalidated when admin user is deleted."""
+        with override_config(app, 'USER_CACHE_TTL', 60):
+            clear_user_cache()
+            assert User(admin_uid).is_admin is True
+            AdminUser.delete(admin_uid)
+            assert User(admin_uid).is_admin is False
+        clear_user_cache()
+
+    def test_cleared_on_other_app_server(self, app):
+        """Cached principal is invalidated when another app server bumps the shared version of the user cache."""
+        with override_config(app, 'USER_CACHE_TTL', 60), override_config(app, 'USER_CACHE_VERSION_POLL_INTERVAL', 60):
+            clear_user_cache()
+            assert User(instructor_uid).is_teaching is True
+            _delete_sis_sections_of_instructor(instructor_uid)
+            assert User(instructor_uid).is_teaching is True
+
+            # Another app server clears its user cache; the in-process cache of this one is untouched.
+            _shared_cache().inc(USER_CACHE_VERSION_KEY)
+            # The new version is not observed until the poll interval has passed.
+            assert User(instructor_uid).is_teaching is True
+            with override_config(app, 'USER_CACHE_VERSION_POLL_INTERVAL', 0):
+                assert User(instructor_uid).is_teaching is False
+        clear_user_cache()
+
+    def test_version_polled_per_interval(self, app, monkeypatch):
+        """Within the poll interval, cached principals are served without reads of the shared cache tier."""
+        shared_cache = _shared_cache()
+        keys_read = []
+
+        def _get(key):
+            keys_read.append(key)
+            return original_get(key)
+
+        original_get = shared_cache.get
+        with override_config(app, 'USER_CACHE_TTL', 60), override_config(app, 'USER_CACHE_VERSION_POLL_INTERVAL', 60):
+            clear_user_cache()
+            assert User(instructor_uid).is_teaching is True
+            monkeypatch.setattr(shared_cache, 'get', _get)
+            for _ in range(10):
+                assert User(instructor_uid).is_teaching is True
+            assert USER_CACHE_VERSION_KEY not in keys_read
+        clear_user_cache()
+
+    def test_expired_principal(self, app):
+        """Principals are reloaded when TTL is zero."""
+        clear_user_cache()
+        assert User(instructor_uid).is_teaching is True
+        _delete_sis_sections_of_instructor(instructor_uid)
+        assert User(instructor_uid).is_teaching is False
+
+    def test_max_size(self, app):
+        """Least recently used principals are evicted."""
+        with override_config(app, 'USER_CACHE_TTL', 60), override_config(app, 'USER_CACHE_MAX_SIZE', 1):
+            clear_user_cache()
+            assert User(instructor_uid).is_teaching is True
+            assert User(admin_uid).is_admin is True
+            _delete_sis_sections_of_instructor(instructor_uid)
+            assert User(instructor_uid).is_teaching is False
+        clear_user_cache()
+
+
+def _delete_sis_sections_of_instructor(uid):
+    db.session.execute(text('DELETE FROM sis_sections WHERE instructor_uid = :uid'), {'uid': uid})
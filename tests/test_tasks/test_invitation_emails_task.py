@@ -27,6 +27,7 @@ from diablo.jobs.tasks.invitation_emails_task import InvitationEmailsTask
 from diablo.jobs.tasks.queued_emails_task import QueuedEmailsTask
 from diablo.lib.util import utc_now
 from diablo.models.course_preference import CoursePreference
+from diablo.models.queued_email import QueuedEmail
 from diablo.models.sent_email import SentEmail
 from diablo.models.sis_section import SisSection
 from sqlalchemy import text
@@ -141,6 +142,28 @@ class TestInvitationEmailsTask:
             recipients = [f'{e.template_type}_{e.recipient_uid}_{e.term_id}_{e.section_id}' for e in emails_sent]
             assert len(set(recipients)) == len(recipients)
 
+    def test_invite_again_after_dead_letter(self, app):
+        """An invitation that was dead-lettered, and so never sent, is queued again."""
+        term_id = app.config['CURRENT_TERM_ID']
+        with test_approvals_workflow(app):
+            InvitationEmailsTask().run()
+            dead_letter = next(e for e in _get_queued_invitations(term_id) if e.section_id == 50002)
+            recipient_uid = dead_letter.recipient['uid']
+            QueuedEmail.dead_letter(dead_letter, error='SMTPServerDisconnected: Connection unexpectedly closed')
+            std_commit(allow_test_environment=True)
+
+            course = SisSection.get_course(term_id, 50002)
+            instructor = next(i for i in course['instructors'] if i['uid'] == recipient_uid)
+            assert instructor['wasSentInvite'] is False
+
+            InvitationEmailsTask().run()
+            queued_email = next(e for e in _get_queued_invitations(term_id) if e.section_id == 50002 and e.recipient['uid'] == recipient_uid)
+            assert queued_email.id != dead_letter.id
+            assert queued_email.dead_lettered_at is None
+            course = SisSection.get_course(term_id, 50002)
+            instructor = next(i for i in course['instructors'] if i['uid'] == recipient_uid)
+            assert instructor['wasSentInvite'] is True
+
 
 def _assert_coverage_of_cross_listings(expected_cross_listing_count, sent_emails, term_id):
     cross_listing_count = 0
@@ -160,3 +183,7 @@ def _get_invitations_since(term_id, timestamp):
         .filter_by(template_type='invitation', term_id=term_id)\
         .filter(SentEmail.sent_at >= timestamp)\
         .order_by(SentEmail.sent_at).all()
+
+
+def _get_queued_invitations(term_id):
+    return [e for e in QueuedEmail.get_all(term_id=term_id) if e.template_type == 'invitation']
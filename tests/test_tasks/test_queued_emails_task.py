@@ -22,14 +22,21 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from datetime import datetime, timezone
+from smtplib import SMTPServerDisconnected
+import time
+
 from diablo import std_commit
+from diablo.externals.b_connected import BConnected
 from diablo.jobs.tasks.queued_emails_task import QueuedEmailsTask
 from diablo.lib.util import utc_now
+from diablo.merged.email_dispatcher import EmailDispatcher, get_last_drain_stats
 from diablo.models.course_preference import CoursePreference
 from diablo.models.queued_email import QueuedEmail
 from diablo.models.sent_email import SentEmail
 from diablo.models.sis_section import SisSection
 from flask import current_app as app
+from tests.util import override_config, smtp_stand_in
 
 
 class TestQueuedEmailsTask:
@@ -158,6 +165,151 @@ class TestQueuedEmailsTask:
         assert email_json['termId'] == term_id
         assert email_json['sentAt']
 
+    def test_one_smtp_session_per_worker(self):
+        """Queued emails are sent over one SMTP connection per dispatch worker."""
+        term_id = app.config['CURRENT_TERM_ID']
+        for worker_count in [1, 3]:
+            _queue_admin_emails(count=6, section_id=50001, term_id=term_id)
+            queued_email_count = len(QueuedEmail.get_all(term_id=term_id))
+            assert queued_email_count >= 6
+
+            with smtp_stand_in(app) as stand_in, override_config(app, 'EMAIL_DISPATCH_WORKERS', worker_count):
+                QueuedEmailsTask().run()
+                std_commit(allow_test_environment=True)
+            assert len(QueuedEmail.get_all(term_id=term_id)) == 0
+            assert 1 <= stand_in.connection_count == stand_in.login_count <= worker_count
+            assert len(stand_in.messages) == queued_email_count
+            assert get_last_drain_stats()['sent'] == queued_email_count
+
+    def test_rate_limit_shared_by_workers(self):
+        """All dispatch workers together send no faster than BCOP_SMTP_MESSAGES_PER_SECOND."""
+        term_id = app.config['CURRENT_TERM_ID']
+        _queue_admin_emails(count=10, section_id=50001, term_id=term_id)
+        with smtp_stand_in(app) as stand_in, override_config(app, 'EMAIL_DISPATCH_WORKERS', 3):
+            with override_config(app, 'BCOP_SMTP_MESSAGES_PER_SECOND', 20):
+                started_at = time.monotonic()
+                stats = EmailDispatcher(term_id=term_id).drain()
+                elapsed = time.monotonic() - started_at
+            std_commit(allow_test_environment=True)
+        assert stats['sent'] == len(stand_in.messages) >= 10
+        # Per-worker limits would allow 60 messages per second.
+        assert elapsed >= (len(stand_in.messages) - 1) / 20
+
+    def test_reconnect_after_failed_delivery(self, monkeypatch):
+        """After a delivery fails mid-conversation, the worker's SMTP connection is not reused."""
+        term_id = app.config['CURRENT_TERM_ID']
+        queued_emails = _queue_admin_emails(count=3, section_id=50004, term_id=term_id)
+        queued_email_ids = [e.id for e in queued_emails]
+        deliver = BConnected.deliver
+        failed = []
+
+        def _deliver_then_time_out_once(b_connected, **kwargs):
+            result = deliver(b_connected, **kwargs)
+            if not failed:
+                failed.append(kwargs['recipient'])
+                raise TimeoutError('timed out')
+            return result
+
+        monkeypatch.setattr(BConnected, 'deliver', _deliver_then_time_out_once)
+        with smtp_stand_in(app) as stand_in, override_config(app, 'EMAIL_DISPATCH_WORKERS', 1):
+            stats = EmailDispatcher(term_id=term_id).drain()
+            std_commit(allow_test_environment=True)
+        assert stats['retried'] == 1
+        assert stats['sent'] == len(stand_in.messages) - 1
+        assert stand_in.connection_count == 2
+        deferred = [e for e in QueuedEmail.get_all(term_id=term_id) if e.id in queued_email_ids]
+        assert len(deferred) == 1
+        assert deferred[0].last_error == 'TimeoutError: timed out'
+        QueuedEmail.delete_all(deferred)
+        std_commit(allow_test_environment=True)
+
+    def test_retry_with_backoff_then_dead_letter(self, monkeypatch):
+        """Failed deliveries are retried with exponential backoff, then dead-lettered."""
+        term_id = app.config['CURRENT_TERM_ID']
+        queued_email = _queue_admin_emails(count=1, section_id=50002, term_id=term_id)[0]
+        queued_email_id = queued_email.id
+
+        def _deliver(*args, **kwargs):
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+
+        monkeypatch.setattr(BConnected, 'deliver', _deliver)
+        delays = []
+        with override_config(app, 'EMAIL_DISPATCH_MAX_ATTEMPTS', 3), override_config(app, 'EMAIL_DISPATCH_RETRY_DELAY', 10):
+            for attempt in range(1, 4):
+                before = datetime.now(timezone.utc)
+                stats = EmailDispatcher(term_id=term_id).drain()
+                std_commit(allow_test_environment=True)
+                queued_email = QueuedEmail.query.get(queued_email_id)
+                assert queued_email.attempts == attempt
+                assert 'SMTPServerDisconnected' in queued_email.last_error
+                if attempt < 3:
+                    assert stats['retried'] == 1
+                    assert queued_email.dead_lettered_at is None
+                    delays.append(round((queued_email.next_attempt_at - before).total_seconds()))
+                    # Not yet due, so not claimed.
+                    assert QueuedEmail.claim(limit=10, lease_seconds=60, term_id=term_id) == []
+                    _make_due(queued_email)
+                else:
+                    assert stats['deadLettered'] == 1
+                    assert queued_email.dead_lettered_at
+        assert delays == [10, 20]
+        assert queued_email_id not in [e.id for e in QueuedEmail.get_all(term_id=term_id)]
+        assert queued_email_id in [e.id for e in QueuedEmail.get_dead_letters(term_id=term_id)]
+        assert QueuedEmail.get_queue_stats(term_id=term_id)['deadLettered'] >= 1
+        QueuedEmail.delete(queued_email)
+        std_commit(allow_test_environment=True)
+
+    def test_claims_are_disjoint(self):
+        """Emails claimed by one dispatcher are leased, and skipped by the next claim."""
+        term_id = app.config['CURRENT_TERM_ID']
+        queued_email_ids = set(e.id for e in _queue_admin_emails(count=4, section_id=50003, term_id=term_id))
+        due_count = QueuedEmail.get_queue_stats(term_id=term_id)['due']
+        assert due_count >= 4
+        first_claim = QueuedEmail.claim(limit=2, lease_seconds=60, term_id=term_id)
+        second_claim = QueuedEmail.claim(limit=due_count, lease_seconds=60, term_id=term_id)
+        claimed_ids = [e.id for e in first_claim + second_claim]
+        assert len(first_claim) == 2
+        assert len(claimed_ids) == len(set(claimed_ids)) == due_count
+        assert queued_email_ids <= set(claimed_ids)
+        assert QueuedEmail.claim(limit=due_count, lease_seconds=60, term_id=term_id) == []
+        assert QueuedEmail.get_queue_stats(term_id=term_id)['deferred'] >= due_count
+        _release([e for e in first_claim + second_claim if e.id not in queued_email_ids])
+        QueuedEmail.delete_all([e for e in first_claim + second_claim if e.id in queued_email_ids])
+        std_commit(allow_test_environment=True)
+
+    def test_course_data_per_batch(self, monkeypatch):
+        """Course data is loaded once per batch of queued emails, not once per email."""
+        term_id = app.config['CURRENT_TERM_ID']
+        CoursePreference.update_opt_out(term_id=term_id, section_id=50000, opt_out=True)
+        CoursePreference.update_opt_out(term_id=term_id, section_id=50001, opt_out=False)
+        recipient = {'email': 'admin@berkeley.edu', 'name': 'Course Capture Admin', 'uid': app.config['EMAIL_DIABLO_ADMIN_UID']}
+        queued_email_ids = []
+        for section_id in [50000, 50001, 50002, 50003, 50004]:
+            queued_email_ids.append(QueuedEmail.create(section_id, 'admin_alert_room_change', term_id, recipient=recipient).id)
+        std_commit(allow_test_environment=True)
+        queued_email_count = QueuedEmail.get_queue_stats(term_id=term_id)['due']
+        assert queued_email_count >= 5
+        opted_out_emails_sent = _get_emails_sent('admin_alert_room_change', 50000, term_id)
+
+        section_ids_per_batch = []
+        get_has_opted_out_per_section_id = SisSection.get_has_opted_out_per_section_id
+
+        def _get_has_opted_out_per_section_id(**kwargs):
+            section_ids_per_batch.append(kwargs['section_ids'])
+            return get_has_opted_out_per_section_id(**kwargs)
+
+        monkeypatch.setattr(SisSection, 'get_course', None)
+        monkeypatch.setattr(SisSection, 'get_has_opted_out_per_section_id', _get_has_opted_out_per_section_id)
+        with override_config(app, 'EMAIL_QUEUE_BATCH_SIZE', 2):
+            QueuedEmailsTask().run()
+        std_commit(allow_test_environment=True)
+        assert len(section_ids_per_batch) == -(-queued_email_count // 2)
+        # Emails of the opted-out course are deleted, not sent.
+        assert not set(queued_email_ids) & set(e.id for e in QueuedEmail.get_all(term_id=term_id))
+        assert len(_get_emails_sent('admin_alert_room_change', 50000, term_id)) == len(opted_out_emails_sent)
+        CoursePreference.update_opt_out(term_id=term_id, section_id=50000, opt_out=False)
+        std_commit(allow_test_environment=True)
+
 
 def _get_emails_sent(email_template_type, section_id, term_id):
     return SentEmail.get_emails_of_type(
@@ -165,3 +317,31 @@ def _get_emails_sent(email_template_type, section_id, term_id):
         template_type=email_template_type,
         term_id=term_id,
     )
+
+
+def _release(queued_emails):
+    for queued_email in queued_emails:
+        queued_email.next_attempt_at = None
+    std_commit(allow_test_environment=True)
+
+
+def _make_due(queued_email):
+    queued_email.next_attempt_at = datetime.now(timezone.utc)
+    std_commit(allow_test_environment=True)
+
+
+def _queue_admin_emails(count, section_id, term_id):
+    queued_emails = []
+    for index in range(count):
+        queued_emails.append(QueuedEmail.create(
+            section_id,
+            'admin_alert_room_change',
+            term_id,
+            recipient={
+                'email': f'admin_{index}@berkeley.edu',
+                'name': 'Course Capture Admin',
+                'uid': app.config['EMAIL_DIABLO_ADMIN_UID'],
+            },
+        ))
+    std_commit(allow_test_environment=True)
+    return queued_emails
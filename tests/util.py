@@ -23,10 +23,21 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 from contextlib import contextmanager
+import fnmatch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
+import time
+from xml.sax.saxutils import escape
 
 from diablo import db, std_commit
+from diablo.externals.calnet import Client, SCHEMA_DICT
+from diablo.externals.kaltura import reset_kaltura_sessions
 from diablo.jobs.doomed_to_failure import DoomedToFailure  # noqa
 from diablo.models.job import Job
+from KalturaClient import KalturaClient, KalturaConfiguration
+import ldap3
 from sqlalchemy import text
 
 
@@ -48,6 +59,217 @@ def scheduled_job(job_key):
         std_commit(allow_test_environment=True)
 
 
+class RedisStandIn:
+    """In-process stand-in for the subset of the redis.Redis API used by RedisCache."""
+
+    def __init__(self):
+        self.commands = []
+        self._entries = {}
+
+    def _get(self, name):
+        value, expires_at = self._entries.get(name, (None, None))
+        if expires_at and expires_at <= time.monotonic():
+            self._entries.pop(name)
+            return None
+        return value
+
+    def delete(self, *names):
+        self.commands.append('delete')
+        return len([self._entries.pop(name) for name in names if self._get(name) is not None])
+
+    def exists(self, name):
+        self.commands.append('exists')
+        return int(self._get(name) is not None)
+
+    def expire(self, name, time):
+        self.commands.append('expire')
+        self.setex(name, self._get(name), time)
+
+    def flushdb(self):
+        self.commands.append('flushdb')
+        self._entries.clear()
+        return True
+
+    def get(self, name):
+        self.commands.append('get')
+        return self._get(name)
+
+    def incr(self, name, amount=1):
+        self.commands.append('incr')
+        value = int(self._get(name) or 0) + amount
+        self.set(name, str(value).encode('ascii'))
+        return value
+
+    def keys(self, pattern='*'):
+        self.commands.append('keys')
+        return [name for name in list(self._entries) if fnmatch.fnmatchcase(name, pattern) and self._get(name) is not None]
+
+    def mget(self, names):
+        self.commands.append('mget')
+        return [self._get(name) for name in names]
+
+    def pipeline(self, transaction=True):
+        return _RedisStandInPipeline(self)
+
+    def set(self, name, value):  # noqa: A003
+        self.commands.append('set')
+        self._entries[name] = (value, None)
+        return True
+
+    def setex(self, name, value, time):
+        self.commands.append('setex')
+        self._entries[name] = (value, _expires_at(time))
+        return True
+
+    def setnx(self, name, value):
+        self.commands.append('setnx')
+        if self._get(name) is not None:
+            return False
+        self._entries[name] = (value, None)
+        return True
+
+
+class _RedisStandInPipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, command):
+        return lambda *args, **kwargs: self.calls.append((command, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, command)(*args, **kwargs) for command, args, kwargs in self.calls]
+
+
+def _expires_at(seconds):
+    return time.monotonic() + seconds
+
+
+class KalturaStandIn:
+    """Local HTTP server which speaks the Kaltura API (XML over POST) and answers per handle_call(service, action, params)."""
+
+    def __init__(self, handle_call):
+        self.calls_per_request = []
+        self.client_addresses = []
+        self.handle_call = handle_call
+        self.session_count = 0
+        stand_in = self
+
+        class _RequestHandler(BaseHTTPRequestHandler):
+            # Allow keep-alive connections.
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):  # noqa: N802
+                stand_in._respond(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _RequestHandler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def client(self):
+        return KalturaClient(KalturaConfiguration(serviceUrl=self.url))
+
+    @property
+    def round_trips(self):
+        return len(self.calls_per_request)
+
+    def _respond(self, request_handler):
+        content_length = int(request_handler.headers.get('Content-Length') or 0)
+        params = json.loads(request_handler.rfile.read(content_length) or '{}')
+        path = request_handler.path.split('/')
+        if path[-1] == 'multirequest':
+            calls = [params[str(index)] for index in range(len(params)) if str(index) in params]
+        else:
+            calls = [{**params, 'service': path[-3], 'action': path[-1]}]
+        self.calls_per_request.append(calls)
+        self.client_addresses.append(request_handler.client_address)
+        try:
+            results = [self._handle_call(call) for call in calls]
+        except Exception as e:
+            request_handler.send_error(500, str(e))
+            return
+        if path[-1] == 'multirequest':
+            xml = ''.join(f'<item>{_to_kaltura_xml(result)}</item>' for result in results)
+        else:
+            xml = _to_kaltura_xml(results[0])
+        body = f'<?xml version="1.0" encoding="utf-8"?><xml><result>{xml}</result><executionTime>0</executionTime></xml>'.encode('utf-8')
+        request_handler.send_response(200)
+        request_handler.send_header('Content-Type', 'text/xml')
+        request_handler.send_header('Content-Length', str(len(body)))
+        request_handler.end_headers()
+        request_handler.wfile.write(body)
+
+    def _handle_call(self, call):
+        service = call.pop('service')
+        action = call.pop('action')
+        if (service, action) == ('session', 'startWidgetSession'):
+            return {'objectType': 'KalturaStartWidgetSessionResponse', 'ks': 'widget_ks'}
+        if (service, action) == ('apptoken', 'startSession'):
+            self.session_count += 1
+            return {'objectType': 'KalturaSessionInfo', 'ks': f'admin_ks_{self.session_count}'}
+        return self.handle_call(service, action, call)
+
+
+@contextmanager
+def kaltura_stand_in(app, handle_call):
+    """Kaltura API stand-in. Kaltura methods skipped under pytest are not skipped while in this context."""
+    stand_in = KalturaStandIn(handle_call)
+    thread = Thread(target=stand_in.server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with override_config(app, 'DIABLO_ENV', 'kaltura_stand_in'), override_config(app, 'KALTURA_SERVICE_URL', stand_in.url):
+            with override_config(app, 'KALTURA_APP_TOKEN', 'app_token'):
+                yield stand_in
+    finally:
+        reset_kaltura_sessions()
+        stand_in.server.shutdown()
+        stand_in.server.server_close()
+
+
+def kaltura_error(code, message='Error'):
+    return {'error': {'code': code, 'message': message}}
+
+
+def kaltura_list_response(object_type, objects, total_count=None):
+    return {
+        'objectType': object_type,
+        'objects': objects,
+        'totalCount': len(objects) if total_count is None else total_count,
+    }
+
+
+def _to_kaltura_xml(value):
+    if isinstance(value, dict):
+        return ''.join(f'<{key}>{_to_kaltura_xml(v)}</{key}>' for key, v in value.items())
+    elif isinstance(value, list):
+        return ''.join(f'<item>{_to_kaltura_xml(v)}</item>' for v in value)
+    else:
+        return '' if value is None else escape(str(value))
+
+
+@contextmanager
+def ldap_stand_in(app, users):
+    """In-process LDAP server, populated with CalNet-like users, and a client bound to it."""
+    bind = 'uid=diablo,ou=applications,dc=berkeley,dc=edu'
+    server = ldap3.Server('ldap_stand_in', get_info=ldap3.NONE)
+    conn = ldap3.Connection(server, user=bind, password=app.config['LDAP_PASSWORD'], client_strategy=ldap3.MOCK_SYNC)
+    conn.strategy.add_entry(bind, {'objectClass': 'account', 'uid': 'diablo', 'userPassword': app.config['LDAP_PASSWORD']})
+    attribute_per_key = dict((value, key) for key, value in SCHEMA_DICT.items())
+    for user in users:
+        attributes = dict((attribute_per_key[key], value) for key, value in user.items() if key in attribute_per_key)
+        ou = 'expired people' if user.get('expired') else 'people'
+        conn.strategy.add_entry(f"uid={user['uid']},ou={ou},dc=berkeley,dc=edu", {**attributes, 'objectClass': 'person', 'ou': ou})
+    with override_config(app, 'LDAP_BIND', bind):
+        calnet_client = Client(app, server=server, client_strategy=ldap3.MOCK_SYNC)
+    try:
+        yield calnet_client
+    finally:
+        calnet_client.pool.close()
+
+
 @contextmanager
 def override_config(app, key, value):
     """Temporarily override an app config value."""
@@ -59,6 +281,100 @@ def override_config(app, key, value):
         app.config[key] = old_value
 
 
+class SmtpStandIn:
+    """Local SMTP server which accepts all messages. It drops the connection after max_messages_per_connection, if set."""
+
+    def __init__(self, max_messages_per_connection=None):
+        self.connection_count = 0
+        self.login_count = 0
+        self.max_messages_per_connection = max_messages_per_connection
+        self.messages = []
+        self._lock = Lock()
+        stand_in = self
+
+        class _RequestHandler(StreamRequestHandler):
+
+            def handle(self):
+                stand_in._converse(self)
+
+        self.server = ThreadingTCPServer(('127.0.0.1', 0), _RequestHandler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def _converse(self, request_handler):
+        def _reply(line):
+            request_handler.wfile.write(f'{line}\r\n'.encode('utf-8'))
+
+        with self._lock:
+            self.connection_count += 1
+        _reply('220 smtp_stand_in')
+        message_count = 0
+        mail_from = None
+        rcpt_tos = []
+        while True:
+            line = request_handler.rfile.readline()
+            if not line:
+                return
+            command, _, arg = line.decode('utf-8').rstrip('\r\n').partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                _reply('250-smtp_stand_in')
+                _reply('250 AUTH PLAIN')
+            elif command == 'AUTH':
+                with self._lock:
+                    self.login_count += 1
+                _reply('235 Authentication successful')
+            elif command == 'MAIL':
+                mail_from = arg.partition(':')[2].strip('<> ')
+                rcpt_tos = []
+                _reply('250 OK')
+            elif command == 'RCPT':
+                rcpt_tos.append(arg.partition(':')[2].strip('<> '))
+                _reply('250 OK')
+            elif command == 'DATA':
+                _reply('354 End data with <CR><LF>.<CR><LF>')
+                data = _read_smtp_data(request_handler.rfile)
+                with self._lock:
+                    self.messages.append({'from': mail_from, 'to': rcpt_tos, 'data': data})
+                _reply('250 OK')
+                message_count += 1
+                if message_count == self.max_messages_per_connection:
+                    # Drop the connection, without warning.
+                    return
+            elif command in ['HELO', 'NOOP', 'RSET']:
+                _reply('250 OK')
+            elif command == 'QUIT':
+                _reply('221 Bye')
+                return
+            else:
+                _reply('502 Command not implemented')
+
+
+def _read_smtp_data(rfile):
+    data_lines = []
+    for data_line in iter(rfile.readline, b''):
+        if data_line == b'.\r\n':
+            break
+        data_lines.append(data_line)
+    return b''.join(data_lines).decode('utf-8')
+
+
+@contextmanager
+def smtp_stand_in(app, max_messages_per_connection=None):
+    """SMTP stand-in for bCOP. Emails are sent, not merely logged, while in this context."""
+    stand_in = SmtpStandIn(max_messages_per_connection=max_messages_per_connection)
+    thread = Thread(target=stand_in.server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with override_config(app, 'DIABLO_ENV', 'smtp_stand_in'), override_config(app, 'BCOP_SMTP_USE_TLS', False):
+            with override_config(app, 'BCOP_SMTP_SERVER', '127.0.0.1'), override_config(app, 'BCOP_SMTP_PORT', stand_in.port):
+                with override_config(app, 'BCOP_SMTP_USERNAME', 'diablo'), override_config(app, 'BCOP_SMTP_PASSWORD', 'secret'):
+                    yield stand_in
+    finally:
+        stand_in.server.shutdown()
+        stand_in.server.server_close()
+
+
 @contextmanager
 def simply_yield():
     yield